@@ -3,7 +3,7 @@ import logging
 import yaml
 import json
 import os.path
-from . import amaxa, loader, state
+from . import amaxa, loader, state, describe_cache
 
 def main():
     a = argparse.ArgumentParser()
@@ -12,6 +12,10 @@ def main():
     a.add_argument('-c', '--credentials', required=True, dest='credentials', type=argparse.FileType('r'))
     a.add_argument('-l', '--load', action='store_true')
     a.add_argument('-s', '--use-state', dest='use_state', type=argparse.FileType('r'))
+    a.add_argument('-j', '--jobs', dest='jobs', type=int, default=1,
+                   help='Run up to this many independent sObjects at once')
+    a.add_argument('--refresh-describe', dest='refresh_describe', action='store_true',
+                   help='Ignore cached describe information and retrieve it again')
     verbosity_levels = {'quiet': logging.NOTSET, 'errors': logging.ERROR,
                         'normal': logging.INFO, 'verbose': logging.DEBUG}
 
@@ -40,6 +44,8 @@ def main():
         print('The supplied credentials were not valid: {}'.format('\n'.join(errors)))
         return -1
 
+    context.describe_cache = describe_cache.DescribeCache(context.connection, refresh=args.refresh_describe)
+
     if args.config.name.endswith('json'):
         config = json.load(args.config)
     else:
@@ -54,6 +60,7 @@ def main():
         (ex, errors) = state.load_state(ex, args.use_state)
 
     if ex is not None:
+        ex.jobs = max(1, args.jobs)
         ret = ex.run()
 
         if ret != 0 and len(ex.global_id_map) > 0:
@@ -5,11 +5,27 @@ import json
 import salesforce_bulk
 import itertools
 import csv
+import concurrent.futures
+import random
+import math
+import codecs
+import queue
+import threading
+import array
+import binascii
+import tempfile
+import io
+import re
 from . import constants
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 from enum import Enum, unique
 from datetime import datetime, timedelta
-from urllib.parse import urlparse
-from time import sleep
+from urllib.parse import urlparse, quote_plus
+from time import sleep, monotonic
 
 
 @unique
@@ -28,6 +44,12 @@ class ExtractionScope(StringEnum):
     SELECTED_RECORDS = 'some'
     DESCENDENTS = 'children'
 
+class DescendentStrategy(StringEnum):
+    ID_LIST = 'id-list'
+    SEMI_JOIN = 'semi-join'
+    FULL_SCAN = 'full-scan'
+    AUTO = 'auto'
+
 class SelfLookupBehavior(StringEnum):
     TRACE_ALL = 'trace-all'
     TRACE_NONE = 'trace-none'
@@ -51,30 +73,134 @@ class AmaxaException(Exception):
     pass
 
 class SalesforceId(object):
+    __slots__ = ['id']
+
+    CHECKSUM_CHARACTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ012345'
+    # Translating an Id with this table replaces uppercase letters with '1' and other characters with '0'.
+    # Each five-character run of the result, read backwards, is the index of a checksum character.
+    UPPERCASE_BITS = str.maketrans(
+        '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ',
+        '0' * 36 + '1' * 26
+    )
+    CHECKSUM_TABLE = { format(i, '05b')[::-1]: c for (i, c) in enumerate(CHECKSUM_CHARACTERS) }
+
     def __init__(self, idstr):
         if isinstance(idstr, SalesforceId):
             self.id = idstr.id
         else:
             idstr = idstr.strip()
             if len(idstr) == 15:
-                suffix = ''
-                for i in range(0, 3):
-                    baseTwo = 0
-                    for j in range (0, 5):
-                        character = idstr[i*5+j]
-                        if character >= 'A' and character <= 'Z':
-                            baseTwo += 1 << j
-                    suffix += 'ABCDEFGHIJKLMNOPQRSTUVWXYZ012345'[baseTwo]
-                self.id = idstr + suffix
+                self.id = idstr + SalesforceId.checksum(idstr)
             elif len(idstr) == 18:
                 self.id = idstr
             else:
                 raise ValueError('Salesforce Ids must be 15 or 18 characters.')
 
+    @classmethod
+    def checksum(cls, idstr):
+        bits = idstr.translate(cls.UPPERCASE_BITS)
+        try:
+            return cls.CHECKSUM_TABLE[bits[0:5]] + cls.CHECKSUM_TABLE[bits[5:10]] + cls.CHECKSUM_TABLE[bits[10:15]]
+        except KeyError:
+            # Non-alphanumeric characters, which the table doesn't cover. Treat them as lowercase.
+            suffix = ''
+            for i in range(0, 3):
+                baseTwo = 0
+                for j in range (0, 5):
+                    character = idstr[i*5+j]
+                    if character >= 'A' and character <= 'Z':
+                        baseTwo += 1 << j
+                suffix += cls.CHECKSUM_CHARACTERS[baseTwo]
+            return suffix
+
+    @classmethod
+    def checksums(cls, idstrs):
+        # Compute the checksums of a batch of 15-character Ids with a single translation pass.
+        bits = '\n'.join(idstrs).translate(cls.UPPERCASE_BITS)
+        table = cls.CHECKSUM_TABLE
+        try:
+            return [table[bits[i:i+5]] + table[bits[i+5:i+10]] + table[bits[i+10:i+15]] for i in range(0, len(bits), 16)]
+        except KeyError:
+            return [cls.checksum(i) for i in idstrs]
+
+    @staticmethod
+    def intern(idstr):
+        # Return the canonical SalesforceId for this Id, from a bounded cache of recently used Ids.
+        if isinstance(idstr, SalesforceId):
+            return idstr
+
+        return intern_salesforce_id(idstr)
+
+    @staticmethod
+    def intern_all(idstrs):
+        # Intern a batch of Ids, computing checksums for any 15-character Ids in a single pass.
+        idstrs = [i.strip() for i in idstrs]
+        checksums = iter(SalesforceId.checksums([i for i in idstrs if len(i) == 15]))
+
+        return [intern_salesforce_id(i + next(checksums) if len(i) == 15 else i) for i in idstrs]
+
+    @staticmethod
+    def normalize_all(idstrs):
+        # Validate and normalize a column of Ids in bulk. Returns a list of 18-character Ids,
+        # with '' in place of each invalid value, and a list of flags marking the valid values.
+        # A value is valid if it is 15 alphanumeric characters, or 18 characters whose last
+        # three are the checksum of the first 15. Surrounding whitespace is ignored.
+        # NumPy is used if it's installed.
+        if numpy is not None:
+            return SalesforceId.normalize_all_numpy(idstrs)
+
+        idstrs = [i.strip() for i in idstrs]
+        candidates = [
+            len(i) in [15, 18] and all(c in IdSet.BASE62_VALUES for c in i[:15])
+            for i in idstrs
+        ]
+        checksums = iter(SalesforceId.checksums([i[:15] for (i, c) in zip(idstrs, candidates) if c]))
+        normalized = []
+        for (i, candidate) in zip(idstrs, candidates):
+            if candidate:
+                checksum = next(checksums)
+                if len(i) == 15 or i[15:] == checksum:
+                    normalized.append(i[:15] + checksum)
+                    continue
+            normalized.append('')
+
+        return (normalized, [i != '' for i in normalized])
+
+    @staticmethod
+    def normalize_all_numpy(idstrs):
+        ids = numpy.char.strip(numpy.asarray(list(idstrs), dtype=str).reshape(-1))
+        lengths = numpy.char.str_len(ids)
+
+        # Work on a matrix of code points with one row per Id, zero-padded to 18 columns.
+        b = ids.astype('U18').view(numpy.uint32).reshape(len(ids), 18)
+
+        upper = (b >= ord('A')) & (b <= ord('Z'))
+        alnum = upper | ((b >= ord('0')) & (b <= ord('9'))) | ((b >= ord('a')) & (b <= ord('z')))
+        table = numpy.array([ord(c) for c in SalesforceId.CHECKSUM_CHARACTERS], dtype=numpy.uint32)
+        checksums = table[(upper[:, :15].reshape(-1, 3, 5) * numpy.array([1, 2, 4, 8, 16])).sum(axis=2)]
+
+        valid = alnum[:, :15].all(axis=1) & (
+            (lengths == 15) | ((lengths == 18) & (b[:, 15:] == checksums).all(axis=1))
+        )
+
+        normalized = numpy.zeros_like(b)
+        normalized[:, :15] = b[:, :15]
+        normalized[:, 15:] = checksums
+        normalized[~valid] = 0
+
+        return (normalized.view('U18').reshape(-1).tolist(), valid.tolist())
+
     def __eq__(self, other):
         if isinstance(other, SalesforceId):
             return self.id == other.id
         elif isinstance(other, str):
+            # Compare directly to strings, rather than building a SalesforceId from them.
+            # The checksum is a function of the first 15 characters.
+            if len(other) == 18:
+                return self.id == other
+            elif len(other) == 15:
+                return self.id[:15] == other
+
             return self.id == SalesforceId(other).id
 
         return False
@@ -88,6 +214,253 @@ class SalesforceId(object):
     def __repr__(self):
         return self.id
 
+@functools.lru_cache(maxsize=1 << 18)
+def intern_salesforce_id(idstr):
+    idstr = idstr.strip()
+    if len(idstr) == 15:
+        # Cache the 15-character form too, but share the instance for the 18-character form.
+        return intern_salesforce_id(idstr + SalesforceId.checksum(idstr))
+
+    return SalesforceId(idstr)
+
+class IdSet(object):
+    # A set of Salesforce Ids, held as integers. Each Id is encoded as a 64-bit integer: the high bits
+    # hold a code for its first six characters (the key prefix, plus pod and reserved characters that
+    # vary little within an org), and the low bits its remaining nine characters at six bits apiece.
+    # Salesforce's alphabet is a subset of base64's, so those characters are decoded as base64 in C.
+    # Encoded Ids are kept in a built-in set. An entry costs about 60 bytes, against 190 for a set
+    # of SalesforceId objects. Members are returned as SalesforceId objects, or as Id strings.
+    BASE62 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+    BASE62_VALUES = { c: i for (i, c) in enumerate(BASE62) }
+    VALUE_BITS = 54
+    VALUE_MASK = (1 << VALUE_BITS) - 1
+    # Members are decoded, and their checksums computed, this many at a time.
+    DECODE_BATCH_SIZE = 4096
+
+    # Prefix codes are shared by all IdSets so that their encodings can be compared directly.
+    prefix_codes = {}
+    prefixes = []
+    prefix_lock = threading.Lock()
+
+    def __init__(self, ids=()):
+        self.keys = set()
+        self.update(ids)
+
+    @classmethod
+    def encode(cls, id):
+        if isinstance(id, SalesforceId):
+            idstr = id.id
+        elif isinstance(id, str):
+            idstr = id.strip()
+        else:
+            raise ValueError('Salesforce Ids must be strings.')
+
+        if len(idstr) != 15 and len(idstr) != 18:
+            raise ValueError('Salesforce Ids must be 15 or 18 characters.')
+
+        # Three leading zero digits make a whole number of base64 quanta. Characters outside
+        # the base64 alphabet raise an error or shorten the result; '+' and '/' are checked for.
+        value = idstr[6:15]
+        try:
+            decoded = binascii.a2b_base64('AAA' + value)
+        except ValueError:
+            decoded = b''
+        if len(decoded) != 9 or '+' in value or '/' in value:
+            raise ValueError('Salesforce Ids must be alphanumeric.')
+
+        code = cls.prefix_codes.get(idstr[:6])
+        if code is None:
+            with cls.prefix_lock:
+                code = cls.prefix_codes.get(idstr[:6])
+                if code is None:
+                    code = len(cls.prefixes)
+                    if code >= 1 << (64 - cls.VALUE_BITS):
+                        raise AmaxaException('Too many distinct Salesforce Id prefixes to encode.')
+                    cls.prefixes.append(idstr[:6])
+                    cls.prefix_codes[idstr[:6]] = code
+
+        return (code << cls.VALUE_BITS) | int.from_bytes(decoded, 'big')
+
+    @classmethod
+    def decode(cls, key):
+        return SalesforceId(cls.decode_15_all([key])[0])
+
+    def contains_key(self, key):
+        return key in self.keys
+
+    def add_key(self, key):
+        self.keys.add(key)
+
+    def add(self, id):
+        self.keys.add(self.encode(id))
+
+    def discard(self, id):
+        try:
+            key = self.encode(id)
+        except ValueError:
+            return False
+
+        return self.discard_key(key)
+
+    def discard_key(self, key):
+        try:
+            self.keys.remove(key)
+        except KeyError:
+            return False
+
+        return True
+
+    def remove(self, id):
+        if not self.discard(id):
+            raise KeyError(id)
+
+    def update(self, *others):
+        for other in others:
+            if isinstance(other, IdSet):
+                self.keys.update(other.keys)
+            else:
+                self.keys.update(map(self.encode, other))
+
+        return self
+
+    @classmethod
+    def from_keys(cls, keys):
+        result = cls()
+        result.keys = set(keys)
+
+        return result
+
+    def copy(self):
+        return IdSet.from_keys(self.keys)
+
+    def union(self, *others):
+        return self.copy().update(*others)
+
+    def intersection(self, other):
+        if not isinstance(other, IdSet):
+            other = IdSet(other)
+
+        return IdSet.from_keys(self.keys & other.keys)
+
+    def difference(self, other):
+        if not isinstance(other, IdSet):
+            other = IdSet(other)
+
+        return IdSet.from_keys(self.keys - other.keys)
+
+    @classmethod
+    def decode_15_all(cls, keys):
+        # Decodes a batch of keys to 15-character Ids. Nine bytes make exactly twelve base64
+        # digits, so all of the values can be encoded in a single call and then sliced apart.
+        mask = cls.VALUE_MASK
+        text = binascii.b2a_base64(b''.join([(k & mask).to_bytes(9, 'big') for k in keys])).decode('ascii')
+
+        return [cls.prefixes[k >> cls.VALUE_BITS] + text[i + 3:i + 12] for (i, k) in zip(range(0, len(text), 12), keys)]
+
+    def id_strings(self, length=15):
+        # Yields each member as an Id string of the given length, 15 or 18 characters,
+        # without building SalesforceId objects. We iterate over a snapshot of the keys,
+        # so that other threads may add Ids meanwhile.
+        keys = list(self.keys)
+
+        for i in range(0, len(keys), self.DECODE_BATCH_SIZE):
+            batch = self.decode_15_all(keys[i:i + self.DECODE_BATCH_SIZE])
+            if length == 15:
+                yield from batch
+            else:
+                for (idstr, checksum) in zip(batch, SalesforceId.checksums(batch)):
+                    yield idstr + checksum
+
+    def __contains__(self, id):
+        try:
+            key = self.encode(id)
+        except ValueError:
+            return False
+
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        for idstr in self.id_strings(18):
+            yield SalesforceId(idstr)
+
+    def __or__(self, other):
+        return self.union(other)
+
+    __ror__ = __or__
+
+    def __ior__(self, other):
+        return self.update(other)
+
+    def __and__(self, other):
+        return self.intersection(other)
+
+    __rand__ = __and__
+
+    def __sub__(self, other):
+        return self.difference(other)
+
+    def __rsub__(self, other):
+        return IdSet(other).difference(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (set, frozenset)):
+            try:
+                other = IdSet(other)
+            except ValueError:
+                return False
+
+        if not isinstance(other, IdSet):
+            return NotImplemented
+
+        return self.keys == other.keys
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'IdSet({})'.format(', '.join(str(i) for i in self))
+
+class ReferenceView(object):
+    # The Ids of extracted records to which a lookup field may refer, kept up to date
+    # as records are stored. A field with a single target sObject shares that sObject's
+    # set of extracted Ids; a polymorphic field keeps the union of its targets' sets.
+    # Callers can ask for just the Ids added since an earlier version instead of copying
+    # the set. The operation only logs a target's additions once a view asks for them.
+    def __init__(self, context, targets, id_sets):
+        self.context = context
+        self.targets = targets
+
+        if len(id_sets) == 1:
+            self.ids = id_sets[0]
+        else:
+            self.ids = IdSet()
+            self.ids.update(*id_sets)
+
+    @property
+    def version(self):
+        with self.context.lock:
+            return tuple(self.context.log_extracted_ids(name) for name in self.targets)
+
+    def update(self, ids):
+        # Only called for polymorphic fields, whose set is their own.
+        self.ids.update(ids)
+
+    def get_ids_since(self, version=None):
+        # Returns the Ids added after the given version (or all Ids, if None), and the current version.
+        with self.context.lock:
+            current = tuple(self.context.log_extracted_ids(name) for name in self.targets)
+            if version is None:
+                return (self.ids.copy(), current)
+
+            keys = array.array('Q')
+            for (name, start) in zip(self.targets, version):
+                keys.extend(self.context.get_extracted_id_log(name, start))
+
+            return (IdSet.from_keys(keys), current)
+
+
 def JSONIterator(records):
     def enc(r):
         return json.dumps(r).encode('utf-8')
@@ -101,6 +474,50 @@ def JSONIterator(records):
 
     yield b']'
 
+def JSONStreamIterator(stream, chunk_size=65536):
+    # Incrementally parse a stream containing a JSON array, yielding each element
+    # as soon as it has been read. Memory use is bounded by the size of a single
+    # record rather than that of the whole stream.
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    eof = False
+    in_array = False
+
+    while True:
+        while pos < len(buf) and (buf[pos].isspace() or (in_array and buf[pos] == ',')):
+            pos += 1
+
+        if pos < len(buf):
+            if not in_array:
+                if buf[pos] != '[':
+                    raise json.JSONDecodeError('Expecting \'[\'', buf, pos)
+                in_array = True
+                pos += 1
+                continue
+
+            if buf[pos] == ']':
+                return
+
+            try:
+                (record, end) = decoder.raw_decode(buf, pos)
+                # A value that runs to the end of the buffer may be incomplete.
+                if end < len(buf) or eof:
+                    yield record
+                    pos = end
+                    continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        elif eof:
+            raise json.JSONDecodeError('Unexpected end of JSON stream', buf, pos)
+
+        chunk = stream.read(chunk_size)
+        eof = len(chunk) == 0
+        buf = buf[pos:] + text.decode(chunk, final=eof)
+        pos = 0
+
 def BatchIterator(iterator, n=10000):
     while True:
         batch = list(itertools.islice(iterator, n))
@@ -109,6 +526,512 @@ def BatchIterator(iterator, n=10000):
         
         yield batch
 
+class CSVPage(object):
+    # Raw text for a run of complete CSV rows, along with the Ids found in those rows.
+    def __init__(self, text, ids):
+        self.text = text
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+def CSVLineIterator(stream, chunk_size=65536):
+    # Decode a byte stream into lines, keeping their line endings.
+    text = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+
+    while True:
+        chunk = stream.read(chunk_size)
+        eof = len(chunk) == 0
+        lines = (buf + text.decode(chunk, final=eof)).split('\n')
+        buf = lines.pop()
+
+        for line in lines:
+            yield line + '\n'
+
+        if eof:
+            if len(buf) > 0:
+                yield buf
+            return
+
+def CSVStreamIterator(stream, fieldnames, page_size=1000, lineterminator='\r\n', chunk_size=65536):
+    # Split a Bulk API CSV result into pages of raw rows whose columns are `fieldnames`.
+    # The result's own header row is dropped. The rows are parsed only to find the
+    # Id of each row and the ends of rows, which take `lineterminator` in place of
+    # the Bulk API's line endings. Line breaks within quoted values are left alone.
+    consumed = []
+
+    def read_lines(lines):
+        for line in lines:
+            consumed.append(line)
+            yield line
+
+    reader = csv.reader(read_lines(CSVLineIterator(stream, chunk_size)))
+    header = next(reader, None)
+
+    # Empty results have a message in place of a header.
+    if header is None or header == ['Records not found for this query']:
+        return
+    if [f.lower() for f in header] != [f.lower() for f in fieldnames]:
+        raise AmaxaException('Bulk API result columns {} do not match {}'.format(', '.join(header), ', '.join(fieldnames)))
+
+    id_index = [f.lower() for f in fieldnames].index('id')
+    del consumed[:]
+    ids = []
+
+    for row in reader:
+        ids.append(row[id_index])
+
+        end = consumed[-1]
+        if end.endswith('\r\n'):
+            end = end[:-2]
+        elif end.endswith('\n'):
+            end = end[:-1]
+        consumed[-1] = end + lineterminator
+
+        if len(ids) >= page_size:
+            yield CSVPage(''.join(consumed), ids)
+            del consumed[:]
+            ids = []
+
+    if len(ids) > 0:
+        yield CSVPage(''.join(consumed), ids)
+
+class BatchMonitor(object):
+    def __init__(self, bulk, min_interval=0.5, max_interval=30, backoff=2, jitter=0.2):
+        self.bulk = bulk
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.interval = min_interval
+        self.pending = {}
+        self.chunked_jobs = {}
+        self.finished = set()
+
+    def add_batch(self, job, batch):
+        if job not in self.pending:
+            self.pending[job] = set()
+
+        self.pending[job].add(batch)
+
+    def add_chunked_batch(self, job, batch):
+        # Track a PK-chunked query. Salesforce creates the chunk batches itself,
+        # and marks the original batch Not Processed once they have all been queued.
+        if job not in self.pending:
+            self.pending[job] = set()
+
+        self.chunked_jobs[job] = batch
+
+    def is_done(self):
+        return len(self.chunked_jobs) == 0 and all([len(b) == 0 for b in self.pending.values()])
+
+    def poll(self):
+        # Check the status of every batch we're tracking, with one API call per job,
+        # and return those that have completed since the last poll, in the order we saw them.
+        completed = []
+
+        for job in list(self.pending.keys()):
+            if len(self.pending[job]) == 0 and job not in self.chunked_jobs:
+                del self.pending[job]
+                continue
+
+            batch_list = self.bulk.get_batch_list(job)
+
+            if job in self.chunked_jobs:
+                original = self.chunked_jobs[job]
+                for batch_info in batch_list:
+                    if batch_info['id'] == original:
+                        if batch_info['state'] == salesforce_bulk.bulk_states.NOT_PROCESSED:
+                            del self.chunked_jobs[job]
+                        elif batch_info['state'] == salesforce_bulk.bulk_states.COMPLETED:
+                            # Salesforce did not chunk this query.
+                            del self.chunked_jobs[job]
+                            self.pending[job].add(original)
+                        elif batch_info['state'] in salesforce_bulk.bulk_states.ERROR_STATES:
+                            self.pending[job].add(original)
+                    elif batch_info['id'] not in self.finished:
+                        self.pending[job].add(batch_info['id'])
+
+            for batch_info in batch_list:
+                batch = batch_info['id']
+                if batch not in self.pending[job]:
+                    continue
+
+                if batch_info['state'] == salesforce_bulk.bulk_states.COMPLETED:
+                    self.pending[job].remove(batch)
+                    self.finished.add(batch)
+                    completed.append((job, batch))
+                elif batch_info['state'] in salesforce_bulk.bulk_states.ERROR_STATES:
+                    raise AmaxaException(
+                        'Bulk API batch {} failed ({}): {}'.format(batch, batch_info['state'], batch_info.get('stateMessage'))
+                    )
+
+        if len(completed) > 0:
+            self.interval = self.min_interval
+
+        return completed
+
+    def next_delay(self):
+        # Back off exponentially while nothing completes, with jitter so that
+        # concurrent monitors don't poll in lockstep.
+        delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.interval = min(self.interval * self.backoff, self.max_interval)
+
+        return delay
+
+    def wait(self):
+        sleep(self.next_delay())
+
+    def completed(self):
+        while not self.is_done():
+            for result in self.poll():
+                yield result
+
+            if not self.is_done():
+                self.wait()
+
+class BatchResultReconciler(object):
+    # Matches the results of each Bulk API batch against the original Ids of the
+    # records in that batch. Batches may complete in any order, so results are handled
+    # batch by batch as each completes, including while more batches are being posted.
+    def __init__(self, bulk, handle_result):
+        self.bulk = bulk
+        self.handle_result = handle_result
+        self.monitor = BatchMonitor(bulk)
+        self.original_ids = {}
+        self.next_poll = None
+
+    def add_batch(self, job, batch, original_ids):
+        self.monitor.add_batch(job, batch)
+        self.original_ids[batch] = original_ids
+
+        # A batch that's just been posted won't have completed yet.
+        if self.next_poll is None:
+            self.next_poll = monotonic() + self.monitor.next_delay()
+
+    def reconcile(self, job, batch):
+        for original_id, result in zip(self.original_ids.pop(batch), self.bulk.get_batch_results(batch, job)):
+            self.handle_result(original_id, result)
+
+    def poll(self):
+        # Handles any batches that have completed, without waiting, if a poll is due.
+        if self.next_poll is not None and monotonic() >= self.next_poll and not self.monitor.is_done():
+            for (job, batch) in self.monitor.poll():
+                self.reconcile(job, batch)
+            self.next_poll = monotonic() + self.monitor.next_delay()
+
+    def finish(self):
+        # Waits for the remaining batches, handling each as it completes.
+        for (job, batch) in self.monitor.completed():
+            self.reconcile(job, batch)
+
+
+class StageCounter(object):
+    # Throughput of one stage of the extraction pipeline: the records it has handled,
+    # the time it spent working on them, and the time it spent blocked on a neighbouring
+    # stage, either waiting for input or waiting for room to hand on its output.
+    def __init__(self):
+        self.records = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, records=0, busy=0.0, blocked=0.0):
+        with self.lock:
+            self.records += records
+            self.busy += busy
+            self.blocked += blocked
+
+    @property
+    def throughput(self):
+        return self.records / self.busy if self.busy > 0 else 0.0
+
+    def __str__(self):
+        return '{} records at {:.0f}/s, {:.1f}s blocked'.format(self.records, self.throughput, self.blocked)
+
+
+class PageQueue(object):
+    # A bounded queue through which worker threads hand pages of records to the
+    # thread that stores them. Workers block while the queue is full, so memory
+    # use is bounded no matter how far the consumer falls behind.
+    def __init__(self, maxsize, counter=None):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stopped = threading.Event()
+        self.counter = counter
+
+    def put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def feed(self, pages):
+        # Run on a worker thread. Puts each page, followed by None once the pages
+        # are exhausted. Exceptions are handed over to be raised by the consumer.
+        # If we have a counter, time spent producing pages and time spent blocked on
+        # a full queue are recorded separately.
+        if self.stopped.is_set():
+            return
+
+        try:
+            pages = iter(pages)
+            while True:
+                start = monotonic()
+                page = next(pages, None)
+                if page is None:
+                    break
+
+                produced = monotonic()
+                if not self.put(page):
+                    return
+
+                if self.counter is not None:
+                    self.counter.add(len(page), produced - start, monotonic() - produced)
+        except Exception as e:
+            self.put(e)
+            return
+
+        self.put(None)
+
+    def get(self, timeout=None):
+        item = self.queue.get(timeout=timeout)
+        if isinstance(item, Exception):
+            raise item
+
+        return item
+
+    def stop(self):
+        # Release any workers blocked on a full queue if the consumer is bailing out.
+        self.stopped.set()
+
+
+class DependencyPrefetcher(object):
+    # Speculatively retrieves records that have been registered as dependencies of
+    # steps that haven't started yet, while earlier steps are still running. Records
+    # are held, up to max_records in total, until the step takes them. Dependencies
+    # that aren't retrieved, or don't fit, are left for the step to query itself.
+    BATCH_SIZE = 500
+
+    def __init__(self, context, max_records):
+        self.context = context
+        self.max_records = max_records
+        self.buffered = 0
+        self.records = {}
+        self.requested = {}
+        self.pending = {}
+        self.futures = {}
+        self.stopped = set()
+        self.lock = threading.Lock()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=context.api_concurrency)
+
+    def request(self, sobjectname, ids):
+        # Steps that extract all records will retrieve these dependencies anyway.
+        step = self.get_step(sobjectname)
+        if step is None or step.scope is ExtractionScope.ALL_RECORDS:
+            return
+
+        with self.lock:
+            if sobjectname in self.stopped or self.buffered >= self.max_records:
+                return
+
+            if sobjectname not in self.requested:
+                self.requested[sobjectname] = IdSet()
+                self.pending[sobjectname] = IdSet()
+
+            new_ids = ids - self.requested[sobjectname]
+            self.requested[sobjectname] |= new_ids
+            self.pending[sobjectname] |= new_ids
+
+            if len(self.pending[sobjectname]) >= self.BATCH_SIZE:
+                self.submit(sobjectname)
+
+    def flush(self):
+        with self.lock:
+            for sobjectname in list(self.pending):
+                self.submit(sobjectname)
+
+    def get_step(self, sobjectname):
+        return next((s for s in self.context.steps if s.sobjectname == sobjectname), None)
+
+    def submit(self, sobjectname):
+        # Called with the lock held.
+        ids = self.pending[sobjectname]
+        self.pending[sobjectname] = IdSet()
+        step = self.get_step(sobjectname)
+
+        if len(ids) == 0 or step is None or sobjectname in self.stopped:
+            return
+
+        for query in step.get_id_field_queries('Id', ids):
+            self.futures.setdefault(sobjectname, []).append(
+                self.executor.submit(self.retrieve, sobjectname, query)
+            )
+
+    def retrieve(self, sobjectname, query):
+        try:
+            for page in self.context.query_pages(query):
+                with self.lock:
+                    if self.buffered + len(page) > self.max_records:
+                        return
+
+                    self.records.setdefault(sobjectname, []).extend(page)
+                    self.buffered += len(page)
+        except Exception as e:
+            self.context.logger.debug('%s: unable to prefetch dependencies: %s', sobjectname, e)
+
+    def stop(self, sobjectname):
+        # Called when the step for sobjectname starts, after which we don't speculate on it.
+        # Queries already submitted are allowed to finish, since the step needs those records.
+        with self.lock:
+            self.stopped.add(sobjectname)
+            self.pending.pop(sobjectname, None)
+
+    def take(self, sobjectname):
+        # Returns the records retrieved for sobjectname, waiting for any queries outstanding.
+        self.stop(sobjectname)
+
+        with self.lock:
+            futures = self.futures.pop(sobjectname, [])
+
+        concurrent.futures.wait(futures)
+
+        with self.lock:
+            records = self.records.pop(sobjectname, [])
+            self.buffered -= len(records)
+
+        return records
+
+    def close(self):
+        with self.lock:
+            self.stopped.update(self.requested)
+            futures = [f for l in self.futures.values() for f in l]
+            self.futures = {}
+
+        for f in futures:
+            f.cancel()
+
+        self.executor.shutdown(wait=True)
+
+
+class RecordWriter(object):
+    # Writes extracted records to their output files on a background thread, so that
+    # processing results doesn't wait on CSV formatting and disk writes. The queue is
+    # bounded, so a slow disk holds back the stages feeding it instead of letting
+    # records pile up in memory.
+    def __init__(self, maxsize=16):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.counter = StageCounter()
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, output, records, mapper=None):
+        self.put(self.write_records, (output, records, mapper), len(records))
+
+    def write_text(self, f, text, count):
+        # Writes preformatted CSV rows straight to the output file.
+        self.put(f.write, (text,), count)
+
+    def put(self, function, args, count):
+        if self.error is not None:
+            raise self.error
+
+        self.queue.put((function, args, count))
+
+    def write_records(self, output, records, mapper):
+        for record in records:
+            output.writerow(mapper.transform_record(record) if mapper is not None else record)
+
+    def run(self):
+        while True:
+            start = monotonic()
+            item = self.queue.get()
+            self.counter.add(blocked=monotonic() - start)
+            if item is None:
+                return
+
+            (function, args, count) = item
+            if self.error is None:
+                start = monotonic()
+                try:
+                    function(*args)
+                except Exception as e:
+                    self.error = e
+
+                self.counter.add(count, monotonic() - start)
+
+    def close(self, raise_errors=True):
+        # Waits for all queued records to be written.
+        self.queue.put(None)
+        self.thread.join()
+
+        if self.error is not None and raise_errors:
+            raise self.error
+
+
+class DependentLookupCache(object):
+    # Holds the Id and dependent lookup columns of each record read during the insert pass,
+    # so that the dependent-update pass doesn't need to parse the input file again. Rows are
+    # kept in memory as tuples until there are more than max_rows of them, after which
+    # they're all written to a temporary CSV file.
+    def __init__(self, max_rows=100000):
+        self.max_rows = max_rows
+        self.columns = None
+        self.rows = []
+        self.file = None
+        self.writer = None
+        self.count = 0
+
+    def add(self, record):
+        if self.columns is None:
+            self.columns = list(record.keys())
+
+        row = tuple(record.get(k) for k in self.columns)
+        self.count += 1
+
+        if self.file is None and len(self.rows) >= self.max_rows:
+            self.file = tempfile.TemporaryFile(mode='w+', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            self.writer.writerows(self.rows)
+            self.rows = []
+
+        if self.writer is not None:
+            self.writer.writerow(row)
+        else:
+            self.rows.append(row)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        if self.file is None:
+            for row in self.rows:
+                yield dict(zip(self.columns, row))
+            return
+
+        self.file.flush()
+        self.file.seek(0)
+        try:
+            for row in csv.reader(self.file):
+                yield dict(zip(self.columns, row))
+        finally:
+            # Further rows are appended at the end.
+            self.file.seek(0, io.SEEK_END)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+        self.rows = []
+
+
 class FileStore(object):
     def __init__(self):
         self.store = {}
@@ -132,16 +1055,28 @@ class FileStore(object):
 
 
 class Operation(object):
+    # The maximum number of subrequests in a Composite Batch request.
+    DESCRIBE_BATCH_SIZE = 25
+
     def __init__(self, connection):
         self.steps = []
         self.connection = connection
         self._bulk = None
+        self._bulk_lock = threading.Lock()
         self.describe_info = {}
         self.field_maps = {}
         self.proxy_objects = {}
         self.key_prefix_map = None
+        self.global_describe = None
+        self.describe_cache = None
         self.logger = logging.getLogger('amaxa')
         self.file_store = FileStore()
+        self.api_concurrency = 4
+        self._api_slots = None
+        self._api_slots_lock = threading.Lock()
+        self.max_soql_length = 100000
+        self.max_query_url_length = 16000
+        self.jobs = 1
 
     def run(self):
         try:
@@ -159,14 +1094,80 @@ class Operation(object):
 
     @property
     def bulk(self):
-        if self._bulk is None:
-            self._bulk = salesforce_bulk.SalesforceBulk(
-                sessionId=self.connection.session_id,
-                host=urlparse(self.connection.bulk_url).hostname
-            )
+        # Steps running in parallel share one connection.
+        with self._bulk_lock:
+            if self._bulk is None:
+                self._bulk = salesforce_bulk.SalesforceBulk(
+                    sessionId=self.connection.session_id,
+                    host=urlparse(self.connection.bulk_url).hostname
+                )
         
         return self._bulk
 
+    @property
+    def api_slots(self):
+        # Shared by every worker thread in the operation, so that the total number
+        # of API calls in flight stays within api_concurrency.
+        with self._api_slots_lock:
+            if self._api_slots is None:
+                self._api_slots = threading.BoundedSemaphore(self.api_concurrency)
+
+        return self._api_slots
+
+    def query_pages(self, query):
+        # Yields each page of query results in turn, following nextRecordsUrl.
+        # The next page is requested in the background while the caller
+        # processes the current one.
+        with self.api_slots:
+            result = self.connection.query(query)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            while True:
+                next_page = None
+                if not result['done']:
+                    next_page = executor.submit(self.query_more, result['nextRecordsUrl'])
+
+                yield result['records']
+
+                if next_page is None:
+                    return
+
+                result = next_page.result()
+
+    def query_more(self, url):
+        with self.api_slots:
+            return self.connection.query_more(url, identifier_is_url=True)
+
+    def execute_steps_concurrently(self, execute, max_workers, is_ready, is_failed):
+        # Run execute(step) for each step in order, with up to max_workers steps running at once.
+        # A step starts once is_ready(step, completed) is true of the steps completed so far,
+        # and is_failed(step, result) tells whether it failed. If a step fails, we start no more
+        # steps, but allow those already running to finish.
+        remaining = list(self.steps)
+        completed = set()
+        running = {}
+        failed = False
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while (len(remaining) > 0 and not failed) or len(running) > 0:
+                if not failed:
+                    for s in [s for s in remaining if is_ready(s, completed)]:
+                        if len(running) >= max_workers:
+                            break
+
+                        remaining.remove(s)
+                        running[executor.submit(execute, s)] = s
+
+                (done, _) = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    s = running.pop(future)
+                    if is_failed(s, future.result()):
+                        failed = True
+                    else:
+                        completed.add(s)
+
+        return -1 if failed else 0
+
     def execute(self):
         pass
 
@@ -179,13 +1180,22 @@ class Operation(object):
 
     def get_sobject_name_for_id(self, id):
         if self.key_prefix_map is None:
-            global_describe = self.connection.describe()['sobjects']
+            global_describe = self.get_global_describe()['sobjects']
             self.key_prefix_map = {
                 sobject['keyPrefix']: sobject['name'] for sobject in global_describe
             }
         
         return self.key_prefix_map[id[:3]]
 
+    def get_global_describe(self):
+        if self.global_describe is None:
+            if self.describe_cache is not None:
+                self.global_describe = self.describe_cache.get_global_describe()
+            else:
+                self.global_describe = self.connection.describe()
+
+        return self.global_describe
+
     def get_proxy_object(self, sobjectname):
         if sobjectname not in self.proxy_objects:
             self.proxy_objects[sobjectname] = getattr(self.connection, sobjectname)
@@ -194,11 +1204,75 @@ class Operation(object):
 
     def get_describe(self, sobjectname):
         if sobjectname not in self.describe_info:
-            self.describe_info[sobjectname] = self.get_proxy_object(sobjectname).describe()
-            self.field_maps[sobjectname] = { f.get('name') : f for f in self.describe_info[sobjectname].get('fields') }
+            if self.describe_cache is not None:
+                self.set_describe(sobjectname, self.describe_cache.get_describe(sobjectname))
+            else:
+                self.set_describe(sobjectname, self.get_proxy_object(sobjectname).describe())
 
         return self.describe_info[sobjectname]
 
+    def set_describe(self, sobjectname, describe):
+        self.describe_info[sobjectname] = describe
+        self.field_maps[sobjectname] = { f.get('name') : f for f in describe.get('fields') }
+
+    def prefetch_describes(self, sobjectnames):
+        # Retrieves the describes for all of the given sObjects up front, 25 to a
+        # Composite Batch request, with the requests themselves made concurrently.
+        # Anything not retrieved here (unknown sObjects, or failed requests) is left
+        # for get_describe() to retrieve and report errors on.
+        known_sobjects = set(sobject['name'] for sobject in self.get_global_describe()['sobjects'])
+        to_fetch = []
+
+        for sobjectname in sorted(set(sobjectnames)):
+            if sobjectname in self.describe_info or sobjectname not in known_sobjects:
+                continue
+
+            describe = None
+            if self.describe_cache is not None:
+                describe = self.describe_cache.get_cached_describe(sobjectname)
+
+            if describe is not None:
+                self.set_describe(sobjectname, describe)
+            else:
+                to_fetch.append(sobjectname)
+
+        batches = [
+            to_fetch[i:i + self.DESCRIBE_BATCH_SIZE]
+            for i in range(0, len(to_fetch), self.DESCRIBE_BATCH_SIZE)
+        ]
+        if len(batches) == 0:
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.api_concurrency) as executor:
+            for (batch, results) in zip(batches, executor.map(self.describe_batch, batches)):
+                for (sobjectname, result) in zip(batch, results):
+                    if result['statusCode'] == 200:
+                        self.set_describe(sobjectname, result['result'])
+                        if self.describe_cache is not None:
+                            self.describe_cache.store_describe(sobjectname, result['result'])
+
+    def describe_batch(self, sobjectnames):
+        try:
+            with self.api_slots:
+                result = self.connection.restful(
+                    'composite/batch',
+                    method='POST',
+                    data=json.dumps({
+                        'batchRequests': [
+                            {
+                                'method': 'GET',
+                                'url': 'v{}/sobjects/{}/describe'.format(self.connection.sf_version, sobjectname)
+                            }
+                            for sobjectname in sobjectnames
+                        ]
+                    })
+                )
+
+            return result['results']
+        except Exception as e:
+            self.logger.debug('Unable to retrieve describes for %s in a batch: %s', ', '.join(sobjectnames), e)
+            return []
+
     def get_field_map(self, sobjectname):
         if sobjectname not in self.describe_info:
             self.get_describe(sobjectname)
@@ -272,6 +1346,7 @@ class LoadOperation(Operation):
         self.mappers = {}
         self.global_id_map = {}
         self.success = True
+        self.failed_sobjects = set()
         self.stage = LoadStage.INSERTS
 
     def register_new_id(self, sobjectname, old_id, new_id):
@@ -291,6 +1366,7 @@ class LoadOperation(Operation):
             }
         )
         self.success = False
+        self.failed_sobjects.add(sobjectname)
 
     def get_new_id(self, old_id):
         return self.global_id_map.get(old_id, None)
@@ -310,24 +1386,45 @@ class LoadOperation(Operation):
             self.stage = LoadStage.DEPENDENTS
 
         if self.stage is LoadStage.DEPENDENTS:
-            for s in self.steps:
-                self.logger.info('%s: populating dependent and self-lookups', s.sobjectname)
-                s.execute_dependent_updates()
-
-                if not self.success:
-                    self.logger.error('%s: errors took place during dependent updates. See results file for details.', s.sobjectname)
-                    return -1
+            return self.execute_dependent_updates()
 
         return 0
 
+    def execute_dependent_updates(self):
+        # Every record has been inserted and every new Id is known, so the steps' updates
+        # don't depend on one another. We run up to api_concurrency steps at once, all
+        # sharing the operation's Bulk API connection.
+        def execute_step(s):
+            self.logger.info('%s: populating dependent and self-lookups', s.sobjectname)
+            s.execute_dependent_updates()
+
+        def is_failed(s, result):
+            if s.sobjectname in self.failed_sobjects:
+                self.logger.error('%s: errors took place during dependent updates. See results file for details.', s.sobjectname)
+                return True
+
+            return False
+
+        return self.execute_steps_concurrently(
+            execute_step,
+            self.api_concurrency,
+            lambda s, completed: True,
+            is_failed
+        )
+
 
 class LoadStep(Step):
-    def __init__(self, sobjectname, field_scope, outside_lookup_behavior=OutsideLookupBehavior.INCLUDE):
+    # The largest number of records the Bulk API accepts in one batch.
+    MAX_BATCH_SIZE = 10000
+
+    def __init__(self, sobjectname, field_scope, outside_lookup_behavior=OutsideLookupBehavior.INCLUDE, batch_size=MAX_BATCH_SIZE):
         self.sobjectname = sobjectname
         self.field_scope = field_scope
         self.outside_lookup_behavior = outside_lookup_behavior
+        self.batch_size = batch_size
         self.lookup_behaviors = {}
         self.dependent_lookup_records = []
+        self.dependent_lookup_cache = None
 
         self.context = None
 
@@ -343,7 +1440,7 @@ class LoadStep(Step):
 
         b = self.get_lookup_behavior_for_field(lookup)
 
-        mapped_id = self.context.get_new_id(SalesforceId(value))
+        mapped_id = self.context.get_new_id(SalesforceId.intern(value))
 
         if mapped_id is not None:
             return str(mapped_id)
@@ -404,69 +1501,99 @@ class LoadStep(Step):
         # Read our incoming file.
         # Apply transformations specified in our configuration file (column name -> field name, for example)
         # Then, populate all direct lookups. Dependent lookups and self-lookups will be populated in a later pass.
-        records_to_load = []
-        original_ids = []
+        # Records are posted to the Bulk API a batch at a time while we're still reading the file,
+        # so only the batch being filled and the original Ids of posted batches are held in memory.
         success = True
+        cache = None
 
-        reader = self.context.file_store.get_csv(self.sobjectname, FileType.INPUT)
-        for record in reader:
-            # We might have resumed this operation. Check to be sure this record hasn't been loaded already.
-            if self.context.get_new_id(SalesforceId(record['Id'])) is not None:
-                continue
+        if len(self.dependent_lookups | self.self_lookups) > 0:
+            if self.dependent_lookup_cache is not None:
+                self.dependent_lookup_cache.close()
+            cache = self.dependent_lookup_cache = DependentLookupCache()
 
-            # We need to save off the original record Id because it'll be cleaned from the record before insert.
-            # We use the original Id for error reporting.
-            original_ids.append(record['Id'])
+        def get_records_to_load():
+            nonlocal success
 
-            # Then, prep this record for the Bulk API, populate its lookups, apply transforms, and clean dependent lookups
-            try:
-                record = self.primitivize(
-                    self.populate_lookups(
-                        self.clean_dependent_lookups(
-                            self.transform_record(
-                                record
+            reader = self.context.file_store.get_csv(self.sobjectname, FileType.INPUT)
+            for record in reader:
+                # Keep the columns the dependent-update pass will need, for every record.
+                if cache is not None:
+                    cache.add(self.extract_dependent_lookups(record))
+
+                # We might have resumed this operation. Check to be sure this record hasn't been loaded already.
+                if self.context.get_new_id(SalesforceId.intern(record['Id'])) is not None:
+                    continue
+
+                # We need to save off the original record Id because it'll be cleaned from the record before insert.
+                # We use the original Id for error reporting.
+                original_id = record['Id']
+
+                # Then, prep this record for the Bulk API, populate its lookups, apply transforms, and clean dependent lookups
+                try:
+                    yield (
+                        original_id,
+                        self.primitivize(
+                            self.populate_lookups(
+                                self.clean_dependent_lookups(
+                                    self.transform_record(
+                                        record
+                                    )
+                                ),
+                                self.descendent_lookups,
+                                original_id
                             )
-                        ),
-                        self.descendent_lookups,
-                        original_ids[-1]
+                        )
                     )
-                )
-                records_to_load.append(record)
-            except AmaxaException as e:
-                self.context.register_error(self.sobjectname, original_ids[-1], str(e))
-                success = False
-            except ValueError as e:
-                self.context.register_error(self.sobjectname, original_ids[-1], 'Bad data in record {}: {}'.format(original_ids[-1], str(e)))
-                success = False
-
-        if not success or len(records_to_load) == 0:
-            return
+                except AmaxaException as e:
+                    self.context.register_error(self.sobjectname, original_id, str(e))
+                    success = False
+                except ValueError as e:
+                    self.context.register_error(self.sobjectname, original_id, 'Bad data in record {}: {}'.format(original_id, str(e)))
+                    success = False
+
+        # Once a record has failed, we post no further batches, but keep reading to report every bad record.
+        self.load_batches(
+            self.context.bulk.create_insert_job,
+            (b for b in BatchIterator(get_records_to_load(), self.batch_size) if success),
+            self.handle_insert_result
+        )
+
+    def load_batches(self, create_job, batches, handle_result):
+        # Post each batch of (original Id, record) pairs as it's produced, creating the job
+        # when the first batch is ready. Salesforce processes the batches of a job in parallel,
+        # and each batch's results are handled as soon as it completes.
+        job = None
+        reconciler = BatchResultReconciler(self.context.bulk, handle_result)
+        for record_batch in batches:
+            if job is None:
+                job = create_job(self.sobjectname, contentType='JSON')
 
-        job = self.context.bulk.create_insert_job(self.sobjectname, contentType='JSON')
-        batches = []
-        for record_batch in BatchIterator(iter(records_to_load)):
-            json_iter = JSONIterator(record_batch)
-            batches.append(self.context.bulk.post_batch(job, json_iter))
+            json_iter = JSONIterator([record for (original_id, record) in record_batch])
+            batch = self.context.bulk.post_batch(job, json_iter)
+            reconciler.add_batch(job, batch, [original_id for (original_id, record) in record_batch])
 
-        for batch in batches:
-            self.context.bulk.wait_for_batch(job, batch)
+            # Handle the results of batches that have already completed.
+            reconciler.poll()
+
+        if job is None:
+            return
 
         self.context.bulk.close_job(job)
-        
-        for batch in batches:
-            for i, r in enumerate(self.context.bulk.get_batch_results(batch, job)):
-                if r.success:
-                    self.context.register_new_id(
-                        self.sobjectname,
-                        SalesforceId(original_ids[i]),
-                        SalesforceId(r.id) # note lowercase in result
-                    )
-                else:
-                    self.context.register_error(
-                        self.sobjectname,
-                        original_ids[i],
-                        self.format_error(r.error)
-                    )
+        reconciler.finish()
+
+    def handle_insert_result(self, original_id, result):
+        if result.success:
+            self.context.register_new_id(
+                self.sobjectname,
+                SalesforceId.intern(original_id),
+                SalesforceId.intern(result.id) # note lowercase in result
+            )
+        else:
+            self.context.register_error(
+                self.sobjectname,
+                original_id,
+                self.format_error(result.error)
+            )
 
     def format_error(self, error):
         return '\n'.join(
@@ -490,16 +1617,21 @@ class LoadStep(Step):
 
     def execute_dependent_updates(self):
         # Populate dependent and self-lookups in a single pass
-        records_to_load = []
-        original_ids = []
         all_lookups = self.dependent_lookups | self.self_lookups
         success = True
 
-        if len(all_lookups) > 0:
+        def get_records_to_update():
+            nonlocal success
+
             # Re-check, for each record, whether we have any loading to do.
             # If all of the dependent lookups prove to be dropped outside references, we have no work to do.
-            self.reset_input_csv()
-            reader = self.context.file_store.get_csv(self.sobjectname, FileType.INPUT)
+            # The insert pass cached the columns we need, unless we've resumed after it.
+            if self.dependent_lookup_cache is not None:
+                reader = self.dependent_lookup_cache
+            else:
+                self.reset_input_csv()
+                reader = self.context.file_store.get_csv(self.sobjectname, FileType.INPUT)
+
             for record in reader:
                 try:
                     cleaned_record = self.populate_lookups(
@@ -509,27 +1641,31 @@ class LoadStep(Step):
                     )
                     if len(list(filter(lambda r: r is not None and r != '', cleaned_record.values()))) > 1: # 1 for the Id
                         # Populate the new Id for this record
-                        original_ids.append(cleaned_record['Id'])
-                        cleaned_record['Id'] = str(self.context.get_new_id(SalesforceId(cleaned_record['Id'])))
-                        records_to_load.append(cleaned_record)
+                        original_id = cleaned_record['Id']
+                        cleaned_record['Id'] = str(self.context.get_new_id(SalesforceId.intern(cleaned_record['Id'])))
+                        yield (original_id, cleaned_record)
                 except AmaxaException as e:
                     self.context.register_error(self.sobjectname, record['Id'], str(e))
                     success = False
-            
-            if success and len(records_to_load) > 0:
-                job = self.context.bulk.create_update_job(self.sobjectname, contentType='JSON')
-                json_iter = JSONIterator(records_to_load)
-                batch = self.context.bulk.post_batch(job, json_iter)
-                self.context.bulk.wait_for_batch(job, batch)
-                self.context.bulk.close_job(job)
-
-                for i, r in enumerate(self.context.bulk.get_batch_results(batch, job)):
-                    if not r.success:
-                        self.context.register_error(
-                            self.sobjectname, 
-                            original_ids[i],
-                            self.format_error(r.error)
-                        )
+
+        if len(all_lookups) > 0:
+            self.load_batches(
+                self.context.bulk.create_update_job,
+                (b for b in BatchIterator(get_records_to_update(), self.batch_size) if success),
+                self.handle_update_result
+            )
+
+        if self.dependent_lookup_cache is not None:
+            self.dependent_lookup_cache.close()
+            self.dependent_lookup_cache = None
+
+    def handle_update_result(self, original_id, result):
+        if not result.success:
+            self.context.register_error(
+                self.sobjectname,
+                original_id,
+                self.format_error(result.error)
+            )
 
 
 class ExtractOperation(Operation):
@@ -538,73 +1674,269 @@ class ExtractOperation(Operation):
         self.required_ids = {}
         self.extracted_ids = {}
         self.mappers = {}
+        self.reference_views = {}
+        self.reference_views_by_target = {}
+        self.extracted_id_versions = {}
+        self.extracted_id_logs = {}
+        self.id_queries_saved = 0
+        self.prefetch_dependencies = False
+        self.prefetch_buffer_size = 50000
+        self.prefetcher = None
+        self.writer = None
+        self.lock = threading.RLock()
+
+    def initialize(self):
+        super().initialize()
+
+        # Once the steps know their lookups, set up a reference view for each lookup
+        # whose references are checked against extracted Ids.
+        for s in self.steps:
+            for f in s.descendent_lookups | s.self_lookups:
+                self.get_reference_view(s.sobjectname, f)
 
     def execute(self):
         self.logger.info('Starting extraction with sObjects %s', self.get_sobject_list())
-        for s in self.steps:
-            self.logger.info('%s: starting extraction', s.sobjectname)
-            s.execute()
-            if len(s.errors) > 0:
-                self.logger.error('%s: errors took place during extraction:\n%s', s.sobjectname, '\n'.join(s.errors))
-                return -1
+
+        if self.prefetch_dependencies:
+            self.prefetcher = DependencyPrefetcher(self, self.prefetch_buffer_size)
+        self.writer = RecordWriter()
+
+        try:
+            if self.jobs > 1:
+                result = self.execute_steps_in_parallel()
             else:
-                self.logger.info(
-                    '%s: extracted %d record%s',
-                    s.sobjectname,
-                    len(self.get_extracted_ids(s.sobjectname)),
-                    's' if len(self.get_extracted_ids(s.sobjectname)) != 1 else ''
-                )
+                result = 0
+                for s in self.steps:
+                    if not self.execute_step(s):
+                        result = -1
+                        break
+        except BaseException:
+            # Don't let an error from closing the writer replace the one in flight.
+            self.close_background_stages(raise_errors=False)
+            raise
 
-        return 0
+        self.close_background_stages()
+
+        if result == 0 and self.id_queries_saved > 0:
+            self.logger.info('Saved %d Id-list queries by packing Ids to the org\'s query limits', self.id_queries_saved)
+
+        return result
+
+    def execute_step(self, s):
+        self.logger.info('%s: starting extraction', s.sobjectname)
+        if self.prefetcher is not None:
+            self.prefetcher.stop(s.sobjectname)
+
+        s.execute()
+
+        if self.prefetcher is not None:
+            self.prefetcher.flush()
+
+        if len(s.errors) > 0:
+            self.logger.error('%s: errors took place during extraction:\n%s', s.sobjectname, '\n'.join(s.errors))
+            return False
+        else:
+            self.logger.info(
+                '%s: extracted %d record%s',
+                s.sobjectname,
+                len(self.get_extracted_ids(s.sobjectname)),
+                's' if len(self.get_extracted_ids(s.sobjectname)) != 1 else ''
+            )
+
+        return True
+
+    def close_background_stages(self, raise_errors=True):
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
+
+        writer = self.writer
+        self.writer = None
+        writer.close(raise_errors)
+        self.logger.debug('Wrote %s', writer.counter)
+
+    def execute_steps_in_parallel(self):
+        # Run each step as soon as every earlier step it's connected to has completed,
+        # with up to `jobs` steps running at once.
+        dependencies = self.get_step_dependencies()
+
+        return self.execute_steps_concurrently(
+            self.execute_step,
+            self.jobs,
+            lambda s, completed: dependencies[s] <= completed,
+            lambda s, result: not result
+        )
+
+    def get_step_dependencies(self):
+        # A step must wait for each earlier step to which it is connected by a lookup:
+        # either one of its descendent lookups refers to the earlier step's sObject,
+        # or one of the earlier step's dependent lookups refers to this step's sObject.
+        # Steps with no connection, such as siblings under a common parent, are independent.
+        dependencies = {}
+
+        for (i, step) in enumerate(self.steps):
+            field_map = self.get_field_map(step.sobjectname)
+            dependencies[step] = set()
+
+            for earlier in self.steps[:i]:
+                earlier_field_map = self.get_field_map(earlier.sobjectname)
+
+                if any(earlier.sobjectname in field_map[f]['referenceTo'] for f in step.descendent_lookups) \
+                    or any(step.sobjectname in earlier_field_map[f]['referenceTo'] for f in earlier.dependent_lookups):
+                    dependencies[step].add(earlier)
+
+        return dependencies
 
     def add_dependency(self, sobjectname, id):
-        if sobjectname not in self.required_ids:
-            self.required_ids[sobjectname] = set()
-        if id not in self.get_extracted_ids(sobjectname):
-            self.required_ids[sobjectname].add(id)
+        self.add_dependencies(sobjectname, [id])
+
+    def add_dependencies(self, sobjectname, ids):
+        # Steps running in parallel may register dependencies for the same sObject.
+        with self.lock:
+            if sobjectname not in self.required_ids:
+                self.required_ids[sobjectname] = IdSet()
+            new_ids = IdSet(ids) - self.get_extracted_ids(sobjectname)
+            self.required_ids[sobjectname] |= new_ids
+
+        if self.prefetcher is not None and len(new_ids) > 0:
+            self.prefetcher.request(sobjectname, new_ids)
 
     def get_dependencies(self, sobjectname):
-        return self.required_ids[sobjectname] if sobjectname in self.required_ids else set()
+        return self.required_ids[sobjectname] if sobjectname in self.required_ids else IdSet()
 
     def get_sobject_ids_for_reference(self, sobjectname, field):
-        ids = set()
-        for name in self.get_field_map(sobjectname)[field]['referenceTo']:
-            # For each sObject that we've extracted data for,
-            # if that object is a potential reference target for this field,
-            # accumulate those Ids in a Set.
-            if name in self.extracted_ids:
-                ids |= self.extracted_ids[name]
+        # Returns the live set of extracted Ids to which this field may refer.
+        # Callers must not modify it.
+        return self.get_reference_view(sobjectname, field).ids
+
+    def get_reference_view(self, sobjectname, field):
+        with self.lock:
+            if (sobjectname, field) not in self.reference_views:
+                # Each sObject that is a potential reference target for this field contributes
+                # its extracted Ids to the view.
+                targets = self.get_field_map(sobjectname)[field]['referenceTo']
+                for name in targets:
+                    if name not in self.extracted_ids:
+                        self.extracted_ids[name] = IdSet()
 
-        return ids
+                view = ReferenceView(self, targets, [self.extracted_ids[name] for name in targets])
+                if len(targets) > 1:
+                    for name in targets:
+                        self.reference_views_by_target.setdefault(name, []).append(view)
+
+                self.reference_views[(sobjectname, field)] = view
+
+            return self.reference_views[(sobjectname, field)]
+
+    def log_extracted_ids(self, sobjectname):
+        # Called with the lock held. Starts logging the Ids extracted for sobjectname, if we
+        # aren't already, and returns its version: the number of Ids extracted so far.
+        version = self.extracted_id_versions.get(sobjectname, 0)
+        if sobjectname not in self.extracted_id_logs:
+            self.extracted_id_logs[sobjectname] = (version, array.array('Q'))
+
+        return version
+
+    def get_extracted_id_log(self, sobjectname, version):
+        # Called with the lock held. Returns the keys of the Ids extracted for sobjectname
+        # after the given version, which must have come from log_extracted_ids().
+        (start, log) = self.extracted_id_logs[sobjectname]
+
+        return log[version - start:]
 
     def get_extracted_ids(self, sobjectname):
-        return self.extracted_ids[sobjectname] if sobjectname in self.extracted_ids else set()
+        return self.extracted_ids[sobjectname] if sobjectname in self.extracted_ids else IdSet()
 
     def store_result(self, sobjectname, record):
-        if sobjectname not in self.extracted_ids:
-            self.extracted_ids[sobjectname] = set()
-
-        if SalesforceId(record['Id']) not in self.extracted_ids[sobjectname]:
-            self.logger.debug('%s: extracting record %s', sobjectname, SalesforceId(record['Id']))
-            self.extracted_ids[sobjectname].add(SalesforceId(record['Id']))
-            self.file_store.get_csv(sobjectname, FileType.OUTPUT).writerow(
-                self.mappers[sobjectname].transform_record(record) if sobjectname in self.mappers
-                else record
-            )
+        self.store_results(sobjectname, [record])
+
+    def store_results(self, sobjectname, records):
+        with self.lock:
+            if sobjectname not in self.extracted_ids:
+                self.extracted_ids[sobjectname] = IdSet()
+
+        extracted_ids = self.extracted_ids[sobjectname]
+        output = self.file_store.get_csv(sobjectname, FileType.OUTPUT)
+        mapper = self.mappers.get(sobjectname)
+        new_ids = IdSet()
+        new_records = []
+        keys = []
+
+        # Each Id is encoded once, and the key is used for every set operation below.
+        for record in records:
+            key = IdSet.encode(record['Id'])
+            keys.append(key)
+            if not extracted_ids.contains_key(key) and not new_ids.contains_key(key):
+                self.logger.debug('%s: extracting record %s', sobjectname, record['Id'])
+                new_ids.add_key(key)
+                new_records.append(record)
+
+        # Records are written on the writer's thread while an extraction is running.
+        if self.writer is not None:
+            self.writer.write(output, new_records, mapper)
+        else:
+            for record in new_records:
+                output.writerow(mapper.transform_record(record) if mapper is not None else record)
+
+        self.register_extracted_ids(sobjectname, new_ids, keys)
+
+    def store_csv_page(self, sobjectname, page):
+        # Stores a page of raw CSV rows, which must be in the output file's format
+        # and must not repeat any record already extracted.
+        f = self.file_store.get_file(sobjectname, FileType.OUTPUT)
+
+        if self.writer is not None:
+            self.writer.write_text(f, page.text, len(page))
+        else:
+            f.write(page.text)
 
-        if sobjectname in self.required_ids and SalesforceId(record['Id']) in self.required_ids[sobjectname]:
-            self.required_ids[sobjectname].remove(SalesforceId(record['Id']))
+        keys = [IdSet.encode(id) for id in page.ids]
+        self.register_extracted_ids(sobjectname, IdSet.from_keys(keys), keys)
+
+    def register_extracted_ids(self, sobjectname, new_ids, keys):
+        # Extracted Ids and the reference views that depend on them change together.
+        # keys holds the encoded Ids of every stored record, which are no longer required.
+        with self.lock:
+            if sobjectname not in self.extracted_ids:
+                self.extracted_ids[sobjectname] = IdSet()
+
+            if len(new_ids) > 0:
+                self.extracted_ids[sobjectname].update(new_ids)
+                self.extracted_id_versions[sobjectname] = self.extracted_id_versions.get(sobjectname, 0) + len(new_ids)
+                if sobjectname in self.extracted_id_logs:
+                    self.extracted_id_logs[sobjectname][1].extend(new_ids.keys)
+                for view in self.reference_views_by_target.get(sobjectname, []):
+                    view.update(new_ids)
+
+            if sobjectname in self.required_ids:
+                required_ids = self.required_ids[sobjectname]
+                for key in keys:
+                    required_ids.discard_key(key)
 
 
 class ExtractionStep(Step):
-    def __init__(self, sobjectname, scope, field_scope, where_clause=None, self_lookup_behavior=SelfLookupBehavior.TRACE_ALL, outside_lookup_behavior=OutsideLookupBehavior.INCLUDE):
+    # Rough timings used to choose a strategy for descendent extraction.
+    REST_QUERY_SECONDS = 0.5
+    BULK_JOB_SECONDS = 15
+    BULK_RECORDS_PER_SECOND = 5000
+
+    # Clauses that a parent's query may contain, but a semi-join subquery may not.
+    UNNESTABLE_CLAUSES = re.compile(r'\b(SELECT|ORDER\s+BY|LIMIT|OFFSET)\b', re.IGNORECASE)
+    STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'")
+
+    def __init__(self, sobjectname, scope, field_scope, where_clause=None, self_lookup_behavior=SelfLookupBehavior.TRACE_ALL, outside_lookup_behavior=OutsideLookupBehavior.INCLUDE, pk_chunk_size=None, descendent_strategy=DescendentStrategy.ID_LIST):
         super().__init__(sobjectname, field_scope)
         self.scope = scope
         self.where_clause = where_clause
+        self.pk_chunk_size = pk_chunk_size
+        self.descendent_strategy = descendent_strategy
+        self.bulk_result_count = 0
+        self.counters = { 'fetch': StageCounter(), 'process': StageCounter() }
         self.self_lookup_behavior = self_lookup_behavior
         self.outside_lookup_behavior = outside_lookup_behavior
         self.lookup_behaviors = {}
         self.errors = []
+        self.self_lookup_rounds = []
 
     def set_lookup_behavior_for_field(self, f, behavior):
         self.lookup_behaviors[f] = behavior
@@ -624,21 +1956,43 @@ class ExtractionStep(Step):
         # perform a query to extract those records by Id.
 
         if self.scope == ExtractionScope.ALL_RECORDS:
+            if self.can_pass_through_csv():
+                self.perform_bulk_csv_pass()
+                return
+
             query = 'SELECT {} FROM {}'.format(self.get_field_list(), self.sobjectname)
 
             self.context.logger.debug('%s: extracting all records using Bulk API query %s', self.sobjectname, query)
             self.perform_bulk_api_pass(query)
             return
         elif self.scope == ExtractionScope.QUERY:
-            query = 'SELECT {} FROM {} WHERE {}'.format(self.get_field_list(), self.sobjectname, self.where_clause)
+            if self.can_pass_through_csv():
+                self.perform_bulk_csv_pass(self.where_clause)
+            else:
+                query = 'SELECT {} FROM {} WHERE {}'.format(self.get_field_list(), self.sobjectname, self.where_clause)
 
-            self.context.logger.debug('%s: extracting filtered records using Bulk API query %s', self.sobjectname, query)
-            self.perform_bulk_api_pass(query)
+                self.context.logger.debug('%s: extracting filtered records using Bulk API query %s', self.sobjectname, query)
+                self.perform_bulk_api_pass(query)
         elif self.scope == ExtractionScope.DESCENDENTS:
             self.context.logger.debug('%s: extracting descendent records based on lookups %s', self.sobjectname, ', '.join(self.descendent_lookups))
 
-            for f in self.descendent_lookups:
-                self.perform_lookup_pass(f)
+            strategy = self.descendent_strategy
+            if strategy is DescendentStrategy.AUTO:
+                strategy = self.choose_descendent_strategy()
+
+            if strategy is DescendentStrategy.FULL_SCAN:
+                self.perform_full_scan_pass()
+            else:
+                for f in self.descendent_lookups:
+                    query = None
+                    if strategy is DescendentStrategy.SEMI_JOIN:
+                        query = self.get_semi_join_query(f)
+
+                    if query is not None:
+                        self.context.logger.debug('%s: extracting descendents by %s using Bulk API query %s', self.sobjectname, f, query)
+                        self.perform_bulk_api_pass(query)
+                    else:
+                        self.perform_lookup_pass(f)
 
         # Fall through to grab all dependencies registered with the context, or SELECTED_RECORDS
         # Note that if we're tracing self-lookups, the parent objects of all extracted records so far
@@ -657,97 +2011,160 @@ class ExtractionStep(Step):
             # Note that the initial parent query is handled in the dependency pass above, so we start on children.
 
             self.context.logger.debug('%s: recursing to trace self-lookups', self.sobjectname)
+            self.trace_self_lookups()
+
+    def trace_self_lookups(self):
+        # Each round, we only query for children of records we have not already queried
+        # via the same lookup field (the "frontier"). Re-querying every extracted Id would
+        # make tracing deep hierarchies quadratic in API calls. Each field's reference view
+        # tells us which Ids have been added since the version we last queried.
+        views = { l: self.context.get_reference_view(self.sobjectname, l) for l in self.self_lookups }
+        queried = { l: None for l in self.self_lookups }
+        self.self_lookup_rounds = []
+
+        while True:
+            before_count = len(self.context.get_extracted_ids(self.sobjectname))
+
+            # Children
+            round_count = 0
+            for l in self.self_lookups:
+                (frontier, queried[l]) = views[l].get_ids_since(queried[l])
+                round_count += len(frontier)
+
+                self.perform_id_field_pass(l, frontier)
+
+            # Parents
+            self.resolve_registered_dependencies()
+
+            self.self_lookup_rounds.append(round_count)
+            self.context.logger.debug(
+                '%s: self-lookup tracing round %d queried %d Ids',
+                self.sobjectname,
+                len(self.self_lookup_rounds),
+                round_count
+            )
 
-            while True:
-                before_count = len(self.context.get_extracted_ids(self.sobjectname))
-
-                # Children
-                for l in self.self_lookups:
-                    self.perform_lookup_pass(l)
-
-                # Parents
-                self.resolve_registered_dependencies()
+            after_count = len(self.context.get_extracted_ids(self.sobjectname))
 
-                after_count = len(self.context.get_extracted_ids(self.sobjectname))
+            if before_count == after_count:
+                break
 
-                if before_count == after_count:
-                    break
+        self.context.logger.debug(
+            '%s: traced self-lookups in %d round%s (%s Ids queried)',
+            self.sobjectname,
+            len(self.self_lookup_rounds),
+            's' if len(self.self_lookup_rounds) != 1 else '',
+            ', '.join([str(c) for c in self.self_lookup_rounds])
+        )
 
     def store_result(self, result):
-        # Examine the received data to determine whether we have any cross-hierarchy lookups
-        # or down-hierarchy dependencies to register
+        self.store_results([result])
+
+    def store_results(self, records):
+        # Examine a page of received data to determine whether we have any cross-hierarchy lookups
+        # or down-hierarchy dependencies to register. We work a column at a time: lookup values
+        # are collected into sets and registered together, and polymorphic lookups are classified
+        # once per key prefix rather than once per record.
+        if len(records) == 0:
+            return
 
         field_map = self.context.get_field_map(self.sobjectname)
         sobject_list = self.context.get_sobject_list()
 
-        # Add a dependency for the reference in each self lookup of this record.
+        # Add a dependency for the reference in each self lookup of these records.
         for l in self.self_lookups:
-            if self.get_self_lookup_behavior_for_field(l) is not SelfLookupBehavior.TRACE_NONE and result[l] is not None:
-                self.context.add_dependency(self.sobjectname, SalesforceId(result[l]))
+            if self.get_self_lookup_behavior_for_field(l) is not SelfLookupBehavior.TRACE_NONE:
+                self.add_dependencies(self.sobjectname, self.get_lookup_values(records, l))
 
         # Register any dependencies from dependent lookups
         # Note that a dependent lookup can *also* be a descendent lookup (e.g. Task.WhatId),
         # so we handle polymorphic lookups carefully
         for f in self.dependent_lookups:
-            lookup_value = result[f]
-            if lookup_value is not None:
-                # Determine what sObject this Id looks up to
-                # If this is a regular lookup, it's the target of the field, and is always dependent.
-                # If this lookup is polymorphic, we have to determine it based on the Id itself,
-                # and this value may actually be a cross-hierarchy reference or descendent reference.
-                if len(field_map[f]['referenceTo']) > 1:
-                    target_sobject = self.context.get_sobject_name_for_id(lookup_value)
+            lookup_values = self.get_lookup_values(records, f)
 
+            # If this is a regular lookup, the target of the field is always dependent.
+            # If this lookup is polymorphic, we have to determine the target based on each Id's key prefix,
+            # and the value may actually be a cross-hierarchy reference or descendent reference.
+            if len(field_map[f]['referenceTo']) > 1:
+                for (target_sobject, ids) in self.group_by_target(lookup_values).items():
                     if target_sobject not in sobject_list:
                         continue # Ignore references to objects not in our extraction.
 
-                    # Determine if this is really a dependent connection, or if it's a descendent
-                    # that should be handled below.
-                    # The descendent code looks for cross-hierarchy references
+                    # Descendent references are handled below, which looks for cross-hierarchy references.
                     if sobject_list.index(target_sobject) < sobject_list.index(self.sobjectname):
                         continue
 
-                    # Otherwise, fall through to add a dependency
-                else:
-                    target_sobject = field_map[f]['referenceTo'][0]
+                    self.add_dependencies(target_sobject, ids)
+            else:
+                self.add_dependencies(field_map[f]['referenceTo'][0], lookup_values)
 
-                self.context.add_dependency(target_sobject, SalesforceId(lookup_value)) 
-        
         # Check for cross-hierarchy lookup values:
         # references to records above us in the extraction hierarchy, but that weren't extracted already.
         for f in self.descendent_lookups:
-            lookup_value = result[f]
+            polymorphic = len(field_map[f]['referenceTo']) > 1
+            extracted_ids = {}
 
-            if (lookup_value == None):
-                continue
+            for result in records:
+                lookup_value = result[f]
 
-            if len(field_map[f]['referenceTo']) == 1:
-                target_sobject = field_map[f]['referenceTo'][0]
-            else:
-                target_sobject = self.context.get_sobject_name_for_id(lookup_value)
-            
-            if lookup_value not in self.context.get_extracted_ids(target_sobject):
-                # This is a cross-hierarchy reference
-                behavior = self.get_outside_lookup_behavior_for_field(f)
-
-                if behavior is OutsideLookupBehavior.DROP_FIELD:
-                    del result[f]
-                elif behavior is OutsideLookupBehavior.INCLUDE:
+                if lookup_value is None:
                     continue
-                elif behavior is OutsideLookupBehavior.ERROR:
-                    self.errors.append(
-                        '{} {} has an outside reference in field {} ({}), which is not allowed by the extraction configuration.'.format(
-                            self.sobjectname,
-                            result['Id'],
-                            f,
-                            result[f]
+
+                key = lookup_value[:3] if polymorphic else None
+                if key not in extracted_ids:
+                    target_sobject = self.context.get_sobject_name_for_id(lookup_value) if polymorphic \
+                        else field_map[f]['referenceTo'][0]
+                    extracted_ids[key] = self.context.get_extracted_ids(target_sobject)
+
+                if lookup_value not in extracted_ids[key]:
+                    # This is a cross-hierarchy reference
+                    behavior = self.get_outside_lookup_behavior_for_field(f)
+
+                    if behavior is OutsideLookupBehavior.DROP_FIELD:
+                        del result[f]
+                    elif behavior is OutsideLookupBehavior.INCLUDE:
+                        continue
+                    elif behavior is OutsideLookupBehavior.ERROR:
+                        self.errors.append(
+                            '{} {} has an outside reference in field {} ({}), which is not allowed by the extraction configuration.'.format(
+                                self.sobjectname,
+                                result['Id'],
+                                f,
+                                result[f]
+                            )
                         )
-                    )
 
-        # Finally, call through to the context to store this result.
-        self.context.store_result(self.sobjectname, result)
+        # Finally, call through to the context to store these results.
+        self.context.store_results(self.sobjectname, records)
+
+    def add_dependencies(self, sobjectname, ids):
+        if len(ids) > 0:
+            self.context.add_dependencies(sobjectname, ids)
+
+    def get_lookup_values(self, records, field):
+        return set(result[field] for result in records if result[field] is not None)
+
+    def group_by_target(self, ids):
+        # Classify polymorphic lookup values by the sObject each key prefix belongs to.
+        by_prefix = {}
+        for id in ids:
+            by_prefix.setdefault(id[:3], set()).add(id)
+
+        by_target = {}
+        for (prefix, prefix_ids) in by_prefix.items():
+            target_sobject = self.context.get_sobject_name_for_id(next(iter(prefix_ids)))
+            by_target.setdefault(target_sobject, set()).update(prefix_ids)
+
+        return by_target
 
     def resolve_registered_dependencies(self):
+        if self.context.prefetcher is not None:
+            # Records retrieved in the background, while earlier steps ran, save us from querying them.
+            prefetched = self.context.prefetcher.take(self.sobjectname)
+            if len(prefetched) > 0:
+                self.context.logger.debug('%s: using %d prefetched records', self.sobjectname, len(prefetched))
+                self.store_results(prefetched)
+
         pre_deps = self.context.get_dependencies(self.sobjectname).copy()
         self.perform_id_field_pass('Id', pre_deps)
         missing = self.context.get_dependencies(self.sobjectname).intersection(pre_deps)
@@ -759,54 +2176,355 @@ class ExtractionStep(Step):
                 )
             )
 
-    def perform_bulk_api_pass(self, query):
+    def perform_bulk_api_pass(self, query, record_filter=None):
+        monitor = self.start_bulk_query(query, 'JSON')
+
+        self.retrieve_bulk_results(
+            monitor,
+            self.download_bulk_results,
+            functools.partial(self.store_bulk_results, date_time_fields=self.get_date_time_fields(), record_filter=record_filter)
+        )
+
+    def can_pass_through_csv(self):
+        # Records that need no processing can be copied from Bulk API CSV results straight
+        # to the output file: there must be no lookups to trace, no DateTime values to
+        # reformat, and no mapper. No records may have been extracted yet, because rows
+        # are not checked against them, and the output must be a plain CSV file.
+        return self.scope in [ExtractionScope.ALL_RECORDS, ExtractionScope.QUERY] \
+            and len(self.all_lookups) == 0 \
+            and len(self.get_date_time_fields()) == 0 \
+            and self.sobjectname not in self.context.mappers \
+            and len(self.context.get_extracted_ids(self.sobjectname)) == 0 \
+            and isinstance(self.context.file_store.get_csv(self.sobjectname, FileType.OUTPUT), csv.DictWriter)
+
+    def perform_bulk_csv_pass(self, where_clause=None):
+        # Query the fields in the order of the output file's columns, so that each
+        # result row can be written as it stands.
+        output = self.context.file_store.get_csv(self.sobjectname, FileType.OUTPUT)
+        query = 'SELECT {} FROM {}'.format(', '.join(output.fieldnames), self.sobjectname)
+        if where_clause is not None:
+            query += ' WHERE {}'.format(where_clause)
+
+        self.context.logger.debug('%s: copying records from Bulk API query %s', self.sobjectname, query)
+        monitor = self.start_bulk_query(query, 'CSV')
+
+        self.retrieve_bulk_results(
+            monitor,
+            functools.partial(
+                self.download_bulk_csv_results,
+                fieldnames=output.fieldnames,
+                lineterminator=output.writer.dialect.lineterminator
+            ),
+            self.store_bulk_csv_results
+        )
+
+    def start_bulk_query(self, query, content_type):
         bulk = self.context.bulk
-        job = bulk.create_query_job(self.sobjectname, contentType='JSON')
-        batch = bulk.query(job, query)
+        monitor = BatchMonitor(bulk)
+
+        if self.pk_chunk_size is not None:
+            job = bulk.create_query_job(self.sobjectname, contentType=content_type, pk_chunking=self.pk_chunk_size)
+            monitor.add_chunked_batch(job, bulk.query(job, query))
+        else:
+            job = bulk.create_query_job(self.sobjectname, contentType=content_type)
+            monitor.add_batch(job, bulk.query(job, query))
+
         bulk.close_job(job)
 
-        while not bulk.is_batch_done(batch):
-            sleep(5)
+        return monitor
+
+    def retrieve_bulk_results(self, monitor, download, store):
+        # When PK chunking is enabled, Salesforce splits the query into one batch per chunk of the Id range.
+        # We download each batch on a worker thread as soon as it completes. Workers parse result
+        # streams incrementally and hand pages of records to this thread through a bounded queue,
+        # so that memory use stays flat and results are stored while the download is in progress.
+        # Storing results hands new records on to the operation's writer in turn.
+        retrieved = 0
+        active = 0
+        pages = PageQueue(self.context.api_concurrency * 2, self.counters['fetch'])
+        next_poll = monotonic()
+        poll_due = True
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.context.api_concurrency) as executor:
+            try:
+                while not monitor.is_done() or active > 0:
+                    if not monitor.is_done() and (poll_due or monotonic() >= next_poll):
+                        for (job, batch) in monitor.poll():
+                            retrieved += 1
+                            active += 1
+                            executor.submit(pages.feed, download(job, batch))
+                        next_poll = monotonic() + monitor.next_delay()
+                        poll_due = False
+
+                    if active > 0:
+                        try:
+                            page = self.get_page(
+                                pages,
+                                timeout=max(0, next_poll - monotonic()) if not monitor.is_done() else None
+                            )
+                        except queue.Empty:
+                            poll_due = True
+                            continue
+
+                        if page is None:
+                            active -= 1
+                        else:
+                            self.process_page(store, page)
+                    elif not monitor.is_done():
+                        sleep(max(0, next_poll - monotonic()))
+                        poll_due = True
+            finally:
+                pages.stop()
+
+        self.context.logger.debug('%s: retrieved %d Bulk API result batch%s', self.sobjectname, retrieved, 'es' if retrieved != 1 else '')
+        self.log_throughput()
+
+    def get_page(self, pages, timeout=None):
+        start = monotonic()
+        try:
+            return pages.get(timeout=timeout)
+        finally:
+            self.counters['process'].add(blocked=monotonic() - start)
+
+    def process_page(self, store, page, *args):
+        start = monotonic()
+        store(page, *args)
+        self.counters['process'].add(len(page), monotonic() - start)
+
+    def log_throughput(self):
+        self.context.logger.debug(
+            '%s: fetched %s; processed %s',
+            self.sobjectname,
+            self.counters['fetch'],
+            self.counters['process']
+        )
+
+    def download_bulk_results(self, job, batch, page_size=1000):
+        with self.context.api_slots:
+            for result in self.context.bulk.get_all_results_for_query_batch(batch, job):
+                yield from BatchIterator(JSONStreamIterator(result), page_size)
+
+    def download_bulk_csv_results(self, job, batch, fieldnames, lineterminator, page_size=1000):
+        with self.context.api_slots:
+            for result in self.context.bulk.get_all_results_for_query_batch(batch, job):
+                yield from CSVStreamIterator(result, fieldnames, page_size, lineterminator)
+
+    def get_date_time_fields(self):
+        field_map = self.context.get_field_map(self.sobjectname)
+        return [f for f in self.field_scope if field_map[f]['type'] == 'datetime']
 
+    def store_bulk_results(self, records, date_time_fields, record_filter=None):
         # The JSON Bulk API returns DateTime values as epoch seconds, instead of ISO 8601-format strings.
         # If we have DateTime fields in our field set, postprocess the result before we store it.
-        date_time_fields = [f for f in self.field_scope if self.context.get_field_map(self.sobjectname)[f]['type'] == 'datetime']
+        if record_filter is not None:
+            records = [rec for rec in records if record_filter(rec)]
 
-        for result in bulk.get_all_results_for_query_batch(batch):
-            result = json.load(result)
-            for rec in result:
-                if len(date_time_fields) > 0:
-                    for f in date_time_fields:
-                        if rec[f] is not None:
-                            # Format the datetime according to Salesforce's particular wants
-                            rec[f] = (datetime.utcfromtimestamp(0) + timedelta(milliseconds=rec[f])).isoformat(timespec='milliseconds') + '+0000'
+        for rec in records:
+            for f in date_time_fields:
+                if rec[f] is not None:
+                    # Format the datetime according to Salesforce's particular wants
+                    rec[f] = (datetime.utcfromtimestamp(0) + timedelta(milliseconds=rec[f])).isoformat(timespec='milliseconds') + '+0000'
 
-                self.store_result(rec)
+        self.bulk_result_count += len(records)
+        self.store_results(records)
 
-    def perform_id_field_pass(self, id_field, id_set):
-        query = 'SELECT {} FROM {} WHERE {} IN ({})'
+    def store_bulk_csv_results(self, page):
+        self.bulk_result_count += len(page)
+        self.context.store_csv_page(self.sobjectname, page)
 
+    def perform_id_field_pass(self, id_field, id_set):
         if len(id_set) == 0:
             return
 
-        ids = id_set.copy()
-        max_len = 4000 - len('WHERE {} IN ()'.format(self.get_field_list()))
+        # Run the Id-list queries concurrently, bounded by the operation's API concurrency.
+        # Each query streams its result pages back through a bounded queue, and records
+        # are stored on this thread, so store_result never runs concurrently with itself.
+        queries = list(self.get_id_field_queries(id_field, id_set))
+        pages = PageQueue(self.context.api_concurrency * 2, self.counters['fetch'])
+
+        # Record how many queries we avoided relative to the old packing scheme,
+        # which limited the WHERE clause to 4,000 characters and used 18-character Ids.
+        legacy_ids_per_query = max(1, (4000 - len('WHERE {} IN ()'.format(id_field))) // len(', \'000000000000000000\''))
+        saved = math.ceil(len(id_set) / legacy_ids_per_query) - len(queries)
+        with self.context.lock:
+            self.context.id_queries_saved += max(0, saved)
+        self.context.logger.debug(
+            '%s: querying %d Ids by %s in %d quer%s',
+            self.sobjectname,
+            len(id_set),
+            id_field,
+            len(queries),
+            'ies' if len(queries) != 1 else 'y'
+        )
 
-        while len(ids) > 0:
-            id_list = '\'' + str(ids.pop()) + '\''
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.context.api_concurrency) as executor:
+            try:
+                for query in queries:
+                    executor.submit(pages.feed, self.context.query_pages(query))
+
+                remaining = len(queries)
+                while remaining > 0:
+                    page = self.get_page(pages)
+                    if page is None:
+                        remaining -= 1
+                    else:
+                        self.process_page(self.store_results, page)
+            finally:
+                pages.stop()
+
+        self.log_throughput()
+
+    def get_id_field_query_format(self, id_field):
+        # Returns the query prefix for an Id-list query on id_field, and the length of the Ids
+        # it lists. Id and reference fields accept 15-character Ids, which pack more densely.
+        prefix = 'SELECT {} FROM {} WHERE {} IN ('.format(self.get_field_list(), self.sobjectname, id_field)
+        field_type = self.context.get_field_map(self.sobjectname).get(id_field, {}).get('type')
+        id_length = 15 if id_field == 'Id' or field_type in ['id', 'reference'] else 18
+
+        return (prefix, id_length)
+
+    def get_id_field_queries(self, id_field, id_set):
+        # Pack as many Ids into each query as the org's limits allow. A SOQL statement
+        # may be up to max_soql_length characters, and because queries are sent as a URL
+        # parameter, the encoded statement must also fit within max_query_url_length.
+        (prefix, id_length) = self.get_id_field_query_format(id_field)
+        separator = ','
+
+        soql_length = len(prefix) + 1
+        url_length = len(quote_plus(prefix)) + len(quote_plus(')'))
+        id_list = []
+
+        if isinstance(id_set, IdSet):
+            id_strings = id_set.id_strings(id_length)
+        else:
+            id_strings = (str(id)[:id_length] for id in id_set)
+
+        for idstr in id_strings:
+            value = '\'' + idstr + '\''
+            soql_increment = len(value) + (len(separator) if id_list else 0)
+            url_increment = len(quote_plus(value)) + (len(quote_plus(separator)) if id_list else 0)
+
+            if len(id_list) > 0 and (
+                soql_length + soql_increment > self.context.max_soql_length
+                or url_length + url_increment > self.context.max_query_url_length
+            ):
+                yield prefix + separator.join(id_list) + ')'
+
+                id_list = []
+                soql_length = len(prefix) + 1
+                url_length = len(quote_plus(prefix)) + len(quote_plus(')'))
+                soql_increment = len(value)
+                url_increment = len(quote_plus(value))
+
+            id_list.append(value)
+            soql_length += soql_increment
+            url_length += url_increment
+
+        if len(id_list) > 0:
+            yield prefix + separator.join(id_list) + ')'
+
+    def count_id_field_queries(self, id_field, count):
+        # Returns the number of queries get_id_field_queries() yields for count Ids, without
+        # building them. Ids are alphanumeric, so every quoted Id has the same length, both
+        # in SOQL and URL-encoded, and each limit admits a fixed number of Ids per query.
+        if count == 0:
+            return 0
+
+        (prefix, id_length) = self.get_id_field_query_format(id_field)
+        value = '\'' + '0' * id_length + '\''
+        separator = ','
+
+        soql_ids = (self.context.max_soql_length - len(prefix) - 1 + len(separator)) // (len(value) + len(separator))
+        url_ids = (
+            self.context.max_query_url_length - len(quote_plus(prefix)) - len(quote_plus(')')) + len(quote_plus(separator))
+        ) // (len(quote_plus(value)) + len(quote_plus(separator)))
+
+        return math.ceil(count / max(1, min(soql_ids, url_ids)))
+
+    def choose_descendent_strategy(self):
+        # Estimate the time needed to query descendents by Id list, against that needed
+        # to scan this sObject's whole table with the Bulk API and filter it locally,
+        # and choose the cheaper strategy.
+        queries = sum(
+            self.count_id_field_queries(f, len(self.context.get_sobject_ids_for_reference(self.sobjectname, f)))
+            for f in self.descendent_lookups
+        )
+        if queries == 0:
+            return DescendentStrategy.ID_LIST
 
-            # The maximum length of the WHERE clause is 4,000 characters
-            # Account for the length of the WHERE clause skeleton (above)
-            # and iterate until we can't add another Id.
-            while len(id_list) < max_len - 22 and len(ids) > 0:
-                id_list += ', \'' + str(ids.pop()) + '\''
+        with self.context.api_slots:
+            total = self.context.connection.query('SELECT COUNT() FROM {}'.format(self.sobjectname))['totalSize']
 
-            results = self.context.connection.query_all(
-                query.format(self.get_field_list(), self.sobjectname, id_field, id_list)
-            )
+        id_list_cost = queries * self.REST_QUERY_SECONDS / self.context.api_concurrency
+        full_scan_cost = self.BULK_JOB_SECONDS + total / self.BULK_RECORDS_PER_SECOND
+        strategy = DescendentStrategy.FULL_SCAN if full_scan_cost < id_list_cost else DescendentStrategy.ID_LIST
+
+        self.context.logger.info(
+            '%s: extracting descendents by %s (estimated %.1fs for %d Id-list quer%s, %.1fs to scan %d records)',
+            self.sobjectname,
+            'full scan' if strategy is DescendentStrategy.FULL_SCAN else 'Id list',
+            id_list_cost,
+            queries,
+            'ies' if queries != 1 else 'y',
+            full_scan_cost,
+            total
+        )
+
+        return strategy
+
+    def perform_full_scan_pass(self):
+        # Scan every record of this sObject with the Bulk API, keeping only those
+        # with a descendent lookup to a record that we've already extracted.
+        parent_ids = {
+            f: self.context.get_sobject_ids_for_reference(self.sobjectname, f)
+            for f in self.descendent_lookups
+        }
+
+        def is_descendent(record):
+            return any(record[f] is not None and record[f] in parent_ids[f] for f in parent_ids)
+
+        query = 'SELECT {} FROM {}'.format(self.get_field_list(), self.sobjectname)
+        self.context.logger.debug('%s: extracting descendents using filtered Bulk API query %s', self.sobjectname, query)
+        self.perform_bulk_api_pass(query, is_descendent)
+
+    def get_semi_join_query(self, field):
+        # A descendent lookup can be extracted with a single Bulk API semi-join query,
+        # rather than an Id-list pass, when the parent records extracted so far are
+        # exactly those returned by the parent step's own Bulk query.
+        # Returns None if that's not the case and we must fall back to an Id list.
+        field_map = self.context.get_field_map(self.sobjectname)
+        sobjects = self.context.get_sobject_list()
+        targets = [s for s in field_map[field]['referenceTo'] if s in sobjects]
+
+        if len(targets) != 1:
+            reason = 'is polymorphic'
+        else:
+            parent = next(s for s in self.context.steps if s.sobjectname == targets[0])
+            unnestable = None
+            if parent.where_clause is not None:
+                # Keywords inside string literals don't count.
+                unnestable = self.UNNESTABLE_CLAUSES.search(self.STRING_LITERAL.sub('\'\'', parent.where_clause))
+
+            if parent.scope not in [ExtractionScope.ALL_RECORDS, ExtractionScope.QUERY]:
+                reason = 'refers to {}, which is not extracted by query'.format(parent.sobjectname)
+            elif unnestable is not None:
+                reason = 'refers to {}, whose query contains {} and cannot be nested'.format(
+                    parent.sobjectname,
+                    unnestable.group(1).upper()
+                )
+            elif len(self.context.get_extracted_ids(parent.sobjectname)) != parent.bulk_result_count:
+                reason = 'refers to {}, which has records extracted outside its query'.format(parent.sobjectname)
+            else:
+                return 'SELECT {} FROM {} WHERE {} IN (SELECT Id FROM {}{})'.format(
+                    self.get_field_list(),
+                    self.sobjectname,
+                    field,
+                    parent.sobjectname,
+                    ' WHERE {}'.format(parent.where_clause) if parent.scope == ExtractionScope.QUERY else ''
+                )
 
-            for rec in results.get('records'):
-                self.store_result(rec)
+        self.context.logger.debug('%s: cannot use a semi-join for %s, which %s', self.sobjectname, field, reason)
+        return None
 
     def perform_lookup_pass(self, field):
         self.perform_id_field_pass(
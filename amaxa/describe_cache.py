@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import logging
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from simple_salesforce.util import exception_handler
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.amaxa', 'describe')
+
+
+class DescribeCache(object):
+    # Stores global and sObject describes on disk, one directory per org and API version.
+    # Each run revalidates the global describe with an If-Modified-Since request.
+    # Salesforce answers 304 when no sObject metadata has changed since that date,
+    # in which case every sObject describe confirmed since the global describe was
+    # last fetched is used without further calls. Otherwise, sObject describes
+    # are revalidated individually as they are requested.
+    # Times are Salesforce's, from the Date headers of its responses, so that a skewed
+    # local clock can't cause a change to be missed.
+    def __init__(self, connection, directory=None, refresh=False):
+        self.connection = connection
+        self.directory = directory or DEFAULT_CACHE_DIRECTORY
+        self.refresh = refresh
+        self.baseline = None
+        self.clock_offset = 0.0
+        self.lock = threading.RLock()
+        self.logger = logging.getLogger('amaxa')
+
+    def get_path(self, name):
+        # Session Ids are prefixed with the org Id.
+        org_id = self.connection.session_id.split('!')[0]
+
+        return os.path.join(self.directory, org_id, 'v{}'.format(self.connection.sf_version), name + '.json')
+
+    def read_entry(self, name):
+        if self.refresh:
+            return None
+
+        try:
+            with open(self.get_path(name), 'r') as f:
+                entry = json.load(f)
+            if all(k in entry for k in ['fetched', 'checked', 'describe']):
+                return entry
+        except (OSError, ValueError):
+            pass
+
+        return None
+
+    def write_entry(self, name, entry):
+        path = self.get_path(name)
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary_path = '{}.{}.tmp'.format(path, threading.get_ident())
+            with open(temporary_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(temporary_path, path)
+        except OSError as e:
+            self.logger.debug('Unable to write describe cache entry %s: %s', path, e)
+
+    def fetch(self, name, url, entry):
+        # Issues a GET for the describe, conditional on the cached entry if we have one.
+        # Returns the current entry, which is written back to the cache.
+        headers = self.connection.headers.copy()
+        if entry is not None:
+            headers['If-Modified-Since'] = formatdate(entry['fetched'], usegmt=True)
+
+        result = self.connection.session.request('GET', self.connection.base_url + url, headers=headers)
+        now = self.get_response_time(result)
+
+        if result.status_code == 304 and entry is not None:
+            self.logger.debug('Cached describe for %s is current', name)
+            entry['checked'] = now
+        elif result.status_code >= 300:
+            exception_handler(result, name=name)
+        else:
+            self.logger.debug('Retrieved describe for %s', name)
+            entry = { 'fetched': now, 'checked': now, 'describe': result.json() }
+
+        self.write_entry(name, entry)
+
+        return entry
+
+    def get_response_time(self, result):
+        # The server's time of the response, from its Date header. We remember how far the
+        # local clock is from the server's, to estimate server time when there's no header.
+        try:
+            server_time = parsedate_to_datetime(result.headers['Date']).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return self.get_server_time()
+
+        self.clock_offset = server_time - time.time()
+        return server_time
+
+    def get_server_time(self):
+        return time.time() + self.clock_offset
+
+    def get_global_describe(self):
+        with self.lock:
+            entry = self.fetch('global', 'sobjects', self.read_entry('global'))
+            self.baseline = entry['fetched']
+
+            return entry['describe']
+
+    def get_cached_describe(self, sobjectname):
+        # Returns the cached describe for sobjectname if it is known to be current, without
+        # making any calls beyond the global revalidation. Otherwise, returns None.
+        with self.lock:
+            if self.baseline is None:
+                self.get_global_describe()
+
+            entry = self.read_entry(sobjectname)
+
+        # An entry that was confirmed current after the last change to any sObject
+        # (as reported by the global describe) needs no revalidation.
+        if entry is not None and entry['checked'] >= self.baseline:
+            return entry['describe']
+
+        return None
+
+    def store_describe(self, sobjectname, describe):
+        # Describes retrieved in Composite requests come without their own Date header.
+        now = self.get_server_time()
+        self.write_entry(sobjectname, { 'fetched': now, 'checked': now, 'describe': describe })
+
+    def get_describe(self, sobjectname):
+        describe = self.get_cached_describe(sobjectname)
+        if describe is not None:
+            return describe
+
+        return self.fetch(sobjectname, 'sobjects/{}/describe'.format(sobjectname), self.read_entry(sobjectname))['describe']
@@ -73,9 +73,11 @@ def load_load_operation(incoming, context, resume = False):
     (incoming, errors) = validate_load_schema(incoming)
     if incoming is None:
         return (None, errors)
+
+    load_options(incoming, context)
     
     try:
-        global_describe = { entry['name']: entry for entry in context.connection.describe()["sobjects"] }
+        global_describe = { entry['name']: entry for entry in context.get_global_describe()["sobjects"] }
     except Exception as e:
         errors.append('Unable to authenticate to Salesforce: {}'.format(e))
         return (None, errors)
@@ -83,6 +85,7 @@ def load_load_operation(incoming, context, resume = False):
     errors = []
 
     all_sobjects = [entry['sobject'] for entry in incoming['operation']]
+    context.prefetch_describes(all_sobjects)
 
     for entry in incoming['operation']:
         sobject = entry['sobject']
@@ -175,7 +178,8 @@ def load_load_operation(incoming, context, resume = False):
         step = amaxa.LoadStep(
             sobject, 
             field_set, 
-            amaxa.OutsideLookupBehavior.values_dict()[entry['outside-lookup-behavior']]
+            amaxa.OutsideLookupBehavior.values_dict()[entry['outside-lookup-behavior']],
+            entry['batch-size']
         )
 
         # Populate expected lookup behaviors
@@ -283,9 +287,11 @@ def load_extraction_operation(incoming, context):
     (incoming, errors) = validate_extraction_schema(incoming)
     if incoming is None:
         return (None, errors)
+
+    load_options(incoming, context)
     
     try:
-        global_describe = { entry['name']: entry for entry in context.connection.describe()["sobjects"] }
+        global_describe = { entry['name']: entry for entry in context.get_global_describe()["sobjects"] }
     except Exception as e:
         errors.append('Unable to authenticate to Salesforce: {}'.format(e))
         return (None, errors)
@@ -293,6 +299,7 @@ def load_extraction_operation(incoming, context):
     errors = []
 
     all_sobjects = [entry['sobject'] for entry in incoming['operation']]
+    context.prefetch_describes(all_sobjects)
 
     for entry in incoming['operation']:
         sobject = entry['sobject']
@@ -307,10 +314,11 @@ def load_extraction_operation(incoming, context):
 
         if 'ids' in to_extract:
             # Register the required IDs in the context
-            try:
-                for id in to_extract.get('ids'):
+            (ids, valid) = amaxa.SalesforceId.normalize_all(to_extract.get('ids'))
+            if all(valid):
+                for id in ids:
                     context.add_dependency(sobject, amaxa.SalesforceId(id))
-            except ValueError:
+            else:
                 errors.append('One or more invalid Id values provided for sObject {}'.format(sobject))
             
             scope = amaxa.ExtractionScope.SELECTED_RECORDS
@@ -321,6 +329,9 @@ def load_extraction_operation(incoming, context):
             scope = amaxa.ExtractionScope.ALL_RECORDS
         else:
             scope = amaxa.ExtractionScope.DESCENDENTS
+
+        if 'pk-chunk-size' in to_extract and scope not in [amaxa.ExtractionScope.ALL_RECORDS, amaxa.ExtractionScope.QUERY]:
+            errors.append('PK chunking is only supported for sObjects extracted with \'all\' or \'query\' ({}).'.format(sobject))
         
         # Determine the field scope
         lookup_behaviors = {}
@@ -410,7 +421,9 @@ def load_extraction_operation(incoming, context):
             field_set, 
             query,
             amaxa.SelfLookupBehavior.values_dict()[entry['self-lookup-behavior']],
-            amaxa.OutsideLookupBehavior.values_dict()[entry['outside-lookup-behavior']]
+            amaxa.OutsideLookupBehavior.values_dict()[entry['outside-lookup-behavior']],
+            to_extract.get('pk-chunk-size'),
+            amaxa.DescendentStrategy.values_dict()[to_extract['strategy']] if 'strategy' in to_extract else amaxa.DescendentStrategy.ID_LIST
         )
 
         # Populate expected lookup behaviors
@@ -445,6 +458,20 @@ def load_extraction_operation(incoming, context):
 
     return (context, [])
 
+def load_options(incoming, context):
+    options = incoming.get('options', {})
+
+    if 'api-concurrency' in options:
+        context.api_concurrency = options['api-concurrency']
+    if 'max-soql-length' in options:
+        context.max_soql_length = options['max-soql-length']
+    if 'max-query-url-length' in options:
+        context.max_query_url_length = options['max-query-url-length']
+    if 'prefetch-dependencies' in options:
+        context.prefetch_dependencies = options['prefetch-dependencies']
+    if 'prefetch-buffer-size' in options:
+        context.prefetch_buffer_size = options['prefetch-buffer-size']
+
 def validate_dependent_field_permissions(context, errors):
     for step in context.steps:
         field_map = context.get_field_map(step.sobjectname)
@@ -550,12 +577,37 @@ credential_schema = {
 }
 
 def get_operation_schema(is_extract = True):
-    return {
+    schema = {
         'version': {
             'type': 'integer',
             'required': True,
             'allowed': [1]
         },
+        'options': {
+            'type': 'dict',
+            'schema': {
+                'api-concurrency': {
+                    'type': 'integer',
+                    'min': 1,
+                    'max': 10
+                },
+                'max-soql-length': {
+                    'type': 'integer',
+                    'min': 1000
+                },
+                'max-query-url-length': {
+                    'type': 'integer',
+                    'min': 1000
+                },
+                'prefetch-dependencies': {
+                    'type': 'boolean'
+                },
+                'prefetch-buffer-size': {
+                    'type': 'integer',
+                    'min': 1000
+                }
+            }
+        },
         'operation': {
             'type': 'list',
             'schema': {
@@ -612,6 +664,17 @@ def get_operation_schema(is_extract = True):
                                 'schema': {
                                     'type': 'string'
                                 }
+                            },
+                            'pk-chunk-size': {
+                                'type': 'integer',
+                                'min': 1,
+                                'max': 250000,
+                                'excludes': ['descendents', 'ids']
+                            },
+                            'strategy': {
+                                'type': 'string',
+                                'allowed': amaxa.DescendentStrategy.all_values(),
+                                'dependencies': ['descendents']
                             }
                         }
                     },
@@ -657,3 +720,13 @@ def get_operation_schema(is_extract = True):
             }
         }
     }
+
+    if not is_extract:
+        schema['operation']['schema']['schema']['batch-size'] = {
+            'type': 'integer',
+            'min': 1,
+            'max': amaxa.LoadStep.MAX_BATCH_SIZE,
+            'default': amaxa.LoadStep.MAX_BATCH_SIZE
+        }
+
+    return schema
@@ -19,7 +19,16 @@ def load_state(operation, state_data, json_mode = False):
 
     if len(errors) == 0:
         operation.stage = amaxa.LoadStage.values_dict()[state['state']['stage']]
-        operation.global_id_map = { amaxa.SalesforceId(k): amaxa.SalesforceId(v) for k, v in state['state']['id-map'].items() }
+
+        # State files may hold millions of Ids, so validate and normalize them in bulk.
+        id_map = state['state']['id-map']
+        (old_ids, old_valid) = amaxa.SalesforceId.normalize_all([str(k) for k in id_map.keys()])
+        (new_ids, new_valid) = amaxa.SalesforceId.normalize_all([str(v) for v in id_map.values()])
+
+        if not all(old_valid) or not all(new_valid):
+            return (None, ['The state file contains invalid Salesforce Ids.'])
+
+        operation.global_id_map = dict(zip(amaxa.SalesforceId.intern_all(old_ids), amaxa.SalesforceId.intern_all(new_ids)))
 
         return (operation, [])
     
@@ -16,6 +16,7 @@ for sobject in sobject_list:
 
 class MockSimpleSalesforce(object):
     def __init__(self):
+        self.sf_version = '42.0'
         self._describe = None
         self._sobject_describes = {}
         for sobject in sobject_list:
@@ -37,5 +38,17 @@ class MockSimpleSalesforce(object):
         
         return self._sobject_describes[sobject]
 
+    def restful(self, path, method='GET', data=None):
+        # Supports Composite Batch requests for describes only.
+        results = []
+        for request in json.loads(data)['batchRequests']:
+            sobject = request['url'].split('/')[2]
+            if sobject in sobject_describes:
+                results.append({ 'statusCode': 200, 'result': self.get_describe(sobject) })
+            else:
+                results.append({ 'statusCode': 404, 'result': [{ 'errorCode': 'NOT_FOUND' }] })
+
+        return { 'hasErrors': any(r['statusCode'] != 200 for r in results), 'results': results }
+
 
 
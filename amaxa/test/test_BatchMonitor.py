@@ -0,0 +1,179 @@
+import unittest
+from unittest.mock import Mock, patch
+from .. import amaxa
+
+
+class test_BatchMonitor(unittest.TestCase):
+    @patch('amaxa.amaxa.sleep')
+    def test_yields_batches_in_completion_order(self, sleep_proxy):
+        bulk = Mock()
+        bulk.get_batch_list = Mock(
+            side_effect=[
+                [
+                    { 'id': '751000000000001AAA', 'state': 'InProgress' },
+                    { 'id': '751000000000002AAA', 'state': 'Completed' }
+                ],
+                [
+                    { 'id': '751000000000001AAA', 'state': 'InProgress' },
+                    { 'id': '751000000000002AAA', 'state': 'Completed' }
+                ],
+                [
+                    { 'id': '751000000000001AAA', 'state': 'Completed' },
+                    { 'id': '751000000000002AAA', 'state': 'Completed' }
+                ]
+            ]
+        )
+
+        monitor = amaxa.BatchMonitor(bulk)
+        monitor.add_batch('750000000000000AAA', '751000000000001AAA')
+        monitor.add_batch('750000000000000AAA', '751000000000002AAA')
+
+        self.assertEqual(
+            [
+                ('750000000000000AAA', '751000000000002AAA'),
+                ('750000000000000AAA', '751000000000001AAA')
+            ],
+            list(monitor.completed())
+        )
+        self.assertTrue(monitor.is_done())
+        self.assertEqual(3, bulk.get_batch_list.call_count)
+        bulk.get_batch_list.assert_called_with('750000000000000AAA')
+
+    @patch('amaxa.amaxa.sleep')
+    def test_polls_once_per_job(self, sleep_proxy):
+        bulk = Mock()
+        bulk.get_batch_list = Mock(
+            side_effect=lambda job: [
+                { 'id': job + '-1', 'state': 'Completed' },
+                { 'id': job + '-2', 'state': 'Completed' }
+            ]
+        )
+
+        monitor = amaxa.BatchMonitor(bulk)
+        for job in ['A', 'B']:
+            monitor.add_batch(job, job + '-1')
+            monitor.add_batch(job, job + '-2')
+
+        self.assertEqual(4, len(list(monitor.completed())))
+        self.assertEqual(2, bulk.get_batch_list.call_count)
+        sleep_proxy.assert_not_called()
+
+    @patch('amaxa.amaxa.random.uniform', side_effect=lambda a, b: 1)
+    def test_backs_off_exponentially_and_resets_on_completion(self, random_proxy):
+        bulk = Mock()
+        bulk.get_batch_list = Mock(return_value=[{ 'id': '751000000000001AAA', 'state': 'Completed' }])
+
+        monitor = amaxa.BatchMonitor(bulk, min_interval=1, max_interval=5, backoff=2)
+        self.assertEqual([1, 2, 4, 5, 5], [monitor.next_delay() for i in range(5)])
+
+        monitor.add_batch('750000000000000AAA', '751000000000001AAA')
+        monitor.poll()
+
+        self.assertEqual(1, monitor.next_delay())
+
+    def test_applies_jitter(self):
+        monitor = amaxa.BatchMonitor(Mock(), min_interval=10, jitter=0.2)
+
+        delay = monitor.next_delay()
+        self.assertGreaterEqual(delay, 8)
+        self.assertLessEqual(delay, 12)
+
+    @patch('amaxa.amaxa.sleep')
+    def test_tracks_pk_chunk_batches(self, sleep_proxy):
+        bulk = Mock()
+        bulk.get_batch_list = Mock(
+            side_effect=[
+                [
+                    { 'id': '751000000000000AAA', 'state': 'Queued' }
+                ],
+                [
+                    { 'id': '751000000000000AAA', 'state': 'NotProcessed' },
+                    { 'id': '751000000000001AAA', 'state': 'Completed' },
+                    { 'id': '751000000000002AAA', 'state': 'Queued' }
+                ],
+                [
+                    { 'id': '751000000000000AAA', 'state': 'NotProcessed' },
+                    { 'id': '751000000000001AAA', 'state': 'Completed' },
+                    { 'id': '751000000000002AAA', 'state': 'Completed' }
+                ]
+            ]
+        )
+
+        monitor = amaxa.BatchMonitor(bulk)
+        monitor.add_chunked_batch('750000000000000AAA', '751000000000000AAA')
+
+        self.assertEqual(
+            [
+                ('750000000000000AAA', '751000000000001AAA'),
+                ('750000000000000AAA', '751000000000002AAA')
+            ],
+            list(monitor.completed())
+        )
+
+    @patch('amaxa.amaxa.sleep')
+    def test_raises_exception_for_failed_batches(self, sleep_proxy):
+        bulk = Mock()
+        bulk.get_batch_list = Mock(
+            return_value=[{ 'id': '751000000000001AAA', 'state': 'Failed', 'stateMessage': 'InvalidBatch' }]
+        )
+
+        monitor = amaxa.BatchMonitor(bulk)
+        monitor.add_batch('750000000000000AAA', '751000000000001AAA')
+
+        with self.assertRaises(amaxa.AmaxaException):
+            list(monitor.completed())
+
+
+class test_BatchResultReconciler(unittest.TestCase):
+    @patch('amaxa.amaxa.sleep')
+    def test_matches_results_to_each_batch_in_completion_order(self, sleep_proxy):
+        bulk = Mock()
+        bulk.get_batch_list = Mock(
+            side_effect=[
+                [
+                    { 'id': '751000000000001AAA', 'state': 'InProgress' },
+                    { 'id': '751000000000002AAA', 'state': 'Completed' }
+                ],
+                [
+                    { 'id': '751000000000001AAA', 'state': 'Completed' },
+                    { 'id': '751000000000002AAA', 'state': 'Completed' }
+                ]
+            ]
+        )
+        bulk.get_batch_results = Mock(side_effect=lambda batch, job: [batch + '-1', batch + '-2'])
+        handled = []
+
+        reconciler = amaxa.BatchResultReconciler(bulk, lambda original_id, result: handled.append((original_id, result)))
+        reconciler.add_batch('750000000000000AAA', '751000000000001AAA', ['001000000000001', '001000000000002'])
+        reconciler.add_batch('750000000000000AAA', '751000000000002AAA', ['001000000000003', '001000000000004'])
+        reconciler.finish()
+
+        self.assertEqual(
+            [
+                ('001000000000003', '751000000000002AAA-1'),
+                ('001000000000004', '751000000000002AAA-2'),
+                ('001000000000001', '751000000000001AAA-1'),
+                ('001000000000002', '751000000000001AAA-2')
+            ],
+            handled
+        )
+        self.assertEqual({}, reconciler.original_ids)
+
+    def test_handles_completed_batches_when_poll_is_due(self):
+        bulk = Mock()
+        bulk.get_batch_list = Mock(return_value=[{ 'id': '751000000000001AAA', 'state': 'Completed' }])
+        bulk.get_batch_results = Mock(return_value=['result'])
+        handle_result = Mock()
+
+        reconciler = amaxa.BatchResultReconciler(bulk, handle_result)
+        reconciler.add_batch('750000000000000AAA', '751000000000001AAA', ['001000000000001'])
+
+        # No poll is due immediately after a batch is posted.
+        reconciler.poll()
+        bulk.get_batch_list.assert_not_called()
+
+        reconciler.next_poll = 0
+        reconciler.poll()
+
+        handle_result.assert_called_once_with('001000000000001', 'result')
+        self.assertTrue(reconciler.monitor.is_done())
@@ -0,0 +1,137 @@
+import unittest
+import concurrent.futures
+from unittest.mock import Mock
+from .. import amaxa
+from .MockFileStore import MockFileStore
+
+
+def get_operation(scope=amaxa.ExtractionScope.DESCENDENTS):
+    connection = Mock()
+    oc = amaxa.ExtractOperation(connection)
+    oc.file_store = MockFileStore()
+    oc.get_field_map = Mock(return_value={
+        'Name': { 'name': 'Name', 'type': 'string' }
+    })
+
+    for sobject in ['Account', 'Contact']:
+        step = amaxa.ExtractionStep(sobject, scope, ['Name'])
+        oc.add_step(step)
+        step.initialize()
+
+    # Return one record for each Id in the query.
+    def query_pages(query):
+        ids = query[query.index('(') + 1:-1].replace('\'', '').split(',')
+        yield [{ 'Id': i, 'Name': 'Test' } for i in ids]
+
+    oc.query_pages = Mock(side_effect=query_pages)
+
+    return oc
+
+
+def get_ids(prefix, count):
+    return amaxa.IdSet([prefix + str(i + 1).zfill(12) for i in range(count)])
+
+
+class test_DependencyPrefetcher(unittest.TestCase):
+    def test_retrieves_requested_records(self):
+        oc = get_operation()
+        prefetcher = amaxa.DependencyPrefetcher(oc, 10000)
+
+        prefetcher.request('Contact', get_ids('003', 600))
+        records = prefetcher.take('Contact')
+        prefetcher.close()
+
+        self.assertEqual(600, len(records))
+        self.assertEqual(get_ids('003', 600), set(r['Id'] for r in records))
+        self.assertTrue(oc.query_pages.call_args[0][0].startswith('SELECT Name FROM Contact WHERE Id IN ('))
+        self.assertEqual(0, prefetcher.buffered)
+
+    def test_batches_small_requests_until_flushed(self):
+        oc = get_operation()
+        prefetcher = amaxa.DependencyPrefetcher(oc, 10000)
+
+        prefetcher.request('Contact', get_ids('003', 10))
+        prefetcher.request('Contact', get_ids('003', 20))
+        oc.query_pages.assert_not_called()
+
+        prefetcher.flush()
+        records = prefetcher.take('Contact')
+        prefetcher.close()
+
+        self.assertEqual(1, oc.query_pages.call_count)
+        self.assertEqual(20, len(records))
+
+    def test_limits_buffered_records(self):
+        oc = get_operation()
+        prefetcher = amaxa.DependencyPrefetcher(oc, 1000)
+
+        prefetcher.request('Contact', get_ids('003', 800))
+        prefetcher.request('Account', get_ids('001', 800))
+        prefetcher.request('Account', get_ids('001', 1600))
+
+        concurrent.futures.wait([f for l in prefetcher.futures.values() for f in l])
+
+        self.assertLessEqual(prefetcher.buffered, 1000)
+        self.assertEqual(prefetcher.buffered, sum(len(l) for l in prefetcher.records.values()))
+
+        buffered = prefetcher.buffered
+        self.assertEqual(buffered, len(prefetcher.take('Contact')) + len(prefetcher.take('Account')))
+        self.assertEqual(0, prefetcher.buffered)
+        prefetcher.close()
+
+    def test_ignores_requests_for_started_steps(self):
+        oc = get_operation()
+        prefetcher = amaxa.DependencyPrefetcher(oc, 10000)
+
+        prefetcher.stop('Contact')
+        prefetcher.request('Contact', get_ids('003', 600))
+        prefetcher.flush()
+        prefetcher.close()
+
+        oc.query_pages.assert_not_called()
+        self.assertEqual([], prefetcher.take('Contact'))
+
+    def test_ignores_requests_for_all_records_steps(self):
+        oc = get_operation(amaxa.ExtractionScope.ALL_RECORDS)
+        prefetcher = amaxa.DependencyPrefetcher(oc, 10000)
+
+        prefetcher.request('Contact', get_ids('003', 600))
+        prefetcher.flush()
+        prefetcher.close()
+
+        oc.query_pages.assert_not_called()
+        self.assertEqual({}, prefetcher.requested)
+        self.assertEqual([], prefetcher.take('Contact'))
+
+    def test_registered_dependencies_are_prefetched(self):
+        oc = get_operation()
+        oc.prefetcher = amaxa.DependencyPrefetcher(oc, 10000)
+
+        oc.add_dependencies('Contact', get_ids('003', 600))
+        oc.store_result('Contact', { 'Id': '003000000000001', 'Name': 'Test' })
+        oc.add_dependencies('Contact', get_ids('003', 700))
+        oc.prefetcher.flush()
+
+        records = oc.prefetcher.take('Contact')
+        oc.prefetcher.close()
+
+        self.assertEqual(700, len(records))
+        self.assertEqual(2, oc.query_pages.call_count)
+
+    def test_resolve_registered_dependencies_uses_prefetched_records(self):
+        oc = get_operation()
+        oc.prefetcher = amaxa.DependencyPrefetcher(oc, 10000)
+
+        oc.add_dependencies('Contact', get_ids('003', 600))
+        oc.prefetcher.take = Mock(
+            return_value=[{ 'Id': str(i), 'Name': 'Test' } for i in list(get_ids('003', 600))[:500]]
+        )
+
+        step = oc.steps[1]
+        step.perform_id_field_pass = Mock()
+        step.resolve_registered_dependencies()
+        oc.prefetcher.close()
+
+        oc.prefetcher.take.assert_called_once_with('Contact')
+        self.assertEqual(500, len(oc.get_extracted_ids('Contact')))
+        step.perform_id_field_pass.assert_called_once_with('Id', set(list(get_ids('003', 600))[500:]))
@@ -0,0 +1,37 @@
+import unittest
+from .. import amaxa
+
+
+def get_records(count):
+    return [
+        { 'Id': '001000000{:06d}'.format(i), 'ParentId': '001000000{:06d}'.format(i + 1) if i % 2 == 0 else '' }
+        for i in range(count)
+    ]
+
+
+class test_DependentLookupCache(unittest.TestCase):
+    def test_holds_rows_in_memory(self):
+        cache = amaxa.DependentLookupCache(max_rows=10)
+        for record in get_records(10):
+            cache.add(record)
+
+        self.assertIsNone(cache.file)
+        self.assertEqual(10, len(cache))
+        self.assertEqual(get_records(10), list(cache))
+
+    def test_spills_rows_to_file_above_threshold(self):
+        cache = amaxa.DependentLookupCache(max_rows=10)
+        for record in get_records(25):
+            cache.add(record)
+
+        self.assertIsNotNone(cache.file)
+        self.assertEqual([], cache.rows)
+        self.assertEqual(25, len(cache))
+        self.assertEqual(get_records(25), list(cache))
+
+        # Rows can still be added, and the cache read again.
+        cache.add({ 'Id': '001000000999999', 'ParentId': '' })
+        self.assertEqual(get_records(25) + [{ 'Id': '001000000999999', 'ParentId': '' }], list(cache))
+
+        cache.close()
+        self.assertIsNone(cache.file)
@@ -0,0 +1,162 @@
+import unittest
+import tempfile
+import shutil
+import os.path
+import simple_salesforce
+from unittest.mock import Mock, patch
+from .. import amaxa
+from ..describe_cache import DescribeCache
+
+global_describe = { 'sobjects': [{ 'name': 'Account', 'keyPrefix': '001' }] }
+account_describe = { 'name': 'Account', 'fields': [{ 'name': 'Name' }] }
+
+
+def get_response(status_code, body=None, date=None):
+    response = Mock()
+    response.status_code = status_code
+    response.headers = { 'Date': date } if date is not None else {}
+    response.json = Mock(return_value=body)
+
+    return response
+
+
+def get_connection(responses):
+    connection = Mock()
+    connection.session_id = '00D000000000001!AQ0AQ'
+    connection.sf_version = '42.0'
+    connection.base_url = 'https://salesforce.com/services/data/v42.0/'
+    connection.headers = { 'Authorization': 'Bearer 00D000000000001!AQ0AQ' }
+    connection.session.request = Mock(side_effect=responses)
+
+    return connection
+
+
+class test_DescribeCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_stores_describes_by_org_and_version(self):
+        connection = get_connection([get_response(200, global_describe), get_response(200, account_describe)])
+        cache = DescribeCache(connection, directory=self.directory)
+
+        self.assertEqual(global_describe, cache.get_global_describe())
+        self.assertEqual(account_describe, cache.get_describe('Account'))
+
+        connection.session.request.assert_any_call(
+            'GET',
+            'https://salesforce.com/services/data/v42.0/sobjects/Account/describe',
+            headers=connection.headers
+        )
+        self.assertTrue(os.path.exists(os.path.join(self.directory, '00D000000000001', 'v42.0', 'global.json')))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, '00D000000000001', 'v42.0', 'Account.json')))
+
+    def test_uses_cached_describes_when_metadata_is_unchanged(self):
+        DescribeCache(
+            get_connection([get_response(200, global_describe), get_response(200, account_describe)]),
+            directory=self.directory
+        ).get_describe('Account')
+
+        connection = get_connection([get_response(304)])
+        cache = DescribeCache(connection, directory=self.directory)
+
+        self.assertEqual(global_describe, cache.get_global_describe())
+        self.assertEqual(account_describe, cache.get_describe('Account'))
+
+        connection.session.request.assert_called_once()
+        self.assertIn('If-Modified-Since', connection.session.request.call_args[1]['headers'])
+
+    def test_revalidates_sobject_describes_when_metadata_has_changed(self):
+        DescribeCache(
+            get_connection([get_response(200, global_describe), get_response(200, account_describe)]),
+            directory=self.directory
+        ).get_describe('Account')
+
+        connection = get_connection([get_response(200, global_describe), get_response(304)])
+        cache = DescribeCache(connection, directory=self.directory)
+
+        self.assertEqual(account_describe, cache.get_describe('Account'))
+        self.assertEqual(2, connection.session.request.call_count)
+        self.assertIn('If-Modified-Since', connection.session.request.call_args[1]['headers'])
+
+    def test_uses_server_time_for_revalidation(self):
+        # The local clock is a day ahead of Salesforce's.
+        with patch('amaxa.describe_cache.time.time', return_value=1500086400.0):
+            DescribeCache(
+                get_connection([
+                    get_response(200, global_describe, 'Fri, 14 Jul 2017 02:40:00 GMT'),
+                    get_response(200, account_describe, 'Fri, 14 Jul 2017 02:40:01 GMT')
+                ]),
+                directory=self.directory
+            ).get_describe('Account')
+
+            connection = get_connection([get_response(200, global_describe), get_response(304)])
+            cache = DescribeCache(connection, directory=self.directory)
+            cache.get_describe('Account')
+
+        self.assertEqual(
+            ['Fri, 14 Jul 2017 02:40:00 GMT', 'Fri, 14 Jul 2017 02:40:01 GMT'],
+            [c[1]['headers']['If-Modified-Since'] for c in connection.session.request.call_args_list]
+        )
+
+    def test_refresh_ignores_cached_describes(self):
+        DescribeCache(
+            get_connection([get_response(200, global_describe), get_response(200, account_describe)]),
+            directory=self.directory
+        ).get_describe('Account')
+
+        new_describe = { 'name': 'Account', 'fields': [{ 'name': 'Name' }, { 'name': 'Description' }] }
+        connection = get_connection([get_response(200, global_describe), get_response(200, new_describe)])
+        cache = DescribeCache(connection, directory=self.directory, refresh=True)
+
+        self.assertEqual(new_describe, cache.get_describe('Account'))
+        for call in connection.session.request.call_args_list:
+            self.assertNotIn('If-Modified-Since', call[1]['headers'])
+
+        # The refreshed entries replace the old ones.
+        cache = DescribeCache(get_connection([get_response(304)]), directory=self.directory)
+        self.assertEqual(new_describe, cache.get_describe('Account'))
+
+    def test_raises_exceptions_for_errors(self):
+        connection = get_connection([get_response(200, global_describe), get_response(404, [])])
+        cache = DescribeCache(connection, directory=self.directory)
+
+        with self.assertRaises(simple_salesforce.exceptions.SalesforceResourceNotFound):
+            cache.get_describe('Foo__c')
+
+    def test_operation_uses_describe_cache(self):
+        connection = get_connection([get_response(200, global_describe), get_response(200, account_describe)])
+        op = amaxa.Operation(connection)
+        op.describe_cache = DescribeCache(connection, directory=self.directory)
+
+        self.assertEqual(global_describe, op.get_global_describe())
+        self.assertEqual('Account', op.get_sobject_name_for_id('001000000000001'))
+        self.assertEqual({ 'Name': { 'name': 'Name' } }, op.get_field_map('Account'))
+
+        self.assertEqual(2, connection.session.request.call_count)
+        connection.describe.assert_not_called()
+        connection.Account.describe.assert_not_called()
+
+    def test_operation_stores_prefetched_describes(self):
+        connection = get_connection([get_response(200, global_describe)])
+        connection.restful = Mock(return_value={ 'hasErrors': False, 'results': [{ 'statusCode': 200, 'result': account_describe }] })
+        op = amaxa.Operation(connection)
+        op.describe_cache = DescribeCache(connection, directory=self.directory)
+
+        op.prefetch_describes(['Account'])
+
+        self.assertEqual(account_describe, op.get_describe('Account'))
+        connection.restful.assert_called_once()
+
+        # A warm start takes Account from the cache.
+        connection = get_connection([get_response(304)])
+        op = amaxa.Operation(connection)
+        op.describe_cache = DescribeCache(connection, directory=self.directory)
+
+        op.prefetch_describes(['Account'])
+
+        self.assertEqual(account_describe, op.describe_info['Account'])
+        connection.session.request.assert_called_once()
+        connection.restful.assert_not_called()
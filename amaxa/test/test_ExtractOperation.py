@@ -1,4 +1,5 @@
 import unittest
+import threading
 from unittest.mock import Mock, MagicMock, PropertyMock, patch
 from .. import amaxa
 from .MockFileStore import MockFileStore
@@ -19,6 +20,40 @@ class test_ExtractOperation(unittest.TestCase):
             s.execute.assert_called_once_with()
             self.assertEqual(oc, s.context)
     
+    def test_execute_raises_writer_errors(self):
+        connection = Mock()
+        oc = amaxa.ExtractOperation(connection)
+        oc.file_store = MockFileStore()
+        oc.file_store.get_csv('Account', amaxa.FileType.OUTPUT).writerow.side_effect = OSError('Disk full')
+
+        step = Mock(sobjectname='Account', errors=[])
+        step.execute.side_effect = lambda: oc.store_result('Account', { 'Id': '001000000000000', 'Name': 'Caprica Steel' })
+        oc.add_step(step)
+
+        with self.assertRaises(OSError):
+            oc.execute()
+
+        self.assertIsNone(oc.writer)
+
+    def test_execute_preserves_step_errors_over_writer_errors(self):
+        connection = Mock()
+        oc = amaxa.ExtractOperation(connection)
+        oc.file_store = MockFileStore()
+        oc.file_store.get_csv('Account', amaxa.FileType.OUTPUT).writerow.side_effect = OSError('Disk full')
+
+        def execute():
+            oc.store_result('Account', { 'Id': '001000000000000', 'Name': 'Caprica Steel' })
+            raise amaxa.AmaxaException('Step failed')
+
+        step = Mock(sobjectname='Account', errors=[])
+        step.execute.side_effect = execute
+        oc.add_step(step)
+
+        with self.assertRaises(amaxa.AmaxaException):
+            oc.execute()
+
+        self.assertIsNone(oc.writer)
+
     def test_add_dependency_tracks_dependencies(self):
         connection = Mock()
 
@@ -39,6 +74,42 @@ class test_ExtractOperation(unittest.TestCase):
         oc.add_dependency('Account', amaxa.SalesforceId('001000000000000'))
         self.assertEqual(set(), oc.get_dependencies('Account'))
 
+    def test_add_dependencies_tracks_dependencies(self):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.file_store = MockFileStore()
+
+        oc.store_result('Account', { 'Id': '001000000000000', 'Name': 'Caprica Steel' })
+        oc.add_dependencies('Account', set(['001000000000000', '001000000000001', '001000000000002']))
+        self.assertEqual(
+            set([amaxa.SalesforceId('001000000000001'), amaxa.SalesforceId('001000000000002')]),
+            oc.get_dependencies('Account')
+        )
+
+    def test_store_results_writes_records_and_clears_dependencies(self):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.file_store = MockFileStore()
+
+        oc.add_dependencies('Account', ['001000000000000', '001000000000002'])
+        oc.store_results(
+            'Account',
+            [
+                { 'Id': '001000000000000', 'Name': 'Caprica Steel' },
+                { 'Id': '001000000000001', 'Name': 'Gemenon Surplus' },
+                { 'Id': '001000000000000', 'Name': 'Caprica Steel' }
+            ]
+        )
+
+        self.assertEqual(
+            set([amaxa.SalesforceId('001000000000000'), amaxa.SalesforceId('001000000000001')]),
+            oc.get_extracted_ids('Account')
+        )
+        self.assertEqual(set([amaxa.SalesforceId('001000000000002')]), oc.get_dependencies('Account'))
+        self.assertEqual(2, oc.file_store.get_csv('Account', amaxa.FileType.OUTPUT).writerow.call_count)
+
     def test_store_result_retains_ids(self):
         connection = Mock()
 
@@ -113,3 +184,175 @@ class test_ExtractOperation(unittest.TestCase):
 
         self.assertEqual(set([amaxa.SalesforceId('001000000000000'), amaxa.SalesforceId('003000000000000')]),
                          oc.get_sobject_ids_for_reference('Account', 'Lookup__c'))
+
+    def test_reference_views_track_extracted_ids(self):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.file_store = MockFileStore()
+        oc.get_field_map = Mock(return_value={ 'WhatId': { 'referenceTo': ['Account', 'Opportunity'] }})
+
+        oc.store_result('Account', { 'Id': '001000000000000', 'Name': 'University of Caprica' })
+        view = oc.get_reference_view('Task', 'WhatId')
+        self.assertIs(view, oc.get_reference_view('Task', 'WhatId'))
+        self.assertEqual(set([amaxa.SalesforceId('001000000000000')]), oc.get_sobject_ids_for_reference('Task', 'WhatId'))
+
+        version = view.version
+        oc.store_results(
+            'Opportunity',
+            [{ 'Id': '006000000000000', 'Name': 'Defense Mainframe' }, { 'Id': '006000000000001', 'Name': 'Colonial Fleet' }]
+        )
+        oc.store_result('Contact', { 'Id': '003000000000000', 'Name': 'Gaius Baltar' })
+        oc.store_result('Account', { 'Id': '001000000000000', 'Name': 'University of Caprica' })
+
+        self.assertEqual(3, len(oc.get_sobject_ids_for_reference('Task', 'WhatId')))
+        (added, new_version) = view.get_ids_since(version)
+        self.assertEqual(set([amaxa.SalesforceId('006000000000000'), amaxa.SalesforceId('006000000000001')]), added)
+        self.assertEqual((1, 2), new_version)
+        self.assertEqual(set(), view.get_ids_since(new_version)[0])
+        self.assertEqual(3, len(view.get_ids_since()[0]))
+
+    def test_reference_views_share_single_target_ids(self):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.file_store = MockFileStore()
+        oc.get_field_map = Mock(return_value={ 'AccountId': { 'referenceTo': ['Account'] }})
+
+        view = oc.get_reference_view('Contact', 'AccountId')
+        oc.store_result('Account', { 'Id': '001000000000000', 'Name': 'University of Caprica' })
+
+        self.assertIs(oc.get_extracted_ids('Account'), view.ids)
+        self.assertEqual([], oc.reference_views_by_target.get('Account', []))
+        self.assertEqual(set([amaxa.SalesforceId('001000000000000')]), view.get_ids_since()[0])
+
+    def test_reference_views_log_extracted_ids_on_demand(self):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.file_store = MockFileStore()
+        oc.get_field_map = Mock(return_value={ 'ParentId': { 'referenceTo': ['Account'] }})
+
+        view = oc.get_reference_view('Account', 'ParentId')
+        oc.store_results(
+            'Account',
+            [{ 'Id': '001000000000000', 'Name': 'Caprica' }, { 'Id': '001000000000001', 'Name': 'Gemenon' }]
+        )
+        self.assertEqual({}, oc.extracted_id_logs)
+
+        (ids, version) = view.get_ids_since()
+        self.assertEqual(2, len(ids))
+        self.assertEqual((2, ), version)
+        self.assertEqual(0, len(oc.extracted_id_logs['Account'][1]))
+
+        # Views created later start from the current version.
+        later_view = amaxa.ReferenceView(oc, ['Account'], [oc.get_extracted_ids('Account')])
+        later_version = later_view.version
+        oc.store_result('Account', { 'Id': '001000000000002', 'Name': 'Picon' })
+
+        self.assertEqual(set([amaxa.SalesforceId('001000000000002')]), view.get_ids_since(version)[0])
+        self.assertEqual(set([amaxa.SalesforceId('001000000000002')]), later_view.get_ids_since(later_version)[0])
+        self.assertEqual((3, ), later_view.version)
+
+    def test_initialize_creates_reference_views_for_checked_lookups_only(self):
+        oc = amaxa.ExtractOperation(Mock())
+        step = Mock(
+            sobjectname='Contact',
+            all_lookups=set(['AccountId', 'ReportsToId', 'Dependent__c']),
+            descendent_lookups=set(['AccountId']),
+            self_lookups=set(['ReportsToId']),
+            dependent_lookups=set(['Dependent__c'])
+        )
+        oc.add_step(step)
+        oc.get_reference_view = Mock()
+
+        oc.initialize()
+
+        self.assertEqual(
+            set([('Contact', 'AccountId'), ('Contact', 'ReportsToId')]),
+            set(c[0] for c in oc.get_reference_view.call_args_list)
+        )
+
+    def get_sibling_operation(self):
+        connection = Mock()
+        oc = amaxa.ExtractOperation(connection)
+        field_maps = {
+            'Account': {
+                'Primary_Contact__c': { 'name': 'Primary_Contact__c', 'type': 'reference', 'referenceTo': ['Contact'] }
+            },
+            'Contact': {
+                'AccountId': { 'name': 'AccountId', 'type': 'reference', 'referenceTo': ['Account'] }
+            },
+            'Opportunity': {
+                'AccountId': { 'name': 'AccountId', 'type': 'reference', 'referenceTo': ['Account'] }
+            },
+            'Task': {
+                'WhatId': { 'name': 'WhatId', 'type': 'reference', 'referenceTo': ['Account', 'Opportunity'] }
+            }
+        }
+        oc.get_field_map = Mock(side_effect=lambda s: field_maps[s])
+
+        steps = {}
+        for (name, descendent_lookups, dependent_lookups) in [
+            ('Account', set(), set(['Primary_Contact__c'])),
+            ('Contact', set(['AccountId']), set()),
+            ('Opportunity', set(['AccountId']), set()),
+            ('Task', set(['WhatId']), set())
+        ]:
+            steps[name] = Mock(
+                sobjectname=name,
+                errors=[],
+                descendent_lookups=descendent_lookups,
+                dependent_lookups=dependent_lookups
+            )
+            oc.add_step(steps[name])
+
+        return (oc, steps)
+
+    def test_get_step_dependencies_connects_steps_by_lookups(self):
+        (oc, steps) = self.get_sibling_operation()
+
+        self.assertEqual(
+            {
+                steps['Account']: set(),
+                steps['Contact']: set([steps['Account']]),
+                steps['Opportunity']: set([steps['Account']]),
+                steps['Task']: set([steps['Account'], steps['Opportunity']])
+            },
+            oc.get_step_dependencies()
+        )
+
+    def test_execute_runs_independent_steps_in_parallel(self):
+        (oc, steps) = self.get_sibling_operation()
+        oc.jobs = 2
+
+        # Contact and Opportunity can only both pass the barrier if they run at the same time.
+        barrier = threading.Barrier(2, timeout=5)
+        order = []
+        def run(name):
+            def execute():
+                order.append(name)
+                if name in ['Contact', 'Opportunity']:
+                    barrier.wait()
+            return execute
+
+        for (name, step) in steps.items():
+            step.execute = Mock(side_effect=run(name))
+
+        self.assertEqual(0, oc.execute())
+
+        self.assertEqual('Account', order[0])
+        self.assertEqual('Task', order[3])
+        self.assertEqual(set(['Contact', 'Opportunity']), set(order[1:3]))
+
+    def test_execute_stops_starting_steps_after_errors(self):
+        (oc, steps) = self.get_sibling_operation()
+        oc.jobs = 2
+
+        steps['Opportunity'].errors = ['Error']
+
+        self.assertEqual(-1, oc.execute())
+
+        steps['Account'].execute.assert_called_once_with()
+        steps['Opportunity'].execute.assert_called_once_with()
+        steps['Task'].execute.assert_not_called()
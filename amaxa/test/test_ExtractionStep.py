@@ -1,8 +1,20 @@
 import unittest
+import io
+import csv
 import json
+import threading
+import math
+import urllib.parse
+import time
+import simple_salesforce
 from unittest.mock import Mock, MagicMock, PropertyMock, patch
 from salesforce_bulk.util import IteratorBytesIO
 from .. import amaxa
+from .MockFileStore import MockFileStore
+
+
+def get_stored_records(step):
+    return [rec for c in step.store_results.call_args_list for rec in c[0][0]]
 
 
 class test_ExtractionStep(unittest.TestCase):
@@ -29,8 +41,8 @@ class test_ExtractionStep(unittest.TestCase):
 
         oc = amaxa.ExtractOperation(connection)
 
-        oc.store_result = Mock()
-        oc.add_dependency = Mock()
+        oc.store_results = Mock()
+        oc.add_dependencies = Mock()
         oc.get_field_map = Mock(return_value={
             'Lookup__c': {
                 'name': 'Lookup__c',
@@ -45,16 +57,16 @@ class test_ExtractionStep(unittest.TestCase):
         step.initialize()
 
         step.store_result({ 'Id': '001000000000000', 'Name': 'Picon Fleet Headquarters' })
-        oc.store_result.assert_called_once_with('Account', { 'Id': '001000000000000', 'Name': 'Picon Fleet Headquarters' })
-        oc.add_dependency.assert_not_called()
+        oc.store_results.assert_called_once_with('Account', [{ 'Id': '001000000000000', 'Name': 'Picon Fleet Headquarters' }])
+        oc.add_dependencies.assert_not_called()
 
     def test_store_result_registers_self_lookup_dependencies(self):
         connection = Mock()
 
         oc = amaxa.ExtractOperation(connection)
 
-        oc.store_result = Mock()
-        oc.add_dependency = Mock()
+        oc.store_results = Mock()
+        oc.add_dependencies = Mock()
         oc.get_field_map = Mock(return_value={
             'Lookup__c': {
                 'name': 'Lookup__c',
@@ -69,15 +81,15 @@ class test_ExtractionStep(unittest.TestCase):
         step.initialize()
 
         step.store_result({ 'Id': '001000000000000', 'Lookup__c': '001000000000001', 'Name': 'Picon Fleet Headquarters' })
-        oc.add_dependency.assert_called_once_with('Account', amaxa.SalesforceId('001000000000001'))
+        oc.add_dependencies.assert_called_once_with('Account', set(['001000000000001']))
 
     def test_store_result_respects_self_lookup_options(self):
         connection = Mock()
 
         oc = amaxa.ExtractOperation(connection)
 
-        oc.store_result = Mock()
-        oc.add_dependency = Mock()
+        oc.store_results = Mock()
+        oc.add_dependencies = Mock()
         oc.get_field_map = Mock(return_value={
             'Lookup__c': {
                 'name': 'Lookup__c',
@@ -92,15 +104,15 @@ class test_ExtractionStep(unittest.TestCase):
         step.initialize()
 
         step.store_result({ 'Id': '001000000000000', 'Lookup__c': '001000000000001', 'Name': 'Picon Fleet Headquarters' })
-        oc.add_dependency.assert_not_called()
+        oc.add_dependencies.assert_not_called()
 
     def test_store_result_registers_dependent_lookup_dependencies(self):
         connection = Mock()
 
         oc = amaxa.ExtractOperation(connection)
 
-        oc.store_result = Mock()
-        oc.add_dependency = Mock()
+        oc.store_results = Mock()
+        oc.add_dependencies = Mock()
         oc.get_field_map = Mock(return_value={
             'Lookup__c': {
                 'name': 'Lookup__c',
@@ -115,15 +127,15 @@ class test_ExtractionStep(unittest.TestCase):
         step.initialize()
 
         step.store_result({ 'Id': '001000000000000', 'Lookup__c': '006000000000001', 'Name': 'Picon Fleet Headquarters' })
-        oc.add_dependency.assert_called_once_with('Opportunity', amaxa.SalesforceId('006000000000001'))
+        oc.add_dependencies.assert_called_once_with('Opportunity', set(['006000000000001']))
 
     def test_store_result_handles_polymorphic_lookups(self):
         connection = Mock()
 
         oc = amaxa.ExtractOperation(connection)
 
-        oc.store_result = Mock()
-        oc.add_dependency = Mock()
+        oc.store_results = Mock()
+        oc.add_dependencies = Mock()
         oc.get_field_map = Mock(return_value={
             'Lookup__c': {
                 'name': 'Lookup__c',
@@ -141,37 +153,83 @@ class test_ExtractionStep(unittest.TestCase):
 
         # Validate that the polymorphic lookup is treated properly when the content is a dependent reference
         step.store_result({ 'Id': '001000000000000', 'Lookup__c': '006000000000001', 'Name': 'Kara Thrace' })
-        oc.add_dependency.assert_called_once_with('Opportunity', amaxa.SalesforceId('006000000000001'))
-        oc.store_result.assert_called_once_with('Contact', { 'Id': '001000000000000', 'Lookup__c': '006000000000001', 'Name': 'Kara Thrace' })
-        oc.add_dependency.reset_mock()
-        oc.store_result.reset_mock()
+        oc.add_dependencies.assert_called_once_with('Opportunity', set(['006000000000001']))
+        oc.store_results.assert_called_once_with('Contact', [{ 'Id': '001000000000000', 'Lookup__c': '006000000000001', 'Name': 'Kara Thrace' }])
+        oc.add_dependencies.reset_mock()
+        oc.store_results.reset_mock()
 
         # Validate that the polymorphic lookup is treated properly when the content is a descendent reference
         step.store_result({ 'Id': '001000000000000', 'Lookup__c': '001000000000001', 'Name': 'Kara Thrace' })
-        oc.add_dependency.assert_not_called()
-        oc.store_result.assert_called_once_with('Contact', { 'Id': '001000000000000', 'Lookup__c': '001000000000001', 'Name': 'Kara Thrace' })
-        oc.add_dependency.reset_mock()
-        oc.store_result.reset_mock()
+        oc.add_dependencies.assert_not_called()
+        oc.store_results.assert_called_once_with('Contact', [{ 'Id': '001000000000000', 'Lookup__c': '001000000000001', 'Name': 'Kara Thrace' }])
+        oc.add_dependencies.reset_mock()
+        oc.store_results.reset_mock()
 
         # Validate that the polymorphic lookup is treated properly when the id is None
         step.store_result({ 'Id': '001000000000000', 'Lookup__c': None, 'Name': 'Kara Thrace' })
-        oc.add_dependency.assert_not_called()
-        oc.store_result.assert_called_once_with('Contact', { 'Id': '001000000000000', 'Lookup__c': None, 'Name': 'Kara Thrace' })
-        oc.add_dependency.reset_mock()
-        oc.store_result.reset_mock()
+        oc.add_dependencies.assert_not_called()
+        oc.store_results.assert_called_once_with('Contact', [{ 'Id': '001000000000000', 'Lookup__c': None, 'Name': 'Kara Thrace' }])
+        oc.add_dependencies.reset_mock()
+        oc.store_results.reset_mock()
 
         # Validate that the polymorphic lookup is treated properly when the content is a off-extraction reference
         step.store_result({ 'Id': '001000000000000', 'Lookup__c': '00T000000000001', 'Name': 'Kara Thrace' })
-        oc.add_dependency.assert_not_called()
-        oc.store_result.assert_called_once_with('Contact', { 'Id': '001000000000000', 'Lookup__c': '00T000000000001', 'Name': 'Kara Thrace' })
+        oc.add_dependencies.assert_not_called()
+        oc.store_results.assert_called_once_with('Contact', [{ 'Id': '001000000000000', 'Lookup__c': '00T000000000001', 'Name': 'Kara Thrace' }])
+
+    def test_store_results_registers_dependencies_by_page(self):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+
+        oc.store_results = Mock()
+        oc.add_dependencies = Mock()
+        oc.get_field_map = Mock(return_value={
+            'Lookup__c': {
+                'name': 'Lookup__c',
+                'type': 'reference',
+                'referenceTo': ['Opportunity', 'Account', 'Task']
+            },
+            'Self__c': {
+                'name': 'Self__c',
+                'type': 'reference',
+                'referenceTo': ['Contact']
+            }
+        })
+        oc.get_sobject_list = Mock(return_value=['Account', 'Contact', 'Opportunity'])
+        oc.get_extracted_ids = Mock(return_value=amaxa.IdSet(['001000000000001', '001000000000002']))
+        oc.get_sobject_name_for_id = Mock(side_effect=lambda id: {'001': 'Account', '006': 'Opportunity', '00T': 'Task', '003': 'Contact'}[id[:3]])
+
+        step = amaxa.ExtractionStep('Contact', amaxa.ExtractionScope.ALL_RECORDS, ['Lookup__c', 'Self__c'])
+        oc.add_step(step)
+        step.initialize()
+
+        records = [
+            { 'Id': '003000000000001', 'Lookup__c': '006000000000001', 'Self__c': None },
+            { 'Id': '003000000000002', 'Lookup__c': '006000000000002', 'Self__c': '003000000000001' },
+            { 'Id': '003000000000003', 'Lookup__c': '001000000000001', 'Self__c': '003000000000009' },
+            { 'Id': '003000000000004', 'Lookup__c': '001000000000002', 'Self__c': None },
+            { 'Id': '003000000000005', 'Lookup__c': '00T000000000001', 'Self__c': None },
+            { 'Id': '003000000000006', 'Lookup__c': '006000000000003', 'Self__c': None },
+            { 'Id': '003000000000007', 'Lookup__c': None, 'Self__c': None }
+        ]
+        step.store_results(records)
+
+        oc.add_dependencies.assert_any_call('Contact', set(['003000000000001', '003000000000009']))
+        oc.add_dependencies.assert_any_call('Opportunity', set(['006000000000001', '006000000000002', '006000000000003']))
+        self.assertEqual(2, oc.add_dependencies.call_count)
+        oc.store_results.assert_called_once_with('Contact', records)
+
+        # Each key prefix is classified once per field pass, not once per record.
+        self.assertEqual(6, oc.get_sobject_name_for_id.call_count)
 
     def test_store_result_respects_outside_lookup_behavior_drop_field(self):
         connection = Mock()
 
         oc = amaxa.ExtractOperation(connection)
 
-        oc.store_result = Mock()
-        oc.add_dependency = Mock()
+        oc.store_results = Mock()
+        oc.add_dependencies = Mock()
         oc.get_field_map = Mock(return_value={
             'AccountId': {
                 'name': 'AccountId',
@@ -197,15 +255,15 @@ class test_ExtractionStep(unittest.TestCase):
         step.initialize()
 
         step.store_result({'Id': '003000000000001', 'AccountId': '001000000000001'})
-        oc.store_result.assert_called_once_with('Contact', {'Id': '003000000000001'})
+        oc.store_results.assert_called_once_with('Contact', [{'Id': '003000000000001'}])
 
     def test_store_result_respects_outside_lookup_behavior_error(self):
         connection = Mock()
 
         oc = amaxa.ExtractOperation(connection)
 
-        oc.store_result = Mock()
-        oc.add_dependency = Mock()
+        oc.store_results = Mock()
+        oc.add_dependencies = Mock()
         oc.get_field_map = Mock(return_value={
             'AccountId': {
                 'name': 'AccountId',
@@ -248,8 +306,8 @@ class test_ExtractionStep(unittest.TestCase):
 
         oc = amaxa.ExtractOperation(connection)
 
-        oc.store_result = Mock()
-        oc.add_dependency = Mock()
+        oc.store_results = Mock()
+        oc.add_dependencies = Mock()
         oc.get_field_map = Mock(return_value={
             'AccountId': {
                 'name': 'AccountId',
@@ -275,15 +333,15 @@ class test_ExtractionStep(unittest.TestCase):
         step.initialize()
 
         step.store_result({'Id': '003000000000001', 'AccountId': '001000000000001'})
-        oc.store_result.assert_called_once_with('Contact', {'Id': '003000000000001', 'AccountId': '001000000000001'})
+        oc.store_results.assert_called_once_with('Contact', [{'Id': '003000000000001', 'AccountId': '001000000000001'}])
 
     def test_store_result_discriminates_polymorphic_lookup_type(self):
         connection = Mock()
 
         oc = amaxa.ExtractOperation(connection)
 
-        oc.store_result = Mock()
-        oc.add_dependency = Mock()
+        oc.store_results = Mock()
+        oc.add_dependencies = Mock()
         oc.get_field_map = Mock(return_value={
             'AccountId': {
                 'name': 'AccountId',
@@ -309,7 +367,7 @@ class test_ExtractionStep(unittest.TestCase):
         step.initialize()
 
         step.store_result({'Id': '003000000000001', 'AccountId': '001000000000001'})
-        oc.store_result.assert_called_once_with('Contact', {'Id': '003000000000001'})
+        oc.store_results.assert_called_once_with('Contact', [{'Id': '003000000000001'}])
 
     def test_perform_lookup_pass_executes_correct_query(self):
         connection = Mock()
@@ -337,7 +395,7 @@ class test_ExtractionStep(unittest.TestCase):
 
     def test_perform_id_field_pass_queries_all_records(self):
         connection = Mock()
-        connection.query_all = Mock(side_effect=lambda x: { 'records': [{ 'Id': '001000000000001'}] })
+        connection.query = Mock(side_effect=lambda x: { 'records': [{ 'Id': '001000000000001'}], 'done': True })
 
         oc = amaxa.ExtractOperation(connection)
         oc.get_field_map = Mock(return_value={
@@ -349,30 +407,109 @@ class test_ExtractionStep(unittest.TestCase):
         })
 
         step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Lookup__c'])
-        step.store_result = Mock()
+        step.store_results = Mock()
         oc.add_step(step)
         step.initialize()
 
         id_set = set()
-        # Generate enough fake Ids to require two queries.
-        for i in range(400):
-            new_id = amaxa.SalesforceId('001000000000' + str(i + 1).zfill(3))
+        # Generate enough fake Ids to require several queries.
+        for i in range(2000):
+            new_id = amaxa.SalesforceId('00100000000' + str(i + 1).zfill(4))
             id_set.add(new_id)
 
-        self.assertEqual(400, len(id_set))
+        self.assertEqual(2000, len(id_set))
 
         step.perform_id_field_pass('Lookup__c', id_set)
 
-        self.assertLess(1, len(connection.query_all.call_args_list))
+        self.assertLess(1, len(connection.query.call_args_list))
         total = 0
-        for call in connection.query_all.call_args_list:
-            self.assertLess(len(call[0][0]) - call[0][0].find('WHERE'), 4000)
+        for call in connection.query.call_args_list:
+            self.assertLessEqual(len(call[0][0]), oc.max_soql_length)
+            self.assertLessEqual(len(urllib.parse.quote_plus(call[0][0])), oc.max_query_url_length)
             total += call[0][0].count('\'001')
-        self.assertEqual(400, total)
+        self.assertEqual(2000, total)
+        # The old packing scheme would have used 12 queries.
+        self.assertEqual(12 - len(connection.query.call_args_list), oc.id_queries_saved)
+
+    def test_get_id_field_queries_packs_ids_to_limits(self):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.max_soql_length = 1000
+        oc.max_query_url_length = 100000
+        oc.get_field_map = Mock(return_value={
+            'Lookup__c': {
+                'name': 'Lookup__c',
+                'type': 'reference',
+                'referenceTo': ['Account']
+            },
+            'Text__c': {
+                'name': 'Text__c',
+                'type': 'string'
+            }
+        })
+
+        step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Lookup__c', 'Text__c'])
+        oc.add_step(step)
+        step.initialize()
+
+        id_set = set([amaxa.SalesforceId('00100000000' + str(i + 1).zfill(4)) for i in range(100)])
+
+        queries = list(step.get_id_field_queries('Lookup__c', id_set))
+        prefix = 'SELECT Lookup__c, Text__c FROM Account WHERE Lookup__c IN ('
+        ids_per_query = (1000 - len(prefix) - 1 + 1) // len('\'001000000000001\',')
+
+        self.assertEqual(math.ceil(100 / ids_per_query), len(queries))
+        for q in queries:
+            self.assertTrue(q.startswith(prefix + '\''))
+            self.assertLessEqual(len(q), 1000)
+        self.assertIn('\'001000000000001\'', ''.join(queries))
+        self.assertEqual(100, ''.join(queries).count('\'001'))
+
+        # Non-Id fields are queried with full 18-character Ids.
+        queries = list(step.get_id_field_queries('Text__c', id_set))
+        self.assertIn('\'' + str(amaxa.SalesforceId('001000000000001')) + '\'', ''.join(queries))
+
+        # The URL length limit is also respected.
+        oc.max_soql_length = 100000
+        oc.max_query_url_length = 1000
+        for q in step.get_id_field_queries('Lookup__c', id_set):
+            self.assertLessEqual(len(urllib.parse.quote_plus(q)), 1000)
+
+    def test_count_id_field_queries_matches_packed_queries(self):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.get_field_map = Mock(return_value={
+            'Lookup__c': {
+                'name': 'Lookup__c',
+                'type': 'reference',
+                'referenceTo': ['Account']
+            },
+            'Text__c': {
+                'name': 'Text__c',
+                'type': 'string'
+            }
+        })
+
+        step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Lookup__c', 'Text__c'])
+        oc.add_step(step)
+        step.initialize()
+
+        for (soql_length, url_length) in [(1000, 100000), (100000, 1000), (1200, 1300), (10, 10)]:
+            oc.max_soql_length = soql_length
+            oc.max_query_url_length = url_length
+            for count in [0, 1, 37, 100]:
+                id_set = amaxa.IdSet(['00100000000' + str(i + 1).zfill(4) for i in range(count)])
+                for field in ['Lookup__c', 'Text__c']:
+                    self.assertEqual(
+                        len(list(step.get_id_field_queries(field, id_set))),
+                        step.count_id_field_queries(field, count)
+                    )
 
     def test_perform_id_field_pass_stores_results(self):
         connection = Mock()
-        connection.query_all = Mock(side_effect=lambda x: { 'records': [{ 'Id': '001000000000001'}, { 'Id': '001000000000002'}] })
+        connection.query = Mock(side_effect=lambda x: { 'records': [{ 'Id': '001000000000001'}, { 'Id': '001000000000002'}], 'done': True })
 
         oc = amaxa.ExtractOperation(connection)
         oc.get_field_map = Mock(return_value={
@@ -384,13 +521,77 @@ class test_ExtractionStep(unittest.TestCase):
         })
 
         step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Lookup__c'])
-        step.store_result = Mock()
+        step.store_results = Mock()
         oc.add_step(step)
         step.initialize()
 
         step.perform_id_field_pass('Lookup__c', set([amaxa.SalesforceId('001000000000001'), amaxa.SalesforceId('001000000000002')]))
-        step.store_result.assert_any_call(connection.query_all('Account')['records'][0])
-        step.store_result.assert_any_call(connection.query_all('Account')['records'][1])
+        self.assertIn(connection.query('Account')['records'][0], get_stored_records(step))
+        self.assertIn(connection.query('Account')['records'][1], get_stored_records(step))
+
+    def test_perform_id_field_pass_limits_concurrent_queries(self):
+        lock = threading.Lock()
+        state = { 'active': 0, 'peak': 0 }
+
+        def query(q):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.01)
+            with lock:
+                state['active'] -= 1
+
+            return { 'records': [{ 'Id': '001000000000001'}], 'done': True }
+
+        connection = Mock()
+        connection.query = Mock(side_effect=query)
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.api_concurrency = 2
+        oc.max_query_url_length = 2000
+        oc.get_field_map = Mock(return_value={
+            'Lookup__c': {
+                'name': 'Lookup__c',
+                'type': 'reference',
+                'referenceTo': ['Account']
+            }
+        })
+
+        step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Lookup__c'])
+        step.store_results = Mock()
+        oc.add_step(step)
+        step.initialize()
+
+        id_set = set([amaxa.SalesforceId('001000000000' + str(i + 1).zfill(3)) for i in range(800)])
+
+        step.perform_id_field_pass('Lookup__c', id_set)
+
+        self.assertLess(3, connection.query.call_count)
+        self.assertEqual(2, state['peak'])
+        self.assertEqual(connection.query.call_count, len(get_stored_records(step)))
+
+    def test_perform_id_field_pass_raises_query_exceptions(self):
+        connection = Mock()
+        connection.query = Mock(side_effect=simple_salesforce.SalesforceMalformedRequest('url', 400, 'Account', 'Error'))
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.get_field_map = Mock(return_value={
+            'Lookup__c': {
+                'name': 'Lookup__c',
+                'type': 'reference',
+                'referenceTo': ['Account']
+            }
+        })
+
+        step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Lookup__c'])
+        step.store_results = Mock()
+        oc.add_step(step)
+        step.initialize()
+
+        with self.assertRaises(simple_salesforce.SalesforceMalformedRequest):
+            step.perform_id_field_pass('Lookup__c', set([amaxa.SalesforceId('001000000000001')]))
+
+        step.store_results.assert_not_called()
 
     def test_perform_id_field_pass_ignores_empty_set(self):
         connection = Mock()
@@ -410,7 +611,7 @@ class test_ExtractionStep(unittest.TestCase):
 
         step.perform_id_field_pass('Lookup__c', set())
 
-        connection.query_all.assert_not_called()
+        connection.query.assert_not_called()
 
     @patch('amaxa.ExtractOperation.bulk', new_callable=PropertyMock())
     def test_perform_bulk_api_pass_calls_query(self, bulk_proxy):
@@ -424,13 +625,13 @@ class test_ExtractionStep(unittest.TestCase):
             }
         })
         retval = [{ 'Id': '001000000000001'}, { 'Id': '001000000000002'}]
-        bulk_proxy.is_batch_done = Mock(side_effect=[False, True])
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.query.return_value, 'state': 'Completed' }])
         bulk_proxy.create_query_job = Mock(return_value = '075000000000000AAA')
         bulk_proxy.get_all_results_for_query_batch = Mock(
             return_value = [IteratorBytesIO([json.dumps(retval).encode('utf-8')])]
         )
         step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.QUERY, ['Lookup__c'])
-        step.store_result = Mock()
+        step.store_results = Mock()
         oc.add_step(step)
         step.initialize()
 
@@ -451,20 +652,20 @@ class test_ExtractionStep(unittest.TestCase):
             }
         })
         retval = [{ 'Id': '001000000000001'}, { 'Id': '001000000000002'}]
-        bulk_proxy.is_batch_done = Mock(side_effect=[False, True])
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.query.return_value, 'state': 'Completed' }])
         bulk_proxy.create_query_job = Mock(return_value = '075000000000000AAA')
         bulk_proxy.get_all_results_for_query_batch = Mock(
             return_value = [IteratorBytesIO([json.dumps(retval).encode('utf-8')])]
         )
 
         step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Lookup__c'])
-        step.store_result = Mock()
+        step.store_results = Mock()
         oc.add_step(step)
         step.initialize()
 
         step.perform_bulk_api_pass('SELECT Id FROM Account')
-        step.store_result.assert_any_call(retval[0])
-        step.store_result.assert_any_call(retval[1])
+        self.assertIn(retval[0], get_stored_records(step))
+        self.assertIn(retval[1], get_stored_records(step))
 
     @patch('amaxa.ExtractOperation.bulk', new_callable=PropertyMock())
 
@@ -487,19 +688,134 @@ class test_ExtractionStep(unittest.TestCase):
             ])
 
 
-        bulk_proxy.is_batch_done = Mock(side_effect=[False, True])
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.query.return_value, 'state': 'Completed' }])
         bulk_proxy.create_query_job = Mock(return_value = '075000000000000AAA')
         bulk_proxy.get_all_results_for_query_batch = Mock(
             return_value = [IteratorBytesIO([json.dumps(chunk).encode('utf-8')]) for chunk in retval]
         )
 
         step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Lookup__c'])
-        step.store_result = Mock()
+        step.store_results = Mock()
         oc.add_step(step)
         step.initialize()
 
         step.perform_bulk_api_pass('SELECT Id FROM Account')
-        self.assertEqual(500000, step.store_result.call_count)
+        self.assertEqual(500000, len(get_stored_records(step)))
+
+    @patch('amaxa.amaxa.sleep')
+    @patch('amaxa.ExtractOperation.bulk', new_callable=PropertyMock())
+    def test_perform_bulk_api_pass_retrieves_pk_chunks(self, bulk_proxy, sleep_proxy):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.get_field_map = Mock(return_value={
+            'Name': {
+                'name': 'Name',
+                'type': 'string'
+            }
+        })
+        chunks = {
+            '751000000000001AAA': [{ 'Id': '001000000000001'}, { 'Id': '001000000000002'}],
+            '751000000000002AAA': [{ 'Id': '001000000000003'}]
+        }
+        bulk_proxy.create_query_job = Mock(return_value='075000000000000AAA')
+        bulk_proxy.query = Mock(return_value='751000000000000AAA')
+        bulk_proxy.get_batch_list = Mock(
+            side_effect=[
+                [
+                    { 'id': '751000000000000AAA', 'state': 'Queued' }
+                ],
+                [
+                    { 'id': '751000000000000AAA', 'state': 'NotProcessed' },
+                    { 'id': '751000000000001AAA', 'state': 'Completed' },
+                    { 'id': '751000000000002AAA', 'state': 'InProgress' }
+                ],
+                [
+                    { 'id': '751000000000000AAA', 'state': 'NotProcessed' },
+                    { 'id': '751000000000001AAA', 'state': 'Completed' },
+                    { 'id': '751000000000002AAA', 'state': 'Completed' }
+                ]
+            ]
+        )
+        bulk_proxy.get_all_results_for_query_batch = Mock(
+            side_effect=lambda batch, job: [IteratorBytesIO([json.dumps(chunks[batch]).encode('utf-8')])]
+        )
+
+        step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Name'], pk_chunk_size=100000)
+        step.store_results = Mock()
+        oc.add_step(step)
+        step.initialize()
+
+        step.perform_bulk_api_pass('SELECT Name FROM Account')
+
+        bulk_proxy.create_query_job.assert_called_once_with('Account', contentType='JSON', pk_chunking=100000)
+        self.assertEqual(3, bulk_proxy.get_batch_list.call_count)
+        self.assertEqual(
+            [
+                unittest.mock.call('751000000000001AAA', '075000000000000AAA'),
+                unittest.mock.call('751000000000002AAA', '075000000000000AAA')
+            ],
+            bulk_proxy.get_all_results_for_query_batch.call_args_list
+        )
+        self.assertEqual(3, len(get_stored_records(step)))
+        for chunk in chunks.values():
+            for rec in chunk:
+                self.assertIn(rec, get_stored_records(step))
+
+    @patch('amaxa.amaxa.sleep')
+    @patch('amaxa.ExtractOperation.bulk', new_callable=PropertyMock())
+    def test_perform_bulk_api_pass_raises_exception_for_failed_pk_chunks(self, bulk_proxy, sleep_proxy):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.get_field_map = Mock(return_value={
+            'Name': {
+                'name': 'Name',
+                'type': 'string'
+            }
+        })
+        bulk_proxy.query = Mock(return_value='751000000000000AAA')
+        bulk_proxy.get_batch_list = Mock(
+            return_value=[
+                { 'id': '751000000000000AAA', 'state': 'NotProcessed' },
+                { 'id': '751000000000001AAA', 'state': 'Failed', 'stateMessage': 'Timeout' }
+            ]
+        )
+
+        step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Name'], pk_chunk_size=100000)
+        step.store_results = Mock()
+        oc.add_step(step)
+        step.initialize()
+
+        with self.assertRaises(amaxa.AmaxaException):
+            step.perform_bulk_api_pass('SELECT Name FROM Account')
+
+        bulk_proxy.get_all_results_for_query_batch.assert_not_called()
+
+    @patch('amaxa.ExtractOperation.bulk', new_callable=PropertyMock())
+    def test_perform_bulk_api_pass_raises_exception_for_malformed_results(self, bulk_proxy):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.get_field_map = Mock(return_value={
+            'Name': {
+                'name': 'Name',
+                'type': 'string'
+            }
+        })
+        bulk_proxy.query = Mock(return_value='751000000000000AAA')
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': '751000000000000AAA', 'state': 'Completed' }])
+        bulk_proxy.get_all_results_for_query_batch = Mock(
+            return_value=[IteratorBytesIO([b'[{"Name": "Test"}, {"Name": '])]
+        )
+
+        step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Name'])
+        step.store_results = Mock()
+        oc.add_step(step)
+        step.initialize()
+
+        with self.assertRaises(json.JSONDecodeError):
+            step.perform_bulk_api_pass('SELECT Name FROM Account')
 
     @patch('amaxa.ExtractOperation.bulk', new_callable=PropertyMock())
     def test_perform_bulk_api_pass_converts_datetimes(self, bulk_proxy):
@@ -513,23 +829,26 @@ class test_ExtractionStep(unittest.TestCase):
             }
         })
         retval = [{ 'Id': '001000000000001', 'CreatedDate': 1546659665000}]
-        bulk_proxy.is_batch_done = Mock(side_effect=[False, True])
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.query.return_value, 'state': 'Completed' }])
         bulk_proxy.create_query_job = Mock(return_value = '075000000000000AAA')
         bulk_proxy.get_all_results_for_query_batch = Mock(
             return_value = [IteratorBytesIO([json.dumps(retval).encode('utf-8')])]
         )
 
         step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.QUERY, ['CreatedDate'])
-        step.store_result = Mock()
+        step.store_results = Mock()
         oc.add_step(step)
         step.initialize()
 
         step.perform_bulk_api_pass('SELECT Id, CreatedDate FROM Account')
-        step.store_result.assert_called_once_with(
-            {
-                'Id': '001000000000001',
-                'CreatedDate': '2019-01-05T03:41:05.000+0000'
-            }
+        self.assertEqual(
+            [
+                {
+                    'Id': '001000000000001',
+                    'CreatedDate': '2019-01-05T03:41:05.000+0000'
+                }
+            ],
+            get_stored_records(step)
         )
 
     def test_resolve_registered_dependencies_loads_records(self):
@@ -607,6 +926,7 @@ class test_ExtractionStep(unittest.TestCase):
         connection = Mock()
 
         oc = amaxa.ExtractOperation(connection)
+        oc.file_store = MockFileStore()
         oc.get_field_map = Mock(return_value={
             'Name': {
                 'name': 'Name',
@@ -627,6 +947,7 @@ class test_ExtractionStep(unittest.TestCase):
         connection = Mock()
 
         oc = amaxa.ExtractOperation(connection)
+        oc.file_store = MockFileStore()
         oc.get_field_map = Mock(return_value={
             'Name': {
                 'name': 'Name',
@@ -643,6 +964,77 @@ class test_ExtractionStep(unittest.TestCase):
 
         step.perform_bulk_api_pass.assert_called_once_with('SELECT Name FROM Account WHERE Name != null')
 
+    @patch('amaxa.ExtractOperation.bulk', new_callable=PropertyMock())
+
+    def test_execute_copies_bulk_csv_results_for_simple_steps(self, bulk_proxy):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.get_field_map = Mock(return_value={
+            'Id': { 'name': 'Id', 'type': 'id' },
+            'Name': { 'name': 'Name', 'type': 'text' }
+        })
+        f = io.StringIO()
+        output = csv.DictWriter(f, fieldnames=['Id', 'Name'])
+        output.writeheader()
+        oc.file_store.set_file('Account', amaxa.FileType.OUTPUT, f)
+        oc.file_store.set_csv('Account', amaxa.FileType.OUTPUT, output)
+        oc.add_dependency('Account', '001000000000002')
+
+        bulk_proxy.create_query_job = Mock(return_value='075000000000000AAA')
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.query.return_value, 'state': 'Completed' }])
+        bulk_proxy.get_all_results_for_query_batch = Mock(
+            return_value=[IteratorBytesIO([b'"Id","Name"\n"001000000000001","ACME"\n"001000000000002","Picon, Inc."\n'])]
+        )
+
+        step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.QUERY, ['Name', 'Id'], 'Name != null')
+        step.perform_bulk_api_pass = Mock()
+        oc.add_step(step)
+
+        step.initialize()
+        step.execute()
+
+        step.perform_bulk_api_pass.assert_not_called()
+        bulk_proxy.create_query_job.assert_called_once_with('Account', contentType='CSV')
+        bulk_proxy.query.assert_called_once_with('075000000000000AAA', 'SELECT Id, Name FROM Account WHERE Name != null')
+        self.assertEqual('Id,Name\r\n"001000000000001","ACME"\r\n"001000000000002","Picon, Inc."\r\n', f.getvalue())
+        self.assertEqual(amaxa.IdSet(['001000000000001', '001000000000002']), oc.get_extracted_ids('Account'))
+        self.assertEqual(0, len(oc.get_dependencies('Account')))
+        self.assertEqual(2, step.bulk_result_count)
+
+    def test_can_pass_through_csv_requires_simple_steps(self):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.get_field_map = Mock(return_value={
+            'Id': { 'name': 'Id', 'type': 'id' },
+            'Name': { 'name': 'Name', 'type': 'text' },
+            'CreatedDate': { 'name': 'CreatedDate', 'type': 'datetime' },
+            'ParentId': { 'name': 'ParentId', 'type': 'reference', 'referenceTo': ['Account'] }
+        })
+        output = csv.DictWriter(io.StringIO(), fieldnames=['Id', 'Name'])
+        oc.file_store.set_csv('Account', amaxa.FileType.OUTPUT, output)
+
+        step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Id', 'Name'])
+        oc.add_step(step)
+        step.initialize()
+
+        self.assertTrue(step.can_pass_through_csv())
+
+        for field_scope in [['Id', 'CreatedDate'], ['Id', 'ParentId']]:
+            step.field_scope = field_scope
+            step.initialize()
+            self.assertFalse(step.can_pass_through_csv())
+
+        step.field_scope = ['Id', 'Name']
+        step.initialize()
+        oc.mappers['Account'] = amaxa.DataMapper()
+        self.assertFalse(step.can_pass_through_csv())
+
+        del oc.mappers['Account']
+        oc.store_result('Account', { 'Id': '001000000000001', 'Name': 'ACME' })
+        self.assertFalse(step.can_pass_through_csv())
+
     def test_execute_loads_all_descendents(self):
         connection = Mock()
 
@@ -685,6 +1077,183 @@ class test_ExtractionStep(unittest.TestCase):
             any_order=True
         )
 
+    def get_semi_join_operation(self, parent_scope, where_clause=None):
+        connection = Mock()
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.get_field_map = Mock(return_value={
+            'Name': {
+                'name': 'Name',
+                'type': 'text'
+            },
+            'AccountId': {
+                'name': 'AccountId',
+                'type': 'reference',
+                'referenceTo': ['Account']
+            },
+            'WhoId': {
+                'name': 'WhoId',
+                'type': 'reference',
+                'referenceTo': ['Account', 'Contact']
+            }
+        })
+
+        parent = amaxa.ExtractionStep('Account', parent_scope, ['Name'], where_clause)
+        oc.add_step(parent)
+        step = amaxa.ExtractionStep(
+            'Contact',
+            amaxa.ExtractionScope.DESCENDENTS,
+            ['Name', 'AccountId'],
+            descendent_strategy=amaxa.DescendentStrategy.SEMI_JOIN
+        )
+        oc.add_step(step)
+        parent.initialize()
+        step.initialize()
+
+        oc.extracted_ids['Account'] = amaxa.IdSet([amaxa.SalesforceId('001000000000001'), amaxa.SalesforceId('001000000000002')])
+        parent.bulk_result_count = 2
+
+        return (oc, parent, step)
+
+    def test_get_semi_join_query_returns_query_for_query_parents(self):
+        (oc, parent, step) = self.get_semi_join_operation(amaxa.ExtractionScope.QUERY, 'Industry = \'Tech\'')
+
+        self.assertEqual(
+            'SELECT Name, AccountId FROM Contact WHERE AccountId IN (SELECT Id FROM Account WHERE Industry = \'Tech\')',
+            step.get_semi_join_query('AccountId')
+        )
+
+    def test_get_semi_join_query_returns_query_for_all_records_parents(self):
+        (oc, parent, step) = self.get_semi_join_operation(amaxa.ExtractionScope.ALL_RECORDS)
+
+        self.assertEqual(
+            'SELECT Name, AccountId FROM Contact WHERE AccountId IN (SELECT Id FROM Account)',
+            step.get_semi_join_query('AccountId')
+        )
+
+    def test_get_semi_join_query_returns_none_for_ineligible_lookups(self):
+        (oc, parent, step) = self.get_semi_join_operation(amaxa.ExtractionScope.QUERY, 'Industry = \'Tech\'')
+
+        # Polymorphic lookup
+        self.assertIsNone(step.get_semi_join_query('WhoId'))
+
+        # Parent has records extracted outside its query
+        parent.bulk_result_count = 1
+        self.assertIsNone(step.get_semi_join_query('AccountId'))
+
+        # Parent query contains its own semi-join
+        parent.bulk_result_count = 2
+        parent.where_clause = 'Id IN (SELECT AccountId FROM Opportunity)'
+        self.assertIsNone(step.get_semi_join_query('AccountId'))
+
+        # Parent query contains clauses a subquery can't
+        for where_clause in [
+            'Industry = \'Tech\' ORDER BY Name',
+            'Industry = \'Tech\' LIMIT 10',
+            'Industry = \'Tech\' order by Name limit 10 offset 5'
+        ]:
+            parent.where_clause = where_clause
+            self.assertIsNone(step.get_semi_join_query('AccountId'))
+
+        # Keywords in string literals are fine
+        parent.where_clause = 'Name = \'No LIMIT Ltd\''
+        self.assertEqual(
+            'SELECT Name, AccountId FROM Contact WHERE AccountId IN (SELECT Id FROM Account WHERE Name = \'No LIMIT Ltd\')',
+            step.get_semi_join_query('AccountId')
+        )
+
+        # Parent extracted by Id
+        parent.where_clause = None
+        parent.scope = amaxa.ExtractionScope.SELECTED_RECORDS
+        self.assertIsNone(step.get_semi_join_query('AccountId'))
+
+    def test_execute_uses_semi_join_for_descendents(self):
+        (oc, parent, step) = self.get_semi_join_operation(amaxa.ExtractionScope.QUERY, 'Industry = \'Tech\'')
+        step.perform_bulk_api_pass = Mock()
+        step.perform_lookup_pass = Mock()
+
+        step.execute()
+
+        step.perform_bulk_api_pass.assert_called_once_with(
+            'SELECT Name, AccountId FROM Contact WHERE AccountId IN (SELECT Id FROM Account WHERE Industry = \'Tech\')'
+        )
+        step.perform_lookup_pass.assert_not_called()
+
+    def test_execute_falls_back_to_id_list_for_limited_parent_queries(self):
+        (oc, parent, step) = self.get_semi_join_operation(amaxa.ExtractionScope.QUERY, 'Industry = \'Tech\' LIMIT 100')
+        step.perform_bulk_api_pass = Mock()
+        step.perform_lookup_pass = Mock()
+
+        step.execute()
+
+        step.perform_bulk_api_pass.assert_not_called()
+        step.perform_lookup_pass.assert_called_once_with('AccountId')
+
+    def test_execute_falls_back_to_id_list_for_descendents(self):
+        (oc, parent, step) = self.get_semi_join_operation(amaxa.ExtractionScope.QUERY, 'Industry = \'Tech\'')
+        parent.bulk_result_count = 1
+        step.perform_bulk_api_pass = Mock()
+        step.perform_lookup_pass = Mock()
+
+        step.execute()
+
+        step.perform_bulk_api_pass.assert_not_called()
+        step.perform_lookup_pass.assert_called_once_with('AccountId')
+
+    def test_choose_descendent_strategy_prefers_full_scan_for_small_tables(self):
+        (oc, parent, step) = self.get_semi_join_operation(amaxa.ExtractionScope.QUERY, 'Industry = \'Tech\'')
+        oc.max_query_url_length = 1000
+        oc.extracted_ids['Account'] = amaxa.IdSet([amaxa.SalesforceId('0010000000' + str(i + 1).zfill(5)) for i in range(20000)])
+        oc.connection.query = Mock(return_value={ 'totalSize': 10000, 'done': True, 'records': [] })
+
+        self.assertEqual(amaxa.DescendentStrategy.FULL_SCAN, step.choose_descendent_strategy())
+        oc.connection.query.assert_called_once_with('SELECT COUNT() FROM Contact')
+
+    def test_choose_descendent_strategy_prefers_id_list_for_large_tables(self):
+        (oc, parent, step) = self.get_semi_join_operation(amaxa.ExtractionScope.QUERY, 'Industry = \'Tech\'')
+        oc.connection.query = Mock(return_value={ 'totalSize': 5000000, 'done': True, 'records': [] })
+
+        self.assertEqual(amaxa.DescendentStrategy.ID_LIST, step.choose_descendent_strategy())
+
+    def test_choose_descendent_strategy_skips_count_without_parents(self):
+        (oc, parent, step) = self.get_semi_join_operation(amaxa.ExtractionScope.QUERY, 'Industry = \'Tech\'')
+        oc.extracted_ids['Account'] = amaxa.IdSet()
+        oc.connection.query = Mock()
+
+        self.assertEqual(amaxa.DescendentStrategy.ID_LIST, step.choose_descendent_strategy())
+        oc.connection.query.assert_not_called()
+
+    def test_execute_uses_chosen_descendent_strategy(self):
+        (oc, parent, step) = self.get_semi_join_operation(amaxa.ExtractionScope.QUERY, 'Industry = \'Tech\'')
+        step.descendent_strategy = amaxa.DescendentStrategy.AUTO
+        step.choose_descendent_strategy = Mock(return_value=amaxa.DescendentStrategy.FULL_SCAN)
+        step.perform_full_scan_pass = Mock()
+        step.perform_lookup_pass = Mock()
+
+        step.execute()
+
+        step.perform_full_scan_pass.assert_called_once_with()
+        step.perform_lookup_pass.assert_not_called()
+
+    @patch('amaxa.ExtractOperation.bulk', new_callable=PropertyMock())
+    def test_perform_full_scan_pass_filters_records(self, bulk_proxy):
+        (oc, parent, step) = self.get_semi_join_operation(amaxa.ExtractionScope.QUERY, 'Industry = \'Tech\'')
+        retval = [
+            { 'Id': '003000000000001AAA', 'Name': 'Test', 'AccountId': str(amaxa.SalesforceId('001000000000001')) },
+            { 'Id': '003000000000002AAA', 'Name': 'Test', 'AccountId': str(amaxa.SalesforceId('001000000000003')) },
+            { 'Id': '003000000000003AAA', 'Name': 'Test', 'AccountId': None }
+        ]
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.query.return_value, 'state': 'Completed' }])
+        bulk_proxy.get_all_results_for_query_batch = Mock(
+            return_value = [IteratorBytesIO([json.dumps(retval).encode('utf-8')])]
+        )
+        step.store_results = Mock()
+
+        step.perform_full_scan_pass()
+
+        bulk_proxy.query.assert_called_once_with(bulk_proxy.create_query_job.return_value, 'SELECT Name, AccountId FROM Contact')
+        self.assertEqual([retval[0]], get_stored_records(step))
+
     def test_execute_resolves_self_lookups(self):
         connection = Mock()
 
@@ -710,6 +1279,12 @@ class test_ExtractionStep(unittest.TestCase):
                 set([amaxa.SalesforceId('001000000000001'), amaxa.SalesforceId('001000000000002')])
             ]
         )
+        oc.extracted_ids['Account'] = amaxa.IdSet()
+        view = amaxa.ReferenceView(oc, ['Account'], [oc.extracted_ids['Account']])
+        def add_id(id):
+            oc.register_extracted_ids('Account', amaxa.IdSet([id]), [])
+        add_id('001000000000001')
+        oc.get_reference_view = Mock(return_value=view)
 
         step = amaxa.ExtractionStep(
             'Account',
@@ -718,8 +1293,11 @@ class test_ExtractionStep(unittest.TestCase):
             'Name = \'ACME\''
         )
         step.perform_bulk_api_pass = Mock()
-        step.perform_lookup_pass = Mock()
-        step.resolve_registered_dependencies = Mock()
+        step.perform_id_field_pass = Mock()
+        # The first round of self-lookup tracing finds the parent record 001000000000002.
+        step.resolve_registered_dependencies = Mock(
+            side_effect=lambda: add_id('001000000000002') if step.resolve_registered_dependencies.call_count == 2 else None
+        )
         oc.add_step(step)
 
         step.initialize()
@@ -736,18 +1314,64 @@ class test_ExtractionStep(unittest.TestCase):
                 unittest.mock.call('Account')
             ]
         )
-        step.perform_lookup_pass.assert_has_calls(
+        step.perform_id_field_pass.assert_has_calls(
             [
-                unittest.mock.call('ParentId'),
-                unittest.mock.call('ParentId')
+                unittest.mock.call('ParentId', set([amaxa.SalesforceId('001000000000001')])),
+                unittest.mock.call('ParentId', set([amaxa.SalesforceId('001000000000002')]))
             ]
         )
         step.resolve_registered_dependencies.assert_has_calls(
             [
+                unittest.mock.call(),
                 unittest.mock.call(),
                 unittest.mock.call()
             ]
         )
+        self.assertEqual([1, 1], step.self_lookup_rounds)
+
+    def test_trace_self_lookups_queries_only_new_ids(self):
+        connection = Mock()
+        connection.query = Mock(return_value={ 'records': [], 'done': True })
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.get_field_map = Mock(return_value={
+            'ParentId': {
+                'name': 'ParentId',
+                'type': 'reference',
+                'referenceTo': [
+                    'Account'
+                ]
+            }
+        })
+
+        oc.file_store = MockFileStore()
+        oc.store_results('Account', [{ 'Id': '001000000000001' }, { 'Id': '001000000000002' }])
+        new_ids = [
+            ['001000000000003'],
+            ['001000000000004', '001000000000005'],
+            []
+        ]
+        def add_children():
+            oc.store_results('Account', [{ 'Id': i } for i in new_ids.pop(0)])
+
+        step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.QUERY, ['ParentId'], 'Name = \'ACME\'')
+        step.resolve_registered_dependencies = Mock(side_effect=add_children)
+        oc.add_step(step)
+        step.initialize()
+
+        step.perform_id_field_pass = Mock()
+        step.trace_self_lookups()
+
+        self.assertEqual([2, 1, 2], step.self_lookup_rounds)
+        queried = [c[0][1] for c in step.perform_id_field_pass.call_args_list]
+        self.assertEqual(
+            [
+                set([amaxa.SalesforceId('001000000000001'), amaxa.SalesforceId('001000000000002')]),
+                set([amaxa.SalesforceId('001000000000003')]),
+                set([amaxa.SalesforceId('001000000000004'), amaxa.SalesforceId('001000000000005')])
+            ],
+            queried
+        )
 
     def test_execute_does_not_trace_self_lookups_without_trace_all(self):
         connection = Mock()
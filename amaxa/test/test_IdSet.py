@@ -0,0 +1,122 @@
+import unittest
+from .. import amaxa
+
+
+class test_IdSet(unittest.TestCase):
+    def test_encodes_and_decodes_ids(self):
+        for id_15 in ['01Q36000000RXX5', '005360000016xkG', '0013600001ohPTp', '001zzzzzzzzzzzz', '001000000000000']:
+            key = amaxa.IdSet.encode(id_15)
+
+            self.assertLess(key, 1 << 64)
+            self.assertEqual(key, amaxa.IdSet.encode(amaxa.SalesforceId(id_15)))
+            self.assertEqual(key, amaxa.IdSet.encode(str(amaxa.SalesforceId(id_15))))
+            self.assertEqual(amaxa.SalesforceId(id_15), amaxa.IdSet.decode(key))
+
+    def test_yields_id_strings(self):
+        ids = ['00100000' + str(i).zfill(7) for i in range(0, 10000, 7)] + ['003zzzzzzzzzzzz', '0013600001ohPTp']
+        s = amaxa.IdSet(ids)
+
+        self.assertEqual(set(ids), set(s.id_strings()))
+        self.assertEqual(set(str(amaxa.SalesforceId(i)) for i in ids), set(s.id_strings(18)))
+        self.assertEqual(set(amaxa.SalesforceId(i) for i in ids), set(s))
+
+    def test_distinguishes_case(self):
+        s = amaxa.IdSet(['0013600001ohPTp'])
+
+        self.assertIn('0013600001ohPTp', s)
+        self.assertNotIn('0013600001OHPTP', s)
+
+    def test_raises_valueerror(self):
+        with self.assertRaises(ValueError):
+            amaxa.IdSet(['test'])
+        for invalid in ['001000000000-00', '001000000000+00', '001000000000/00', '001000000000=00', '0010000000 0000', '00100000000000é']:
+            with self.assertRaises(ValueError):
+                amaxa.IdSet([invalid])
+
+        self.assertNotIn(None, amaxa.IdSet())
+        self.assertNotIn('test', amaxa.IdSet())
+
+    def test_adds_and_removes_ids(self):
+        s = amaxa.IdSet()
+        s.add('001000000000001')
+        s.add(amaxa.SalesforceId('001000000000001'))
+        s.add('003000000000001')
+
+        self.assertEqual(2, len(s))
+        self.assertIn(amaxa.SalesforceId('001000000000001'), s)
+        self.assertIn(str(amaxa.SalesforceId('003000000000001')), s)
+
+        s.remove('001000000000001')
+        self.assertEqual(1, len(s))
+        self.assertNotIn('001000000000001', s)
+
+        with self.assertRaises(KeyError):
+            s.remove('001000000000001')
+
+        s.discard('001000000000001')
+        self.assertEqual(set([amaxa.SalesforceId('003000000000001')]), set(s))
+
+    def test_operates_on_encoded_keys(self):
+        s = amaxa.IdSet(['001000000000001'])
+        key = amaxa.IdSet.encode('003000000000001')
+
+        self.assertFalse(s.contains_key(key))
+        s.add_key(key)
+        self.assertTrue(s.contains_key(key))
+        self.assertTrue(s.contains_key(amaxa.IdSet.encode('001000000000001')))
+        self.assertIn('003000000000001', s)
+
+        self.assertTrue(s.discard_key(key))
+        self.assertFalse(s.discard_key(key))
+        self.assertFalse(s.contains_key(key))
+        self.assertEqual(set([amaxa.SalesforceId('001000000000001')]), set(s))
+
+    def test_handles_many_ids(self):
+        ids = ['00100000' + str(i).zfill(7) for i in range(0, 60000, 3)]
+        s = amaxa.IdSet(ids)
+
+        self.assertEqual(len(ids), len(s))
+        self.assertGreater(len(s.keys), 0)
+        for i in ids[::97]:
+            self.assertIn(i, s)
+        self.assertNotIn('001000000000001', s)
+
+        for i in ids[:10000]:
+            s.remove(i)
+        s.add(ids[0])
+
+        self.assertEqual(len(ids) - 9999, len(s))
+        self.assertIn(ids[0], s)
+        self.assertNotIn(ids[1], s)
+        self.assertEqual(set(amaxa.SalesforceId(i) for i in [ids[0]] + ids[10000:]), set(s))
+
+    def test_set_operations(self):
+        a = amaxa.IdSet(['001000000000001', '001000000000002', '003000000000001'])
+        b = amaxa.IdSet(['001000000000002', '003000000000001', '003000000000002'])
+
+        self.assertEqual(
+            set(amaxa.SalesforceId(i) for i in ['001000000000001', '001000000000002', '003000000000001', '003000000000002']),
+            a | b
+        )
+        self.assertEqual(set([amaxa.SalesforceId('001000000000002'), amaxa.SalesforceId('003000000000001')]), a & b)
+        self.assertEqual(set([amaxa.SalesforceId('001000000000001')]), a - b)
+        self.assertEqual(set([amaxa.SalesforceId('003000000000002')]), set([amaxa.SalesforceId('003000000000002')]) - a)
+        self.assertEqual(a.intersection(b), b.intersection(a))
+
+        c = a.copy()
+        c |= b
+        self.assertEqual(4, len(c))
+        self.assertEqual(3, len(a))
+
+        d = set([amaxa.SalesforceId('001000000000009')])
+        d |= a
+        self.assertEqual(4, len(d))
+
+    def test_equals_sets(self):
+        s = amaxa.IdSet(['001000000000001'])
+
+        self.assertEqual(set([amaxa.SalesforceId('001000000000001')]), s)
+        self.assertEqual(s, set(['001000000000001']))
+        self.assertNotEqual(s, set(['test']))
+        self.assertNotEqual(s, amaxa.IdSet())
+        self.assertFalse(amaxa.IdSet())
@@ -1,4 +1,5 @@
 import unittest
+import threading
 from unittest.mock import Mock, MagicMock, PropertyMock, patch
 from .. import amaxa
 from .. import constants
@@ -76,6 +77,7 @@ class test_LoadOperation(unittest.TestCase):
         first_step = Mock(sobjectname = 'Account')
         second_step = Mock(sobjectname = 'Contact')
         first_step.execute_dependent_updates.side_effect = lambda: op.register_error('Account', '001000000000000', 'err')
+        op.api_concurrency = 1
 
         op.add_step(first_step)
         op.add_step(second_step)
@@ -125,3 +127,45 @@ class test_LoadOperation(unittest.TestCase):
 
         first_step.execute_dependent_updates.assert_called_once_with()
         second_step.execute_dependent_updates.assert_called_once_with()
+
+    def test_execute_runs_dependent_updates_concurrently(self):
+        connection = Mock()
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.stage = amaxa.LoadStage.DEPENDENTS
+        op.api_concurrency = 2
+
+        # Each step waits for the other to start, so they can only finish if run at once.
+        barrier = threading.Barrier(2, timeout=5)
+        steps = [Mock(sobjectname = name) for name in ['Account', 'Contact', 'Opportunity']]
+        for s in steps[:2]:
+            s.execute_dependent_updates.side_effect = lambda: barrier.wait()
+
+        for s in steps:
+            op.add_step(s)
+
+        self.assertEqual(0, op.execute())
+
+        for s in steps:
+            s.execute_dependent_updates.assert_called_once_with()
+
+    def test_execute_finishes_running_dependent_updates_after_error(self):
+        connection = Mock()
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.stage = amaxa.LoadStage.DEPENDENTS
+        op.api_concurrency = 2
+
+        # Contact is still running when Account fails.
+        steps = [Mock(sobjectname = name) for name in ['Account', 'Contact', 'Opportunity']]
+        steps[0].execute_dependent_updates.side_effect = lambda: op.register_error('Account', '001000000000000', 'err')
+        steps[1].execute_dependent_updates.side_effect = lambda: threading.Event().wait(0.5)
+
+        for s in steps:
+            op.add_step(s)
+
+        self.assertEqual(-1, op.execute())
+
+        steps[0].execute_dependent_updates.assert_called_once_with()
+        steps[1].execute_dependent_updates.assert_called_once_with()
+        steps[2].execute_dependent_updates.assert_not_called()
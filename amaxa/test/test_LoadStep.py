@@ -299,6 +299,7 @@ class test_LoadStep(unittest.TestCase):
                 UploadResult('001000000000003', True, True, '')
             ]
         )
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.post_batch.return_value, 'state': 'Completed' }])
         op.mappers['Account'] = Mock()
         op.mappers['Account'].transform_record = Mock(side_effect=lambda x: x)
 
@@ -360,6 +361,7 @@ class test_LoadStep(unittest.TestCase):
                 UploadResult('001000000000003', True, True, '')
             ]
         )
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.post_batch.return_value, 'state': 'Completed' }])
         bulk_proxy.create_insert_job = Mock(return_value=Mock())
         op.mappers['Account'] = Mock()
         op.mappers['Account'].transform_record = Mock(side_effect=lambda x: x)
@@ -416,6 +418,7 @@ class test_LoadStep(unittest.TestCase):
                 UploadResult('001000000000003', True, True, '')
             ]
         )
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.post_batch.return_value, 'state': 'Completed' }])
         bulk_proxy.create_insert_job = Mock(return_value=Mock())
         op.mappers['Account'] = Mock()
         op.mappers['Account'].transform_record = Mock(side_effect=lambda x: x)
@@ -452,6 +455,13 @@ class test_LoadStep(unittest.TestCase):
         record_list = [{'Id': '001000000{:06d}'.format(i), 'Name': 'Account {:06d}'.format(i)} for i in range(20000)]
         op.file_store.records['Account'] = record_list
         op.get_result_file = Mock()
+        bulk_proxy.post_batch = Mock(side_effect=['751000000000001AAA', '751000000000002AAA'])
+        bulk_proxy.get_batch_list = Mock(
+            return_value=[
+                { 'id': '751000000000001AAA', 'state': 'Completed' },
+                { 'id': '751000000000002AAA', 'state': 'Completed' }
+            ]
+        )
         bulk_proxy.get_batch_results = Mock(
             side_effect=[
                 [ UploadResult('00100000{:d}{:06d}'.format(j, i), True, True, '') for i in range(10000) ]
@@ -466,10 +476,98 @@ class test_LoadStep(unittest.TestCase):
         l.execute()
 
         self.assertEqual(2, bulk_proxy.post_batch.call_count)
-        self.assertEqual(2, bulk_proxy.wait_for_batch.call_count)
+        self.assertEqual(1, bulk_proxy.get_batch_list.call_count)
         self.assertEqual(2, bulk_proxy.get_batch_results.call_count)
         self.assertEqual(20000, op.register_new_id.call_count)
 
+        # Each batch's results must be matched against that batch's original Ids.
+        op.register_new_id.assert_any_call('Account', amaxa.SalesforceId('001000000010000'), amaxa.SalesforceId('001000001000000'))
+        op.register_new_id.assert_any_call('Account', amaxa.SalesforceId('001000000019999'), amaxa.SalesforceId('001000001009999'))
+
+    @patch('amaxa.LoadOperation.bulk', new_callable=PropertyMock())
+    def test_execute_posts_batches_while_reading_input(self, bulk_proxy):
+        connection = Mock()
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.get_field_map = Mock(return_value={
+            'Name': { 'type': 'string', 'soapType': 'xsd:string' },
+            'Id': { 'type': 'string', 'soapType': 'xsd:string' }
+        })
+        op.register_new_id = Mock()
+
+        read = []
+        posted = []
+        def read_records():
+            for i in range(15000):
+                read.append(i)
+                yield {'Id': '001000000{:06d}'.format(i), 'Name': 'Account {:06d}'.format(i)}
+
+        def post_batch(job, records):
+            posted.append(len(read))
+            return '75100000000000{}AAA'.format(len(posted))
+
+        op.file_store.records['Account'] = read_records()
+        bulk_proxy.post_batch = Mock(side_effect=post_batch)
+        bulk_proxy.get_batch_list = Mock(
+            return_value=[
+                { 'id': '751000000000001AAA', 'state': 'Completed' },
+                { 'id': '751000000000002AAA', 'state': 'Completed' }
+            ]
+        )
+        bulk_proxy.get_batch_results = Mock(
+            side_effect=[
+                [ UploadResult('00100000{:d}{:06d}'.format(j, i), True, True, '') for i in range(n) ]
+                for (j, n) in [(0, 10000), (1, 5000)]
+            ]
+        )
+
+        l = amaxa.LoadStep('Account', ['Name'])
+        l.context = op
+
+        l.initialize()
+        l.execute()
+
+        # The first batch is posted as soon as it fills, before the rest of the file is read.
+        self.assertEqual([10000, 15000], posted)
+        self.assertEqual(15000, op.register_new_id.call_count)
+
+    @patch('amaxa.LoadOperation.bulk', new_callable=PropertyMock())
+    def test_execute_stops_posting_batches_after_bad_data(self, bulk_proxy):
+        connection = Mock()
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.get_field_map = Mock(return_value={
+            'IsActive__c': { 'type': 'boolean', 'soapType': 'xsd:boolean' },
+            'Id': { 'type': 'string', 'soapType': 'xsd:string' }
+        })
+        op.register_new_id = Mock()
+        op.register_error = Mock()
+
+        record_list = [{'Id': '001000000{:06d}'.format(i), 'IsActive__c': 'true'} for i in range(25000)]
+        record_list[10000]['IsActive__c'] = 'maybe'
+        record_list[20000]['IsActive__c'] = 'perhaps'
+        op.file_store.records['Account'] = record_list
+        bulk_proxy.post_batch = Mock(return_value='751000000000001AAA')
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': '751000000000001AAA', 'state': 'Completed' }])
+        bulk_proxy.get_batch_results = Mock(
+            return_value=[ UploadResult('001000001{:06d}'.format(i), True, True, '') for i in range(10000) ]
+        )
+
+        l = amaxa.LoadStep('Account', ['IsActive__c'])
+        l.context = op
+
+        l.initialize()
+        l.execute()
+
+        # The batch posted before the bad record is reconciled, and every bad record is reported.
+        bulk_proxy.post_batch.assert_called_once()
+        bulk_proxy.close_job.assert_called_once()
+        self.assertEqual(10000, op.register_new_id.call_count)
+        self.assertEqual(
+            [record_list[10000]['Id'], record_list[20000]['Id']],
+            [c[0][1] for c in op.register_error.call_args_list]
+        )
+
     @patch('amaxa.LoadOperation.bulk', new_callable=PropertyMock())
     def test_execute_handles_errors(self, bulk_proxy):
         record_list = [
@@ -493,6 +591,7 @@ class test_LoadStep(unittest.TestCase):
                 UploadResult(None, False, False, error)
             ]
         )
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.post_batch.return_value, 'state': 'Completed' }])
 
         l = amaxa.LoadStep('Account', ['Name'])
         l.context = op
@@ -545,6 +644,7 @@ class test_LoadStep(unittest.TestCase):
                 UploadResult('001000000000003', True, True, '')
             ]
         )
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.post_batch.return_value, 'state': 'Completed' }])
 
         l = amaxa.LoadStep('Account', ['Name', 'Lookup__c'])
         l.context = op
@@ -595,6 +695,7 @@ class test_LoadStep(unittest.TestCase):
                 UploadResult(None, False, False, error)
             ]
         )
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.post_batch.return_value, 'state': 'Completed' }])
 
         l = amaxa.LoadStep('Account', ['Name', 'Lookup__c'])
         l.context = op
@@ -613,6 +714,112 @@ class test_LoadStep(unittest.TestCase):
             op.register_error.call_args_list
         )
 
+    @patch('amaxa.LoadOperation.bulk', new_callable=PropertyMock())
+    def test_execute_dependent_updates_posts_batches(self, bulk_proxy):
+        record_list = [
+            { 'Name': 'Test {}'.format(i), 'Id': '00100000000000{}'.format(i), 'Lookup__c': '00100000000000{}'.format((i + 1) % 5) }
+            for i in range(5)
+        ]
+
+        connection = Mock()
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.get_field_map = Mock(return_value={
+            'Name': { 'type': 'string '},
+            'Id': { 'type': 'string' },
+            'Lookup__c': { 'type': 'string' }
+        })
+
+        for i in range(5):
+            op.register_new_id('Account', amaxa.SalesforceId('00100000000000{}'.format(i)), amaxa.SalesforceId('00100000000001{}'.format(i)))
+
+        op.register_error = Mock()
+        op.file_store.records['Account'] = record_list
+        error = [{ 'statusCode': 'DUPLICATES_DETECTED', 'message': 'There are duplicates', 'fields': [], 'extendedErrorDetails': None }]
+        bulk_proxy.post_batch = Mock(side_effect=['751000000000001AAA', '751000000000002AAA', '751000000000003AAA'])
+        bulk_proxy.get_batch_list = Mock(
+            return_value=[
+                { 'id': '751000000000003AAA', 'state': 'Completed' },
+                { 'id': '751000000000002AAA', 'state': 'Completed' },
+                { 'id': '751000000000001AAA', 'state': 'Completed' }
+            ]
+        )
+        results = {
+            '751000000000001AAA': [UploadResult(None, True, False, None), UploadResult(None, True, False, None)],
+            '751000000000002AAA': [UploadResult(None, True, False, None), UploadResult(None, False, False, error)],
+            '751000000000003AAA': [UploadResult(None, False, False, error)]
+        }
+        bulk_proxy.get_batch_results = Mock(side_effect=lambda batch, job: results[batch])
+
+        l = amaxa.LoadStep('Account', ['Name', 'Lookup__c'], batch_size=2)
+        l.context = op
+
+        l.initialize()
+        l.self_lookups = set(['Lookup__c'])
+
+        l.execute_dependent_updates()
+
+        bulk_proxy.create_update_job.assert_called_once_with('Account', contentType='JSON')
+        self.assertEqual(3, bulk_proxy.post_batch.call_count)
+        self.assertEqual(
+            [
+                unittest.mock.call('Account', record_list[4]['Id'], l.format_error(error)),
+                unittest.mock.call('Account', record_list[3]['Id'], l.format_error(error))
+            ],
+            op.register_error.call_args_list
+        )
+
+    @patch('amaxa.LoadOperation.bulk', new_callable=PropertyMock())
+    @patch.object(amaxa, 'JSONIterator')
+    def test_execute_dependent_updates_uses_columns_cached_during_insert(self, json_iterator_proxy, bulk_proxy):
+        record_list = [
+            { 'Name': 'Test', 'Id': '001000000000000', 'Lookup__c': '001000000000001' },
+            { 'Name': 'Test 2', 'Id': '001000000000001', 'Lookup__c': '' }
+        ]
+
+        connection = Mock()
+        op = amaxa.LoadOperation(connection)
+        op.file_store = MockFileStore()
+        op.get_field_map = Mock(return_value={
+            'Name': { 'type': 'string', 'soapType': 'xsd:string' },
+            'Id': { 'type': 'string', 'soapType': 'xsd:string' },
+            'Lookup__c': { 'type': 'string', 'soapType': 'xsd:string' }
+        })
+        op.file_store.records['Account'] = record_list
+        bulk_proxy.post_batch = Mock(return_value='751000000000001AAA')
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': '751000000000001AAA', 'state': 'Completed' }])
+        bulk_proxy.get_batch_results = Mock(
+            return_value=[
+                UploadResult('001000000000002', True, True, ''),
+                UploadResult('001000000000003', True, True, '')
+            ]
+        )
+
+        l = amaxa.LoadStep('Account', ['Name', 'Lookup__c'])
+        l.context = op
+
+        l.initialize()
+        l.self_lookups = set(['Lookup__c'])
+
+        l.execute()
+        self.assertEqual(
+            [{ 'Id': '001000000000000', 'Lookup__c': '001000000000001' }, { 'Id': '001000000000001', 'Lookup__c': '' }],
+            list(l.dependent_lookup_cache)
+        )
+
+        # The update pass doesn't read the input file again.
+        op.file_store.records['Account'] = []
+        l.reset_input_csv = Mock()
+        bulk_proxy.get_batch_results = Mock(return_value=[UploadResult(None, True, False, None)])
+
+        l.execute_dependent_updates()
+
+        l.reset_input_csv.assert_not_called()
+        json_iterator_proxy.assert_called_with(
+            [{ 'Id': str(amaxa.SalesforceId('001000000000002')), 'Lookup__c': str(amaxa.SalesforceId('001000000000003')) }]
+        )
+        self.assertIsNone(l.dependent_lookup_cache)
+
     @patch('amaxa.LoadOperation.bulk', new_callable=PropertyMock())
     @patch.object(amaxa, 'JSONIterator')
     def test_execute_does_not_insert_records_prepopulated_in_id_map(self, json_iterator_proxy, bulk_proxy):
@@ -641,6 +848,7 @@ class test_LoadStep(unittest.TestCase):
                 UploadResult('001000000000008', True, True, '')
             ]
         )
+        bulk_proxy.get_batch_list = Mock(return_value=[{ 'id': bulk_proxy.post_batch.return_value, 'state': 'Completed' }])
         op.mappers['Account'] = Mock()
         op.mappers['Account'].transform_record = Mock(side_effect=lambda x: x)
 
@@ -1,4 +1,7 @@
 import unittest
+import time
+import threading
+import json
 from unittest.mock import Mock, MagicMock, PropertyMock, patch
 from .. import amaxa
 
@@ -129,6 +132,73 @@ class test_Operation(unittest.TestCase):
 
         connection.describe.assert_called_once_with()
 
+    def test_prefetches_describes_in_composite_batches(self):
+        sobjects = ['Object{}__c'.format(i) for i in range(30)]
+        connection = Mock()
+        connection.sf_version = '42.0'
+        connection.describe = Mock(return_value={ 'sobjects': [{ 'name': s } for s in sobjects] })
+
+        def restful(path, method, data):
+            requests = json.loads(data)['batchRequests']
+            return {
+                'hasErrors': False,
+                'results': [
+                    {
+                        'statusCode': 200,
+                        'result': { 'name': r['url'].split('/')[2], 'fields': [{ 'name': 'Id' }] }
+                    }
+                    for r in requests
+                ]
+            }
+        connection.restful = Mock(side_effect=restful)
+
+        oc = amaxa.Operation(connection)
+        oc.prefetch_describes(sobjects + ['Unknown__c'])
+
+        self.assertEqual(2, connection.restful.call_count)
+        self.assertEqual(
+            [25, 5],
+            sorted([len(json.loads(c[1]['data'])['batchRequests']) for c in connection.restful.call_args_list], reverse=True)
+        )
+        self.assertEqual(
+            { 'method': 'GET', 'url': 'v42.0/sobjects/Object0__c/describe' },
+            json.loads(connection.restful.call_args_list[0][1]['data'])['batchRequests'][0]
+        )
+        for s in sobjects:
+            self.assertEqual(s, oc.get_describe(s)['name'])
+            self.assertEqual({ 'Id': { 'name': 'Id' } }, oc.get_field_map(s))
+        self.assertNotIn('Unknown__c', oc.describe_info)
+
+        # Describes already retrieved are not requested again.
+        oc.prefetch_describes(sobjects)
+        self.assertEqual(2, connection.restful.call_count)
+
+    def test_prefetch_leaves_failed_describes_to_get_describe(self):
+        connection = Mock()
+        connection.sf_version = '42.0'
+        connection.describe = Mock(return_value={ 'sobjects': [{ 'name': 'Account' }, { 'name': 'Contact' }] })
+        connection.restful = Mock(return_value={
+            'hasErrors': True,
+            'results': [
+                { 'statusCode': 200, 'result': { 'name': 'Account', 'fields': [] } },
+                { 'statusCode': 500, 'result': [{ 'errorCode': 'UNKNOWN_EXCEPTION' }] }
+            ]
+        })
+        connection.Contact.describe = Mock(return_value={ 'name': 'Contact', 'fields': [] })
+
+        oc = amaxa.Operation(connection)
+        oc.prefetch_describes(['Account', 'Contact'])
+
+        self.assertIn('Account', oc.describe_info)
+        self.assertNotIn('Contact', oc.describe_info)
+        self.assertEqual('Contact', oc.get_describe('Contact')['name'])
+
+        connection.restful = Mock(side_effect=Exception('Composite API unavailable'))
+        oc = amaxa.Operation(connection)
+        oc.prefetch_describes(['Account', 'Contact'])
+
+        self.assertEqual({}, oc.describe_info)
+
     def test_run_calls_initialize_and_execute(self):
         connection = Mock()
         op = amaxa.Operation(connection)
@@ -154,3 +224,108 @@ class test_Operation(unittest.TestCase):
 
         op.logger.error.assert_called_once_with('Unexpected exception Test occurred.')
         op.file_store.close.assert_called_once_with()
+
+    def test_query_pages_follows_next_records_url(self):
+        connection = Mock()
+        connection.query = Mock(
+            return_value={ 'records': [{ 'Id': '001000000000001' }], 'done': False, 'nextRecordsUrl': '/query/01g-2000' }
+        )
+        connection.query_more = Mock(
+            side_effect=[
+                { 'records': [{ 'Id': '001000000000002' }], 'done': False, 'nextRecordsUrl': '/query/01g-4000' },
+                { 'records': [{ 'Id': '001000000000003' }], 'done': True }
+            ]
+        )
+
+        oc = amaxa.Operation(connection)
+        pages = oc.query_pages('SELECT Id FROM Account')
+
+        self.assertEqual([{ 'Id': '001000000000001' }], next(pages))
+        self.assertEqual([{ 'Id': '001000000000002' }], next(pages))
+        self.assertEqual([{ 'Id': '001000000000003' }], next(pages))
+        with self.assertRaises(StopIteration):
+            next(pages)
+
+        connection.query.assert_called_once_with('SELECT Id FROM Account')
+        self.assertEqual(
+            [
+                unittest.mock.call('/query/01g-2000', identifier_is_url=True),
+                unittest.mock.call('/query/01g-4000', identifier_is_url=True)
+            ],
+            connection.query_more.call_args_list
+        )
+
+    def test_query_pages_prefetches_next_page(self):
+        connection = Mock()
+        connection.query = Mock(
+            return_value={ 'records': [{ 'Id': '001000000000001' }], 'done': False, 'nextRecordsUrl': '/query/01g-2000' }
+        )
+        connection.query_more = Mock(return_value={ 'records': [{ 'Id': '001000000000002' }], 'done': True })
+
+        oc = amaxa.Operation(connection)
+        pages = oc.query_pages('SELECT Id FROM Account')
+
+        next(pages)
+        # The second page is requested while the caller holds the first.
+        for i in range(100):
+            if connection.query_more.called:
+                break
+            time.sleep(0.01)
+
+        connection.query_more.assert_called_once_with('/query/01g-2000', identifier_is_url=True)
+        self.assertEqual([{ 'Id': '001000000000002' }], next(pages))
+
+    def test_execute_steps_concurrently_limits_running_steps(self):
+        op = amaxa.Operation(Mock())
+        for i in range(6):
+            op.add_step(Mock(sobjectname=str(i)))
+
+        lock = threading.Lock()
+        state = { 'running': 0, 'peak': 0 }
+        def execute(s):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+
+        self.assertEqual(0, op.execute_steps_concurrently(execute, 2, lambda s, completed: True, lambda s, result: False))
+        self.assertEqual(2, state['peak'])
+
+    def test_execute_steps_concurrently_waits_for_ready_steps(self):
+        op = amaxa.Operation(Mock())
+        steps = [Mock(sobjectname=str(i)) for i in range(3)]
+        for s in steps:
+            op.add_step(s)
+
+        order = []
+        self.assertEqual(
+            0,
+            op.execute_steps_concurrently(
+                order.append,
+                3,
+                lambda s, completed: s is steps[0] or steps[0] in completed,
+                lambda s, result: False
+            )
+        )
+        self.assertIs(steps[0], order[0])
+        self.assertEqual(set(steps), set(order))
+
+    def test_execute_steps_concurrently_stops_starting_steps_after_failures(self):
+        op = amaxa.Operation(Mock())
+        steps = [Mock(sobjectname=str(i)) for i in range(3)]
+        for s in steps:
+            op.add_step(s)
+
+        order = []
+        self.assertEqual(
+            -1,
+            op.execute_steps_concurrently(
+                order.append,
+                1,
+                lambda s, completed: True,
+                lambda s, result: s is steps[1]
+            )
+        )
+        self.assertEqual(steps[:2], order)
@@ -1,4 +1,7 @@
 import unittest
+import random
+import string
+import unittest.mock
 from .. import amaxa
 
 
@@ -55,4 +58,96 @@ class test_SalesforceId(unittest.TestCase):
             new_id = amaxa.SalesforceId('001000000000' + str(i + 1).zfill(3))
             self.assertNotIn(new_id, id_set)
             id_set.add(new_id)
-            self.assertIn(new_id, id_set)
\ No newline at end of file
+            self.assertIn(new_id, id_set)
+
+    def test_checksum_matches_reference_algorithm(self):
+        def reference_checksum(idstr):
+            suffix = ''
+            for i in range(0, 3):
+                baseTwo = 0
+                for j in range (0, 5):
+                    character = idstr[i*5+j]
+                    if character >= 'A' and character <= 'Z':
+                        baseTwo += 1 << j
+                suffix += 'ABCDEFGHIJKLMNOPQRSTUVWXYZ012345'[baseTwo]
+            return suffix
+
+        rng = random.Random(0)
+        ids = [''.join(rng.choice(string.ascii_letters + string.digits) for j in range(15)) for i in range(500)]
+
+        for id_15 in ids:
+            self.assertEqual(reference_checksum(id_15), amaxa.SalesforceId.checksum(id_15))
+        self.assertEqual([reference_checksum(i) for i in ids], amaxa.SalesforceId.checksums(ids))
+        self.assertEqual([], amaxa.SalesforceId.checksums([]))
+        self.assertEqual(reference_checksum('001-00000000000'), amaxa.SalesforceId.checksum('001-00000000000'))
+
+    def test_intern_returns_canonical_instances(self):
+        first = amaxa.SalesforceId.intern('0013600001ohPTp')
+
+        self.assertIs(first, amaxa.SalesforceId.intern('0013600001ohPTpAAM'))
+        self.assertIs(first, amaxa.SalesforceId.intern(' 0013600001ohPTp '))
+        self.assertIs(first, amaxa.SalesforceId.intern(first))
+        self.assertEqual('0013600001ohPTpAAM', str(first))
+
+        with self.assertRaises(ValueError):
+            amaxa.SalesforceId.intern('test')
+
+    def test_intern_all_interns_batches(self):
+        ids = amaxa.SalesforceId.intern_all(['0013600001ohPTp', '005360000016xkGAAQ', '01Q36000000RXX5'])
+
+        self.assertEqual(['0013600001ohPTpAAM', '005360000016xkGAAQ', '01Q36000000RXX5EAO'], [str(i) for i in ids])
+        self.assertIs(ids[0], amaxa.SalesforceId.intern('0013600001ohPTpAAM'))
+
+    def test_equals_strings_without_conversion(self):
+        the_id = amaxa.SalesforceId('0013600001ohPTp')
+
+        self.assertEqual(the_id, '0013600001ohPTp')
+        self.assertEqual(the_id, '0013600001ohPTpAAM')
+        self.assertEqual(the_id, ' 0013600001ohPTp ')
+        self.assertNotEqual(the_id, '0013600001OHPTP')
+        self.assertNotEqual(the_id, '0013600001ohPTq')
+
+    normalize_cases = [
+        ('0013600001ohPTp', '0013600001ohPTpAAM'),
+        (' 0013600001ohPTpAAM ', '0013600001ohPTpAAM'),
+        ('01Q36000000RXX5', '01Q36000000RXX5EAO'),
+        ('0013600001OHPTPAAM', ''), # Checksum doesn't match
+        ('0013600001ohPTpAA', ''),
+        ('0013600001ohPTpAAM000', ''),
+        ('001-00000000000', ''),
+        ('0013600001ohPTé', ''),
+        ('test', ''),
+        ('', '')
+    ]
+
+    def check_normalize_all(self):
+        (normalized, valid) = amaxa.SalesforceId.normalize_all([c[0] for c in self.normalize_cases])
+
+        self.assertEqual([c[1] for c in self.normalize_cases], normalized)
+        self.assertEqual([c[1] != '' for c in self.normalize_cases], valid)
+        self.assertEqual(([], []), amaxa.SalesforceId.normalize_all([]))
+
+        rng = random.Random(0)
+        ids = [''.join(rng.choice(string.ascii_letters + string.digits) for j in range(15)) for i in range(500)]
+        (normalized, valid) = amaxa.SalesforceId.normalize_all(ids)
+
+        self.assertEqual([str(amaxa.SalesforceId(i)) for i in ids], normalized)
+        self.assertTrue(all(valid))
+
+    @unittest.mock.patch('amaxa.amaxa.numpy', None)
+    def test_normalize_all_without_numpy(self):
+        self.check_normalize_all()
+
+    @unittest.mock.patch('amaxa.amaxa.numpy', None)
+    def test_normalize_all_without_numpy_computes_checksums_in_one_pass(self):
+        ids = ['0013600001ohPTpAAM', '01Q36000000RXX5', '0013600001OHPTPAAM', '001-00000000000']
+
+        with unittest.mock.patch.object(amaxa.SalesforceId, 'checksum', side_effect=AssertionError):
+            (normalized, valid) = amaxa.SalesforceId.normalize_all(ids)
+
+        self.assertEqual(['0013600001ohPTpAAM', '01Q36000000RXX5EAO', '', ''], normalized)
+        self.assertEqual([True, True, False, False], valid)
+
+    @unittest.skipIf(amaxa.numpy is None, 'NumPy is not installed')
+    def test_normalize_all_with_numpy(self):
+        self.check_normalize_all()
@@ -5,6 +5,7 @@ import io
 from unittest.mock import Mock
 from .. import loader, amaxa
 from ..__main__ import main as main
+from ..describe_cache import DescribeCache
 
 
 credentials_good_yaml = '''
@@ -155,6 +156,54 @@ class test_CLI(unittest.TestCase):
 
         self.assertEqual(0, return_value)
 
+    @unittest.mock.patch('amaxa.__main__.loader.load_credentials')
+    @unittest.mock.patch('amaxa.__main__.loader.load_extraction_operation')
+    def test_main_sets_jobs(self, extraction_mock, credential_mock):
+        context = Mock()
+        context.run.return_value = 0
+        credential_mock.return_value = (context, [])
+        extraction_mock.return_value = (context, [])
+
+        m = Mock(side_effect=select_file)
+        with unittest.mock.patch('builtins.open', m):
+            with unittest.mock.patch(
+                'sys.argv',
+                ['amaxa', '-c', 'credentials-good.yaml', '--jobs', '4', 'extraction-good.yaml']
+            ):
+                return_value = main()
+
+        self.assertEqual(4, context.jobs)
+        self.assertEqual(0, return_value)
+
+    @unittest.mock.patch('amaxa.__main__.loader.load_credentials')
+    @unittest.mock.patch('amaxa.__main__.loader.load_extraction_operation')
+    def test_main_configures_describe_cache(self, extraction_mock, credential_mock):
+        context = Mock()
+        context.run.return_value = 0
+        credential_mock.return_value = (context, [])
+        extraction_mock.return_value = (context, [])
+
+        m = Mock(side_effect=select_file)
+        with unittest.mock.patch('builtins.open', m):
+            with unittest.mock.patch(
+                'sys.argv',
+                ['amaxa', '-c', 'credentials-good.yaml', 'extraction-good.yaml']
+            ):
+                main()
+
+        self.assertIsInstance(context.describe_cache, DescribeCache)
+        self.assertEqual(context.connection, context.describe_cache.connection)
+        self.assertFalse(context.describe_cache.refresh)
+
+        with unittest.mock.patch('builtins.open', m):
+            with unittest.mock.patch(
+                'sys.argv',
+                ['amaxa', '-c', 'credentials-good.yaml', '--refresh-describe', 'extraction-good.yaml']
+            ):
+                main()
+
+        self.assertTrue(context.describe_cache.refresh)
+
     @unittest.mock.patch('amaxa.__main__.loader.load_credentials')
     @unittest.mock.patch('amaxa.__main__.loader.load_extraction_operation')
     def test_main_calls_execute_with_yaml_input(self, extraction_mock, credential_mock):
@@ -299,3 +348,8 @@ class test_CLI(unittest.TestCase):
             },
             op.global_id_map
         )
+
+        # The loaded Ids are interned.
+        for (k, v) in op.global_id_map.items():
+            self.assertIs(amaxa.SalesforceId.intern(str(k)), k)
+            self.assertIs(amaxa.SalesforceId.intern(str(v)), v)
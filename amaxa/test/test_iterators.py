@@ -1,4 +1,5 @@
 import unittest
+import io
 import json
 from unittest.mock import Mock, MagicMock, PropertyMock, patch
 from functools import reduce
@@ -25,3 +26,62 @@ class test_iterators(unittest.TestCase):
 
         with self.assertRaises(StopIteration):
             next(b)
+
+    def test_JSONStreamIterator(self):
+        records = [
+            { 'Id': '001000000000001', 'Name': 'Café [1], "Test"' },
+            { 'Id': '001000000000002', 'Name': None, 'Amount': 12345.5 }
+        ]
+        stream = io.BytesIO(json.dumps(records, indent=1).encode('utf-8'))
+
+        # Use a tiny chunk size so that records and multi-byte characters span reads.
+        self.assertEqual(records, list(amaxa.JSONStreamIterator(stream, chunk_size=3)))
+
+    def test_JSONStreamIterator_reads_incrementally(self):
+        stream = Mock()
+        stream.read = Mock(side_effect=[b'[{"Id": "001000000000001"},', b'{"Id": "001000000000002"}', b']', b''])
+
+        i = amaxa.JSONStreamIterator(stream)
+
+        self.assertEqual({ 'Id': '001000000000001' }, next(i))
+        self.assertEqual(1, stream.read.call_count)
+        self.assertEqual({ 'Id': '001000000000002' }, next(i))
+        with self.assertRaises(StopIteration):
+            next(i)
+
+    def test_JSONStreamIterator_handles_empty_arrays(self):
+        self.assertEqual([], list(amaxa.JSONStreamIterator(io.BytesIO(b'[ ]'))))
+
+    def test_JSONStreamIterator_raises_exception_for_truncated_streams(self):
+        with self.assertRaises(json.JSONDecodeError):
+            list(amaxa.JSONStreamIterator(io.BytesIO(b'[{"Id": "001000000000001"}, {"Id": ')))
+
+        with self.assertRaises(json.JSONDecodeError):
+            list(amaxa.JSONStreamIterator(io.BytesIO(b'{"Id": "001000000000001"}')))
+
+    def test_CSVStreamIterator(self):
+        stream = io.BytesIO(
+            '"Id","Name"\n"001000000000001","Café"\n"001000000000002","Two\nLines"\n"001000000000003",""\n'.encode('utf-8')
+        )
+
+        # Use a tiny chunk size so that rows and multi-byte characters span reads.
+        pages = list(amaxa.CSVStreamIterator(stream, ['Id', 'Name'], page_size=2, chunk_size=3))
+
+        self.assertEqual(2, len(pages))
+        self.assertEqual(['001000000000001', '001000000000002'], pages[0].ids)
+        self.assertEqual('"001000000000001","Café"\r\n"001000000000002","Two\nLines"\r\n', pages[0].text)
+        self.assertEqual(['001000000000003'], pages[1].ids)
+        self.assertEqual('"001000000000003",""\r\n', pages[1].text)
+
+    def test_CSVLineIterator(self):
+        stream = io.BytesIO('Café\nA,"B\r\nC"\r\nlast'.encode('utf-8'))
+
+        self.assertEqual(['Café\n', 'A,"B\r\n', 'C"\r\n', 'last'], list(amaxa.CSVLineIterator(stream, chunk_size=3)))
+
+    def test_CSVStreamIterator_handles_empty_results(self):
+        self.assertEqual([], list(amaxa.CSVStreamIterator(io.BytesIO(b'Records not found for this query'), ['Id', 'Name'])))
+        self.assertEqual([], list(amaxa.CSVStreamIterator(io.BytesIO(b'"Id","Name"\n'), ['Id', 'Name'])))
+
+    def test_CSVStreamIterator_raises_exception_for_mismatched_columns(self):
+        with self.assertRaises(amaxa.AmaxaException):
+            list(amaxa.CSVStreamIterator(io.BytesIO(b'"Name","Id"\n"Test","001000000000001"\n'), ['Id', 'Name']))
@@ -679,3 +679,242 @@ class test_load_extraction_operation(unittest.TestCase):
             'AccountId',
             ', '.join(['Account'])
         )
+
+    def test_load_extraction_operation_sets_pk_chunk_size(self):
+        context = amaxa.ExtractOperation(MockSimpleSalesforce())
+        context.add_dependency = Mock()
+
+        m = unittest.mock.mock_open()
+        with unittest.mock.patch('builtins.open', m):
+            (result, errors) = loader.load_extraction_operation(
+                {
+                    'version': 1,
+                    'operation': [
+                        {
+                            'sobject': 'Account',
+                            'fields': [ 'Name' ],
+                            'extract': {
+                                'all': True,
+                                'pk-chunk-size': 100000
+                            }
+                        },
+                        {
+                            'sobject': 'Contact',
+                            'fields': [ 'LastName' ],
+                            'extract': {
+                                'query': 'LastName != null'
+                            }
+                        }
+                    ]
+                },
+                context
+            )
+
+        self.assertEqual([], errors)
+        self.assertEqual(100000, result.steps[0].pk_chunk_size)
+        self.assertIsNone(result.steps[1].pk_chunk_size)
+
+    def test_load_extraction_operation_rejects_pk_chunking_for_descendents(self):
+        context = amaxa.ExtractOperation(MockSimpleSalesforce())
+
+        (result, errors) = loader.load_extraction_operation(
+            {
+                'version': 1,
+                'operation': [
+                    {
+                        'sobject': 'Account',
+                        'fields': [ 'Name' ],
+                        'extract': {
+                            'all': True
+                        }
+                    },
+                    {
+                        'sobject': 'Contact',
+                        'fields': [ 'LastName' ],
+                        'extract': {
+                            'pk-chunk-size': 100000
+                        }
+                    }
+                ]
+            },
+            context
+        )
+
+        self.assertIsNone(result)
+        self.assertEqual(['PK chunking is only supported for sObjects extracted with \'all\' or \'query\' (Contact).'], errors)
+
+    def test_load_extraction_operation_sets_api_concurrency(self):
+        context = amaxa.ExtractOperation(MockSimpleSalesforce())
+
+        m = unittest.mock.mock_open()
+        with unittest.mock.patch('builtins.open', m):
+            (result, errors) = loader.load_extraction_operation(
+                {
+                    'version': 1,
+                    'options': {
+                        'api-concurrency': 8
+                    },
+                    'operation': [
+                        {
+                            'sobject': 'Account',
+                            'fields': [ 'Name' ],
+                            'extract': {
+                                'all': True
+                            }
+                        }
+                    ]
+                },
+                context
+            )
+
+        self.assertEqual([], errors)
+        self.assertEqual(8, result.api_concurrency)
+
+    def test_validate_extraction_schema_rejects_excessive_api_concurrency(self):
+        (result, errors) = loader.validate_extraction_schema(
+            {
+                'version': 1,
+                'options': {
+                    'api-concurrency': 50
+                },
+                'operation': [
+                    {
+                        'sobject': 'Account',
+                        'fields': [ 'Name' ],
+                        'extract': {
+                            'all': True
+                        }
+                    }
+                ]
+            }
+        )
+
+        self.assertIsNone(result)
+        self.assertGreater(len(errors), 0)
+
+    def test_load_extraction_operation_sets_query_limits(self):
+        context = amaxa.ExtractOperation(MockSimpleSalesforce())
+
+        m = unittest.mock.mock_open()
+        with unittest.mock.patch('builtins.open', m):
+            (result, errors) = loader.load_extraction_operation(
+                {
+                    'version': 1,
+                    'options': {
+                        'max-soql-length': 20000,
+                        'max-query-url-length': 8000
+                    },
+                    'operation': [
+                        {
+                            'sobject': 'Account',
+                            'fields': [ 'Name' ],
+                            'extract': {
+                                'all': True
+                            }
+                        }
+                    ]
+                },
+                context
+            )
+
+        self.assertEqual([], errors)
+        self.assertEqual(20000, result.max_soql_length)
+        self.assertEqual(8000, result.max_query_url_length)
+
+    def test_load_extraction_operation_sets_prefetch_options(self):
+        context = amaxa.ExtractOperation(MockSimpleSalesforce())
+
+        m = unittest.mock.mock_open()
+        with unittest.mock.patch('builtins.open', m):
+            (result, errors) = loader.load_extraction_operation(
+                {
+                    'version': 1,
+                    'options': {
+                        'prefetch-dependencies': True,
+                        'prefetch-buffer-size': 10000
+                    },
+                    'operation': [
+                        {
+                            'sobject': 'Account',
+                            'fields': [ 'Name' ],
+                            'extract': {
+                                'all': True
+                            }
+                        }
+                    ]
+                },
+                context
+            )
+
+        self.assertEqual([], errors)
+        self.assertTrue(result.prefetch_dependencies)
+        self.assertEqual(10000, result.prefetch_buffer_size)
+
+    def test_load_extraction_operation_sets_descendent_strategy(self):
+        context = amaxa.ExtractOperation(MockSimpleSalesforce())
+
+        m = unittest.mock.mock_open()
+        with unittest.mock.patch('builtins.open', m):
+            (result, errors) = loader.load_extraction_operation(
+                {
+                    'version': 1,
+                    'operation': [
+                        {
+                            'sobject': 'Account',
+                            'fields': [ 'Name' ],
+                            'extract': {
+                                'query': 'Industry = \'Tech\''
+                            }
+                        },
+                        {
+                            'sobject': 'Contact',
+                            'fields': [ 'LastName', 'AccountId' ],
+                            'extract': {
+                                'descendents': True,
+                                'strategy': 'semi-join'
+                            }
+                        },
+                        {
+                            'sobject': 'Opportunity',
+                            'fields': [ 'Name', 'AccountId' ],
+                            'extract': {
+                                'descendents': True
+                            }
+                        },
+                        {
+                            'sobject': 'Task',
+                            'fields': [ 'Subject', 'WhatId' ],
+                            'extract': {
+                                'descendents': True,
+                                'strategy': 'auto'
+                            }
+                        }
+                    ]
+                },
+                context
+            )
+
+        self.assertEqual([], errors)
+        self.assertEqual(amaxa.DescendentStrategy.SEMI_JOIN, result.steps[1].descendent_strategy)
+        self.assertEqual(amaxa.DescendentStrategy.ID_LIST, result.steps[2].descendent_strategy)
+        self.assertEqual(amaxa.DescendentStrategy.AUTO, result.steps[3].descendent_strategy)
+
+    def test_validate_extraction_schema_requires_descendents_for_strategy(self):
+        (result, errors) = loader.validate_extraction_schema(
+            {
+                'version': 1,
+                'operation': [
+                    {
+                        'sobject': 'Account',
+                        'fields': [ 'Name' ],
+                        'extract': {
+                            'all': True,
+                            'strategy': 'semi-join'
+                        }
+                    }
+                ]
+            }
+        )
+
+        self.assertIsNone(result)
+        self.assertGreater(len(errors), 0)
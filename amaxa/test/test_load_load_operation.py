@@ -51,6 +51,7 @@ class test_load_load_operation(unittest.TestCase):
         context = Mock()
         context.steps = []
         context.connection = MockSimpleSalesforce()
+        context.get_global_describe = context.connection.describe
 
         ex = { 
             'version': 1, 
@@ -316,6 +317,39 @@ class test_load_load_operation(unittest.TestCase):
             result.steps[0].field_scope
         )
 
+    def test_load_load_operation_sets_batch_sizes(self):
+        context = amaxa.LoadOperation(MockSimpleSalesforce())
+
+        ex = {
+            'version': 1,
+            'operation': [
+                { 
+                    'sobject': 'Account',
+                    'field-group': 'writeable',
+                    'input-validation': 'none',
+                    'batch-size': 2000
+                },
+                { 
+                    'sobject': 'Contact',
+                    'field-group': 'writeable',
+                    'input-validation': 'none'
+                }
+            ]
+        }
+
+        m = unittest.mock.mock_open()
+        with unittest.mock.patch('builtins.open', m):
+            (result, errors) = loader.load_load_operation(ex, context)
+
+        self.assertEqual([], errors)
+        self.assertEqual([2000, 10000], [s.batch_size for s in result.steps])
+
+        ex['operation'][0]['batch-size'] = 20000
+        (result, errors) = loader.load_load_operation(ex, amaxa.LoadOperation(MockSimpleSalesforce()))
+
+        self.assertIsNone(result)
+        self.assertEqual(1, len(errors))
+
     def test_load_load_operation_field_groups_omit_unsupported_types(self):
         context = amaxa.LoadOperation(MockSimpleSalesforce())
 
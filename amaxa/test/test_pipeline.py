@@ -0,0 +1,126 @@
+import unittest
+import io
+import threading
+from unittest.mock import Mock
+from .. import amaxa
+from .MockFileStore import MockFileStore
+
+
+class test_pipeline(unittest.TestCase):
+    def test_StageCounter_computes_throughput(self):
+        counter = amaxa.StageCounter()
+        self.assertEqual(0, counter.throughput)
+
+        counter.add(1000, 0.5)
+        counter.add(1000, 1.5, 0.25)
+
+        self.assertEqual(2000, counter.records)
+        self.assertEqual(1000, counter.throughput)
+        self.assertEqual(0.25, counter.blocked)
+        self.assertEqual('2000 records at 1000/s, 0.2s blocked', str(counter))
+
+    def test_PageQueue_counts_pages_fed(self):
+        counter = amaxa.StageCounter()
+        pages = amaxa.PageQueue(4, counter)
+
+        pages.feed(iter([[1, 2, 3], [4, 5]]))
+
+        self.assertEqual([1, 2, 3], pages.get())
+        self.assertEqual([4, 5], pages.get())
+        self.assertIsNone(pages.get())
+        self.assertEqual(5, counter.records)
+
+    def test_PageQueue_applies_backpressure(self):
+        pages = amaxa.PageQueue(1)
+        fed = []
+
+        def produce():
+            for i in range(3):
+                fed.append(i)
+                yield [i]
+
+        worker = threading.Thread(target=pages.feed, args=(produce(),))
+        worker.start()
+
+        # The producer can get no further than one page ahead of the queue's capacity.
+        worker.join(0.5)
+        self.assertTrue(worker.is_alive())
+        self.assertLessEqual(len(fed), 2)
+
+        self.assertEqual([[0], [1], [2], None], [pages.get() for i in range(4)])
+        worker.join()
+
+    def test_RecordWriter_writes_records_in_order(self):
+        writer = amaxa.RecordWriter(maxsize=1)
+        output = Mock()
+        mapper = Mock()
+        mapper.transform_record = Mock(side_effect=lambda r: { 'Id': r['Id'], 'Name': r['Name'].upper() })
+
+        writer.write(output, [{ 'Id': '001000000000001', 'Name': 'a' }, { 'Id': '001000000000002', 'Name': 'b' }])
+        writer.write(output, [{ 'Id': '001000000000003', 'Name': 'c' }], mapper)
+        writer.close()
+
+        self.assertEqual(
+            [
+                unittest.mock.call({ 'Id': '001000000000001', 'Name': 'a' }),
+                unittest.mock.call({ 'Id': '001000000000002', 'Name': 'b' }),
+                unittest.mock.call({ 'Id': '001000000000003', 'Name': 'C' })
+            ],
+            output.writerow.call_args_list
+        )
+        self.assertEqual(3, writer.counter.records)
+
+    def test_RecordWriter_writes_text_in_order(self):
+        writer = amaxa.RecordWriter(maxsize=1)
+        output = Mock()
+        f = io.StringIO()
+        output.writerow = Mock(side_effect=lambda r: f.write(r['Id'] + '\r\n'))
+
+        writer.write(output, [{ 'Id': '001000000000001' }])
+        writer.write_text(f, '"001000000000002"\r\n"001000000000003"\r\n', 2)
+        writer.close()
+
+        self.assertEqual('001000000000001\r\n"001000000000002"\r\n"001000000000003"\r\n', f.getvalue())
+        self.assertEqual(3, writer.counter.records)
+
+    def test_RecordWriter_raises_write_errors(self):
+        writer = amaxa.RecordWriter()
+        output = Mock()
+        output.writerow = Mock(side_effect=OSError('Disk full'))
+
+        writer.write(output, [{ 'Id': '001000000000001' }])
+
+        with self.assertRaises(OSError):
+            writer.close()
+
+    def test_ExtractOperation_writes_through_writer_during_execution(self):
+        oc = amaxa.ExtractOperation(Mock())
+        oc.file_store = MockFileStore()
+
+        step = Mock(sobjectname='Account', errors=[])
+        step.execute = Mock(
+            side_effect=lambda: oc.store_results('Account', [{ 'Id': '001000000000001' }, { 'Id': '001000000000002' }])
+        )
+        oc.add_step(step)
+
+        self.assertEqual(0, oc.execute())
+
+        self.assertIsNone(oc.writer)
+        self.assertEqual(2, oc.file_store.get_csv('Account', amaxa.FileType.OUTPUT).writerow.call_count)
+
+    def test_ExtractionStep_counts_stage_throughput(self):
+        connection = Mock()
+        connection.query = Mock(return_value={ 'records': [{ 'Id': '001000000000001' }, { 'Id': '001000000000002' }], 'done': True })
+
+        oc = amaxa.ExtractOperation(connection)
+        oc.file_store = MockFileStore()
+        oc.get_field_map = Mock(return_value={ 'Name': { 'name': 'Name', 'type': 'string' } })
+
+        step = amaxa.ExtractionStep('Account', amaxa.ExtractionScope.ALL_RECORDS, ['Name'])
+        oc.add_step(step)
+        step.initialize()
+
+        step.perform_id_field_pass('Id', amaxa.IdSet(['001000000000001', '001000000000002']))
+
+        self.assertEqual(2, step.counters['fetch'].records)
+        self.assertEqual(2, step.counters['process'].records)
@@ -16,6 +16,9 @@ setup(
     packages=['amaxa'],
     python_requires='>=3.6',
     install_requires=['pyyaml', 'simple_salesforce', 'salesforce_bulk', 'cerberus', 'requests', 'pyjwt', 'cryptography'],
+    extras_require={
+        'numpy': ['numpy']
+    },
     entry_points={
         'console_scripts': [
             'amaxa = amaxa.__main__:main'